@@ -0,0 +1,403 @@
+# aggregates.py
+"""
+Pre-aggregated voter counts for the candidate command center.
+
+voter_aggregates holds one row per (booth, gender, age band, affiliation,
+education level) bucket with the number of voters and of contacted voters in
+it; voter_issue_aggregates holds the same buckets split by key issue.
+/api/candidate/kpis and /api/candidate/visualization read these small tables
+instead of scanning voter_list.
+
+The tables are kept current from the ORM: every flush that adds, changes or
+deletes a Voter turns into +1/-1 deltas on the affected buckets, written in
+the same transaction. Writes that bypass the ORM (bulk loads) must either
+apply their own deltas with add_deltas()/apply_deltas() or apply_voter_set(),
+or call voter_issues.rebuild() and then rebuild() (or `flask
+rebuild-aggregates`) afterwards.
+"""
+from collections import Counter
+
+from sqlalchemy import event, false, func, case, inspect, or_, text
+from sqlalchemy.dialects.postgresql import insert
+
+import categories
+import table_versions
+from models import db, Voter, Issue, VoterIssue, VoterAggregate, VoterIssueAggregate
+from voter_issues import split_issues
+
+# Age bands are finer than the ones shown on the dashboard because the
+# histogram (<=25, <=40, <=60, rest) and the age filter (18-25, 26-40,
+# 41-60, >=60) disagree at the edges: under-18s are charted as 18-25 and
+# age 60 matches both the "41-60" and "60+" filters.
+HISTOGRAM_BANDS = {
+    "u18": "18-25",
+    "18-25": "18-25",
+    "26-40": "26-40",
+    "41-59": "41-60",
+    "60": "41-60",
+    "61+": "60+",
+}
+FILTER_BANDS = {
+    "18-25": ("18-25",),
+    "26-40": ("26-40",),
+    "41-60": ("41-59", "60"),
+    "60+": ("60", "61+"),
+}
+UNDECIDED = ("swingvoter", "")
+# Chart label of each bucket key (the canonical name it was lowercased from)
+LABELS = {kind: {name.lower(): name for name in categories.NAMES[kind].values()} for kind in ("gender", "affiliation")}
+
+TRACKED_FIELDS = (
+    "booth_id", "gender", "age", "political_affiliation",
+    "education_level", "mobile_number", "key_issues",
+)
+
+BUCKET_SQL = f"""
+    COALESCE(booth_id, 0) AS booth_id,
+    {categories.key_sql('"Gender"', "gender")} AS gender,
+    CASE WHEN "Age" IS NULL OR "Age" = 0 THEN ''
+         WHEN "Age" < 18 THEN 'u18'
+         WHEN "Age" <= 25 THEN '18-25'
+         WHEN "Age" <= 40 THEN '26-40'
+         WHEN "Age" < 60 THEN '41-59'
+         WHEN "Age" = 60 THEN '60'
+         ELSE '61+' END AS age_band,
+    {categories.key_sql('"Political Affiliation"', "affiliation")} AS affiliation,
+    {categories.key_sql('"Education Level"', "education")} AS education_level
+"""
+BUCKET_COLUMNS = "booth_id, gender, age_band, affiliation, education_level"
+
+# The same bucketing as ORM expressions, for aggregating voter_list directly
+AGE_BAND = case(
+    (or_(Voter.age.is_(None), Voter.age == 0), ""),
+    (Voter.age < 18, "u18"),
+    (Voter.age <= 25, "18-25"),
+    (Voter.age <= 40, "26-40"),
+    (Voter.age < 60, "41-59"),
+    (Voter.age == 60, "60"),
+    else_="61+",
+)
+GENDER_KEY = categories.key(Voter.gender, "gender")
+AFFILIATION_KEY = categories.key(Voter.political_affiliation, "affiliation")
+
+
+# -------------------------
+# Bucketing
+# -------------------------
+def age_band(age):
+    if not age:
+        return ""
+    if age < 18:
+        return "u18"
+    if age <= 25:
+        return "18-25"
+    if age <= 40:
+        return "26-40"
+    if age < 60:
+        return "41-59"
+    if age == 60:
+        return "60"
+    return "61+"
+
+def bucket_key(values):
+    return (
+        values["booth_id"] or 0,
+        (values["gender"] or "").lower(),
+        age_band(values["age"]),
+        (values["political_affiliation"] or "").lower(),
+        (values["education_level"] or "").lower(),
+    )
+
+
+# -------------------------
+# Incremental maintenance
+# -------------------------
+def _voter_values(voter, previous=False):
+    """Tracked field values of a voter, either as pending or as last flushed."""
+    state = inspect(voter)
+    values = {}
+    for name in TRACKED_FIELDS:
+        value = getattr(voter, name)
+        if previous:
+            history = state.attrs[name].load_history()
+            if history.deleted:
+                value = history.deleted[0]
+        values[name] = value
+    return values
+
+def empty_deltas():
+    return {"voters": Counter(), "contacted": Counter(), "mentions": Counter()}
+
+def add_deltas(deltas, values, sign):
+    """Count a voter (TRACKED_FIELDS values) in or out (sign +1/-1) of its buckets."""
+    key = bucket_key(values)
+    deltas["voters"][key] += sign
+    if values["mobile_number"]:
+        deltas["contacted"][key] += sign
+    for issue in split_issues(values["key_issues"]):
+        deltas["mentions"][key + (issue,)] += sign
+
+def collect_deltas(session):
+    deltas = empty_deltas()
+    for voter in session.new:
+        if isinstance(voter, Voter):
+            add_deltas(deltas, _voter_values(voter), 1)
+    for voter in session.dirty:
+        if isinstance(voter, Voter) and session.is_modified(voter):
+            add_deltas(deltas, _voter_values(voter, previous=True), -1)
+            add_deltas(deltas, _voter_values(voter), 1)
+    for voter in session.deleted:
+        if isinstance(voter, Voter):
+            add_deltas(deltas, _voter_values(voter, previous=True), -1)
+    return deltas
+
+def apply_deltas(connection, deltas):
+    """Upsert bucket deltas; concurrent writers add to the same rows safely."""
+    keys = set(deltas["voters"]) | set(deltas["contacted"])
+    rows = [
+        dict(zip(("booth_id", "gender", "age_band", "affiliation", "education_level"), key),
+             voters=deltas["voters"][key], contacted=deltas["contacted"][key])
+        for key in keys
+        if deltas["voters"][key] or deltas["contacted"][key]
+    ]
+    if rows:
+        table = VoterAggregate.__table__
+        stmt = insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[c.name for c in table.primary_key],
+            set_={
+                "voters": table.c.voters + stmt.excluded.voters,
+                "contacted": table.c.contacted + stmt.excluded.contacted,
+            },
+        )
+        connection.execute(stmt, rows)
+
+    rows = [
+        dict(zip(("booth_id", "gender", "age_band", "affiliation", "education_level", "issue"), key),
+             mentions=n)
+        for key, n in deltas["mentions"].items()
+        if n
+    ]
+    if rows:
+        table = VoterIssueAggregate.__table__
+        stmt = insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[c.name for c in table.primary_key],
+            set_={"mentions": table.c.mentions + stmt.excluded.mentions},
+        )
+        connection.execute(stmt, rows)
+
+@event.listens_for(db.session, "before_flush")
+def _collect_voter_deltas(session, flush_context, instances):
+    deltas = collect_deltas(session)
+    if any(deltas.values()):
+        session.info["voter_aggregate_deltas"] = deltas
+
+@event.listens_for(db.session, "after_flush")
+def _apply_voter_deltas(session, flush_context):
+    # Written after the voter rows so row locks are always taken in the same order
+    deltas = session.info.pop("voter_aggregate_deltas", None)
+    if deltas:
+        apply_deltas(session.connection(), deltas)
+
+def apply_voter_set(connection, voter_ids, sign):
+    """Count the voters selected by voter_ids (a SQL SELECT of IDs) in or out (sign +1/-1).
+
+    The set-based counterpart of add_deltas() for bulk writes: call it with -1
+    before the rows change and +1 after (and after voter_issues is relinked).
+    """
+    connection.execute(text(f"""
+        INSERT INTO voter_aggregates ({BUCKET_COLUMNS}, voters, contacted)
+        SELECT {BUCKET_COLUMNS}, :sign * COUNT(*), :sign * COUNT(*) FILTER (WHERE has_mobile)
+        FROM (
+            SELECT {BUCKET_SQL},
+                   COALESCE("Mobile Number", '') <> '' AS has_mobile
+            FROM voter_list
+            WHERE "ID" IN ({voter_ids})
+        ) v
+        GROUP BY {BUCKET_COLUMNS}
+        ON CONFLICT ({BUCKET_COLUMNS}) DO UPDATE
+        SET voters = voter_aggregates.voters + EXCLUDED.voters,
+            contacted = voter_aggregates.contacted + EXCLUDED.contacted
+    """), {"sign": sign})
+    connection.execute(text(f"""
+        INSERT INTO voter_issue_aggregates ({BUCKET_COLUMNS}, issue, mentions)
+        SELECT {BUCKET_COLUMNS}, issue, :sign * COUNT(*)
+        FROM (
+            SELECT {BUCKET_SQL}, i.name AS issue
+            FROM voter_list
+            JOIN voter_issues vi ON vi.voter_id = voter_list."ID"
+            JOIN issues i ON i.id = vi.issue_id
+            WHERE voter_list."ID" IN ({voter_ids})
+        ) v
+        GROUP BY {BUCKET_COLUMNS}, issue
+        ON CONFLICT ({BUCKET_COLUMNS}, issue) DO UPDATE
+        SET mentions = voter_issue_aggregates.mentions + EXCLUDED.mentions
+    """), {"sign": sign})
+
+def rebuild(connection=None):
+    """Recompute both aggregate tables from voter_list."""
+    connection = connection or db.session.connection()
+    connection.execute(text("DELETE FROM voter_aggregates"))
+    connection.execute(text("DELETE FROM voter_issue_aggregates"))
+    connection.execute(text(f"""
+        INSERT INTO voter_aggregates ({BUCKET_COLUMNS}, voters, contacted)
+        SELECT {BUCKET_COLUMNS}, COUNT(*), COUNT(*) FILTER (WHERE has_mobile)
+        FROM (
+            SELECT {BUCKET_SQL},
+                   COALESCE("Mobile Number", '') <> '' AS has_mobile
+            FROM voter_list
+        ) v
+        GROUP BY {BUCKET_COLUMNS}
+    """))
+    connection.execute(text(f"""
+        INSERT INTO voter_issue_aggregates ({BUCKET_COLUMNS}, issue, mentions)
+        SELECT {BUCKET_COLUMNS}, issue, COUNT(*)
+        FROM (
+            SELECT {BUCKET_SQL}, i.name AS issue
+            FROM voter_list
+            JOIN voter_issues vi ON vi.voter_id = voter_list."ID"
+            JOIN issues i ON i.id = vi.issue_id
+        ) v
+        GROUP BY {BUCKET_COLUMNS}, issue
+    """))
+    table_versions.bump(connection, VoterAggregate.__tablename__)
+
+
+# -------------------------
+# Reads
+# -------------------------
+def covers(issues=None, occupation=None, ward=None):
+    """True when a visualization filter set can be answered from the buckets."""
+    if issues or occupation:
+        return False
+    if ward:
+        try:
+            return int(ward) > 0
+        except ValueError:
+            return False
+    return True
+
+def _bucket_key(kind, value):
+    """Bucket key of a filter value, as filter_voters maps it; None if unknown."""
+    try:
+        name = categories.canonical(kind, value)
+    except ValueError:
+        return None
+    return (name or "").lower()
+
+def _filtered(query, model, gender=None, affiliation=None, age=None, ward=None, education=None):
+    if gender:
+        g = gender.strip()
+        if g and g.lower() != "all":
+            key = _bucket_key("gender", g)
+            query = query.filter(model.gender == key if key is not None else false())
+
+    if affiliation:
+        a = affiliation.lower()
+        if a == "empty":
+            query = query.filter(model.affiliation == "")
+        else:
+            key = _bucket_key("affiliation", a)
+            query = query.filter(model.affiliation == key if key is not None else false())
+
+    if age in FILTER_BANDS:
+        query = query.filter(model.age_band.in_(FILTER_BANDS[age]))
+
+    if ward:
+        query = query.filter(model.booth_id == int(ward))
+
+    if education:
+        query = query.filter(model.education_level.ilike(f"%{education}%"))
+
+    return query
+
+def kpis():
+    a = VoterAggregate
+    total, contacted, supporters, undecided = db.session.query(
+        func.coalesce(func.sum(a.voters), 0),
+        func.coalesce(func.sum(a.contacted), 0),
+        func.coalesce(func.sum(case((a.affiliation == "supporter", a.voters), else_=0)), 0),
+        func.coalesce(func.sum(case((a.affiliation.in_(UNDECIDED), a.voters), else_=0)), 0),
+    ).one()
+    return {
+        "total": int(total),
+        "contacted": int(contacted),
+        "supporters": int(supporters),
+        "undecided": int(undecided),
+    }
+
+def booth_totals():
+    """{booth_id: {"total_voters", "supporters", "opponents"}} for every booth with voters."""
+    a = VoterAggregate
+    rows = db.session.query(
+        a.booth_id,
+        func.sum(a.voters),
+        func.sum(case((a.affiliation == "supporter", a.voters), else_=0)),
+        func.sum(case((a.affiliation == "opponent", a.voters), else_=0)),
+    ).filter(a.booth_id != 0).group_by(a.booth_id).all()
+    return {
+        booth_id: {"total_voters": int(total), "supporters": int(supporters), "opponents": int(opponents)}
+        for booth_id, total, supporters, opponents in rows
+    }
+
+def _chart_counts(rows):
+    """Fold (affiliation, age band, gender, count) groups into the dashboard histograms.
+
+    Affiliation and gender are bucket keys: lower-case canonical names, '' for none.
+    """
+    affiliations = Counter()
+    age_groups = {"18-25": 0, "26-40": 0, "41-60": 0, "60+": 0}
+    gender_split = Counter()
+
+    for affiliation, band, gender, n in rows:
+        n = int(n)
+        if not n:
+            continue
+        affiliations[LABELS["affiliation"][affiliation] if affiliation else "Empty"] += n
+
+        if band in HISTOGRAM_BANDS:
+            age_groups[HISTOGRAM_BANDS[band]] += n
+
+        gender_split[LABELS["gender"][gender] if gender else "Other"] += n
+
+    return {
+        "affiliations": dict(affiliations),
+        "ageGroups": age_groups,
+        "genderSplit": dict(gender_split),
+    }
+
+def visualization(**filters):
+    """Same payload as the /api/candidate/visualization Python loop, from the buckets."""
+    a = VoterAggregate
+    rows = _filtered(
+        db.session.query(a.affiliation, a.age_band, a.gender, func.sum(a.voters)),
+        a, **filters,
+    ).group_by(a.affiliation, a.age_band, a.gender).all()
+
+    i = VoterIssueAggregate
+    mentions = func.sum(i.mentions)
+    top_issues = _filtered(db.session.query(i.issue, mentions), i, **filters) \
+        .group_by(i.issue).having(mentions > 0) \
+        .order_by(mentions.desc(), i.issue).limit(10).all()
+
+    result = _chart_counts(rows)
+    result["topIssues"] = {issue: int(n) for issue, n in top_issues}
+    return result
+
+def live_visualization(query):
+    """Visualization payload for an already-filtered Voter query, grouped in SQL."""
+    rows = query.with_entities(AFFILIATION_KEY, AGE_BAND, GENDER_KEY, func.count()) \
+        .group_by(AFFILIATION_KEY, AGE_BAND, GENDER_KEY).all()
+
+    voter_ids = query.with_entities(Voter.id.label("voter_id")).subquery()
+    mentions = func.count(VoterIssue.voter_id)
+    top_issues = db.session.query(Issue.name, mentions) \
+        .join(VoterIssue, VoterIssue.issue_id == Issue.id) \
+        .join(voter_ids, voter_ids.c.voter_id == VoterIssue.voter_id) \
+        .group_by(Issue.name) \
+        .order_by(mentions.desc(), Issue.name).limit(10).all()
+
+    result = _chart_counts(rows)
+    result["topIssues"] = {name: int(n) for name, n in top_issues}
+    return result
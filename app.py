@@ -1,78 +1,130 @@
 # app.py
-from flask import Flask, render_template, request, jsonify
-from flask_migrate import Migrate
+from flask import (Blueprint, Flask, current_app, render_template, request, jsonify, Response,
+                   send_from_directory, stream_with_context)
 from datetime import datetime, timezone
 import os
 from dotenv import load_dotenv
-from sqlalchemy import func, case, or_
-import feedparser
-import cohere
-from collections import Counter
+from sqlalchemy import func, text
+from sqlalchemy.dialects.postgresql import aggregate_order_by
+from sqlalchemy.orm.exc import StaleDataError
 import time
-import psycopg2
-from psycopg2 import sql
 import re
-import pandas as pd
-# ================== DATABASE CONNECTION ==================
-conn = psycopg2.connect(
-    host="localhost",
-    database="postgres",
-    user="postgres",
-    password="aiml72"  # Change if needed
-)
-
-def query_db(sql, params=None):
-    cur = conn.cursor()
-    cur.execute(sql, params)
-    rows = cur.fetchall()
-    colnames = [desc[0] for desc in cur.description]
-    cur.close()
-    return pd.DataFrame(rows, columns=colnames)
+import io
+import csv
+import click
 
 # Load environment variables
 load_dotenv()
 
-cohere_client = cohere.Client(os.getenv("COHERE_API_KEY"))
-
-from models import db, Voter, Task, Communication, Report, Booth, Segment
+from models import (db, Voter, VoterLocation, Task, Communication, Report, Booth, Segment, Issue, VoterIssue,
+                    VoterAggregate)
+import aggregates
+import categories
+import voter_issues
+import voter_search
+import voter_export
+import voter_projection
+import roll_ingest
+import voter_import
+import voter_bulk
+import delta_sync
+import live_events
+import voter_segments
+import voter_bitmaps
+import voter_snapshot
+import voter_changes
+import table_versions
+import llm
+import news_feeds
+import query_plans
+import visualization_parity
+from caching import TTLCache
+from voter_filters import filters_from_args, filter_voters, filter_key
+from conditional_get import versioned, etag_stats
+from pagination import encode_cursor, decode_cursor, cached_count, count_stats, estimate_count
 
+# ========================================
 # App Setup
-app = Flask(__name__)
-app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv("DATABASE_URL")
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.secret_key = os.getenv("SECRET_KEY", "supersecret")
+# ========================================
+# Routes and CLI commands live on this blueprint; create_app() builds the
+# Flask app around it. Building the app connects to nothing: the database
+# pool opens on the first query, the LLM SDK loads on the first LLM call,
+# NumPy on the first snapshot use and Alembic only for `flask db` commands.
+bp = Blueprint("janpath", __name__, cli_group=None)
+
+class LazyMigrateGroup(click.Group):
+    """`flask db`: loads Flask-Migrate (and Alembic) only when a db command runs."""
+
+    def parse_args(self, ctx, args):
+        from flask_migrate import Migrate
+        from flask_migrate.cli import db as db_group
+        app = current_app._get_current_object()
+        if "migrate" not in app.extensions:
+            Migrate(app, db)
+        self.params, self.callback, self.commands = db_group.params, db_group.callback, db_group.commands
+        return super().parse_args(ctx, args)
+
+def create_app(config=None):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv("DATABASE_URL")
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    # One pooled engine shared by the ORM and the raw chat queries. Connections are
+    # checked out per request and returned by Flask-SQLAlchemy's teardown.
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        "pool_size": int(os.getenv("DB_POOL_SIZE", 10)),
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", 20)),
+        "pool_timeout": int(os.getenv("DB_POOL_TIMEOUT", 30)),
+        "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", 1800)),
+        "pool_pre_ping": True,
+    }
+    app.secret_key = os.getenv("SECRET_KEY", "supersecret")
+    app.config.update(config or {})
+
+    # Bind db to app
+    db.init_app(app)
+    app.cli.add_command(LazyMigrateGroup("db", help="Perform database migrations."))
+    app.register_blueprint(bp)
+
+    def reset_pool_after_fork():
+        """Forget connections inherited from the parent process (gunicorn/uwsgi preload)."""
+        with app.app_context():
+            db.engine.dispose(close=False)
+
+    if hasattr(os, "register_at_fork"):
+        os.register_at_fork(after_in_child=reset_pool_after_fork)
+    return app
 
-# Bind db to app
-db.init_app(app)
-migrate = Migrate(app, db)
+# ================== DATABASE CONNECTION ==================
+def query_db(sql, params=None):
+    """Run a raw SELECT on the pooled session and return the rows as mappings."""
+    return db.session.execute(text(sql), params or {}).mappings().all()
 
 # ========================================
-# Initialize Cohere (Chatbot)
+# LLM provider (chatbot fallback, candidate insights)
 # ========================================
-cohere_key = os.getenv("COHERE_API_KEY")
-co = cohere.Client(cohere_key) if cohere_key else None
+llm_client = llm.client_from_env()
 
 # ========================================
 # Routes - HTML Pages
 # ========================================
-@app.route("/")
+@bp.route("/")
 def index():
     return render_template("index.html")
 
-@app.route("/worker")
+@bp.route("/worker")
 def worker_dashboard():
     return render_template("party-worker-dashboard.html")
 
-@app.route("/admin")
+@bp.route("/admin")
 def admin_dashboard():
     return render_template("admin-dashboard.html")
 
-@app.route("/candidate")
+@bp.route("/candidate")
 def candidate_dashboard():
     return render_template("candidate-dashboard.html")
 
 # ---- Chatbot Integration ----
-@app.route("/chatpage")
+@bp.route("/chatpage")
 def chatbot_page():
     """Renders the integrated chatbot interface."""
     return render_template("chatbot.html")
@@ -123,55 +175,64 @@ def gender_insight(gender):
     """Return formatted gender-based affiliation counts with percentages and recommendations."""
     # Use parameterized query, but column names with spaces must be quoted.
     sql_text = """
-        SELECT "Political Affiliation" AS affiliation, COUNT(*) AS cnt
-        FROM public.voter_list
-        WHERE LOWER("Gender") = LOWER(%s)
-        GROUP BY "Political Affiliation";
+        SELECT a.name AS affiliation, COUNT(*) AS cnt
+        FROM public.voter_list v
+        LEFT JOIN public.affiliations a ON a.id = v."Political Affiliation"
+        WHERE v."Gender" = :gender
+        GROUP BY a.name;
     """
-    df = query_db(sql_text, (gender,))
-    if df.empty:
+    snapshot = voter_snapshot.get()
+    if snapshot:
+        rows = [{"affiliation": aff, "cnt": n}
+                for aff, n in snapshot.counts("political_affiliation", snapshot.where("gender", gender))]
+    else:
+        rows = query_db(sql_text, {"gender": categories.code("gender", gender)})
+    if not rows:
         return f"No voter records found for gender: {gender}"
 
-    total = int(df['cnt'].sum())
-    # normalize affiliation values (capitalize)
-    df['affiliation'] = df['affiliation'].astype(str).str.title()
+    total = sum(int(row['cnt']) for row in rows)
+    # affiliation values are canonical names (categories.py)
+    counts = [(str(row['affiliation']), int(row['cnt'])) for row in rows]
 
     # order preference
-    order = ["Supporter", "Neutral", "Opponent"]
-    df['order'] = df['affiliation'].apply(lambda v: order.index(v) if v in order else 99)
-    df = df.sort_values(by='order')
+    order = ["Supporter", "SwingVoter", "Opponent"]
+    counts.sort(key=lambda item: order.index(item[0]) if item[0] in order else 99)
 
-    emojis = {"Supporter": "✅", "Neutral": "⚪", "Opponent": "❌"}
+    emojis = {"Supporter": "✅", "SwingVoter": "⚪", "Opponent": "❌"}
     lines = [f"📊 Gender Insight: {gender} Voters", f"Total: {total} voters\n"]
-    for _, row in df.iterrows():
-        aff = row['affiliation']
-        cnt = int(row['cnt'])
+    for aff, cnt in counts:
         pct = round((cnt / total) * 100, 1) if total > 0 else 0.0
         lines.append(f"{emojis.get(aff, '•')} {aff}: {cnt} voters ({pct}%)")
     # add a short recommendation
-    neutral_row = df[df['affiliation'].str.lower() == 'neutral']
-    if not neutral_row.empty:
-        neutral_pct = round((int(neutral_row.iloc[0]['cnt']) / total) * 100, 1)
+    neutral_cnt = next((cnt for aff, cnt in counts if aff == 'SwingVoter'), None)
+    if neutral_cnt is not None:
+        neutral_pct = round((neutral_cnt / total) * 100, 1)
         lines.append(f"\n📌 Recommendation: Focus targeted outreach to neutral {gender.lower()} voters ({neutral_pct}%). Use women's groups / local meetings.")
     return "\n".join(lines)
 
 def top_issue_insight(limit=5):
-    """Unnest key issues separated by commas and return top N."""
+    """Return the top N issues, ranked from the voter_issues index."""
     sql_text = """
-        SELECT issue, SUM(cnt) AS cnt FROM (
-            SELECT unnest(string_to_array("Key Issues", ','))::text AS issue, COUNT(*)::int AS cnt
-            FROM public.voter_list
-            GROUP BY issue
+        SELECT i.name AS issue, t.cnt
+        FROM (
+            SELECT issue_id, COUNT(*) AS cnt
+            FROM public.voter_issues
+            GROUP BY issue_id
+            ORDER BY cnt DESC
+            LIMIT :limit
         ) t
-        GROUP BY issue
-        ORDER BY cnt DESC
-        LIMIT %s;
+        JOIN public.issues i ON i.id = t.issue_id
+        ORDER BY t.cnt DESC;
     """
-    df = query_db(sql_text, (limit,))
-    if df.empty:
+    snapshot = voter_snapshot.get()
+    if snapshot:
+        rows = [{"issue": issue, "cnt": n} for issue, n in snapshot.issue_counts(limit=limit)]
+    else:
+        rows = query_db(sql_text, {"limit": limit})
+    if not rows:
         return "No issue data available."
     lines = ["🔥 Top Voter Issues:"]
-    for _, row in df.iterrows():
+    for row in rows:
         issue = str(row['issue']).strip().title()
         cnt = int(row['cnt'])
         lines.append(f"• {issue}: {cnt} voters")
@@ -184,12 +245,18 @@ def age_group_insight():
         GROUP BY "Age"
         ORDER BY "Age";
     """
-    df = query_db(sql_text)
-    if df.empty:
+    snapshot = voter_snapshot.get()
+    if snapshot:
+        # NULL ages sort last, as in the SQL
+        rows = sorted(({"Age": age, "cnt": n} for age, n in snapshot.counts("age")),
+                      key=lambda row: (row["Age"] is None, row["Age"] or 0))
+    else:
+        rows = query_db(sql_text)
+    if not rows:
         return "No age data available."
     lines = ["🎯 Age Distribution:"]
-    total = int(df['cnt'].sum())
-    for _, row in df.iterrows():
+    total = sum(int(row['cnt']) for row in rows)
+    for row in rows:
         age = row['Age']
         cnt = int(row['cnt'])
         pct = round((cnt / total) * 100, 1) if total > 0 else 0.0
@@ -206,21 +273,23 @@ def booth_supporter_insight(booth_number):
     # First try a numeric equality on "House number" if it stores booth numbers; otherwise pattern match.
     # We'll attempt both: equality and LIKE.
     sql_text = """
-        SELECT "Political Affiliation" AS affiliation, COUNT(*) AS cnt
-        FROM public.voter_list
-        WHERE "House number"::text ILIKE %s OR "House number"::text ILIKE %s
-        GROUP BY "Political Affiliation";
+        SELECT v."Political Affiliation" AS affiliation, COUNT(*) AS cnt
+        FROM public.voter_list v
+        WHERE v."House number"::text ILIKE :pattern
+        GROUP BY v."Political Affiliation";
     """
     pattern = f"%{booth_number}%"
-    df = query_db(sql_text, (pattern, pattern))
+    rows = query_db(sql_text, {"pattern": pattern})
     # If no rows — try filtering by Latitude/Longitude proximity not implemented here (need geo)
-    if df.empty:
+    if not rows:
         return f"No direct data found for Booth {booth_number}. Try 'Booth {booth_number}' using your local booth identifier."
-    total = int(df['cnt'].sum())
-    df['affiliation'] = df['affiliation'].astype(str).str.title()
+    total = sum(int(row['cnt']) for row in rows)
     lines = [f"📌 Booth {booth_number} Summary (matching House number):", f"Total records: {total}"]
-    for _, row in df.iterrows():
-        aff = row['affiliation']
+    for row in rows:
+        # Voters without an affiliation count towards the total only
+        if row['affiliation'] is None:
+            continue
+        aff = categories.NAMES["affiliation"][row['affiliation']]
         cnt = int(row['cnt'])
         pct = round((cnt / total) * 100, 1) if total>0 else 0.0
         lines.append(f"• {aff}: {cnt} ({pct}%)")
@@ -231,16 +300,21 @@ def swing_voter_insight():
     sql_text = """
         SELECT "Age", COUNT(*) AS cnt
         FROM public.voter_list
-        WHERE LOWER("Political Affiliation") = 'neutral'
+        WHERE "Political Affiliation" = :swing
         GROUP BY "Age"
         ORDER BY cnt DESC
         LIMIT 10;
     """
-    df = query_db(sql_text)
-    if df.empty:
+    snapshot = voter_snapshot.get()
+    if snapshot:
+        counts = snapshot.counts("age", snapshot.where("political_affiliation", "SwingVoter"))
+        rows = [{"Age": age, "cnt": n} for age, n in sorted(counts, key=lambda item: -item[1])[:10]]
+    else:
+        rows = query_db(sql_text, {"swing": categories.code("affiliation", "SwingVoter")})
+    if not rows:
         return "No swing voter data found."
     lines = ["🎯 Swing Voter Profile (Top groups by count):"]
-    for _, row in df.iterrows():
+    for row in rows:
         age = row['Age']
         cnt = int(row['cnt'])
         lines.append(f"• Age {age}: {cnt} neutral/swing voters")
@@ -249,15 +323,21 @@ def swing_voter_insight():
 
 def win_probability():
     sql_text = """
-        SELECT LOWER("Political Affiliation") AS aff, COUNT(*) AS cnt
-        FROM public.voter_list
-        GROUP BY LOWER("Political Affiliation");
+        SELECT LOWER(a.name) AS aff, COUNT(*) AS cnt
+        FROM public.voter_list v
+        LEFT JOIN public.affiliations a ON a.id = v."Political Affiliation"
+        GROUP BY LOWER(a.name);
     """
-    df = query_db(sql_text)
-    if df.empty:
+    snapshot = voter_snapshot.get()
+    if snapshot:
+        rows = [{"aff": aff.lower() if aff is not None else None, "cnt": n}
+                for aff, n in snapshot.counts("political_affiliation")]
+    else:
+        rows = query_db(sql_text)
+    if not rows:
         return "No affiliation data."
-    total = int(df['cnt'].sum())
-    supporters = int(df[df['aff']=='supporter']['cnt'].sum()) if 'supporter' in df['aff'].values else 0
+    total = sum(int(row['cnt']) for row in rows)
+    supporters = sum(int(row['cnt']) for row in rows if row['aff'] == 'supporter')
     prob = round((supporters / total) * 100, 1) if total>0 else 0.0
     return f"📈 Estimated Supporter Share: {supporters}/{total} ({prob}%) — not a true probability but a quick indicator."
 
@@ -265,14 +345,10 @@ def win_probability():
 # LLM / fallback response
 # -------------------------
 def llm_response(user_text):
-    """If Cohere client present, use it. Otherwise fall back to rule-based responses."""
-    if co:
-        try:
-            # Simple chat call (Cohere SDK usage may differ by version)
-            resp = co.chat(message=user_text, chat_history=[], model="command-a-03-2025")
-            return resp.text
-        except Exception as e:
-            print("Cohere error:", e)
+    """Ask the LLM provider; on no provider, timeout or error fall back to rule-based responses."""
+    reply = llm_client.chat(user_text)
+    if reply:
+        return reply
     # Fallback rule-based short responses for general queries
     t = user_text.lower()
     if "campaign" in t or "strategy" in t:
@@ -288,7 +364,33 @@ def llm_response(user_text):
 # -------------------------
 # Chat endpoint
 # -------------------------
-@app.route("/chat", methods=["POST"])
+# Insight replies keyed by (intent, parameters, voter_list version): any voter
+# write or import moves the version on, so stale replies are never served
+chat_cache = TTLCache(maxsize=int(os.getenv("CHAT_CACHE_SIZE", 1024)),
+                      ttl=int(os.getenv("CHAT_CACHE_TTL", 300)))
+
+def insight_reply(intent, user_input):
+    """Reply text for a data intent, or None for general questions."""
+    if intent == "gender_female":
+        return gender_insight("Female")
+    if intent == "gender_male":
+        return gender_insight("Male")
+    if intent == "issues":
+        return top_issue_insight()
+    if intent == "age":
+        return age_group_insight()
+    if intent == "booth":
+        return booth_supporter_insight(detect_booth_number(user_input))
+    if intent == "swing":
+        return swing_voter_insight()
+    if intent == "win_probability":
+        return win_probability()
+    return None
+
+def intent_params(intent, user_input):
+    return (detect_booth_number(user_input),) if intent == "booth" else ()
+
+@bp.route("/chat", methods=["POST"])
 def enhanced_chat():
     user_input = request.json.get("message", "").strip()
     if not user_input:
@@ -296,25 +398,26 @@ def enhanced_chat():
 
     intent = classify_intent(user_input)
     try:
-        if intent == "gender_female":
-            reply = gender_insight("Female")
-        elif intent == "gender_male":
-            reply = gender_insight("Male")
-        elif intent == "issues":
-            reply = top_issue_insight()
-        elif intent == "age":
-            reply = age_group_insight()
-        elif intent == "booth":
-            booth_no = detect_booth_number(user_input)
-            reply = booth_supporter_insight(booth_no)
-        elif intent == "swing":
-            reply = swing_voter_insight()
-        elif intent == "win_probability":
-            reply = win_probability()
-        else:
+        if intent == "general":
             reply = llm_response(user_input)
+        else:
+            # The insights read voter_list (or the snapshot when it is enabled,
+            # which may lag it), voter_issues and the aggregates, which are
+            # rebuilt without touching voter_list
+            snapshot = voter_snapshot.get()
+            voters, issues, buckets = table_versions.versions(
+                Voter.__tablename__, VoterIssue.__tablename__, VoterAggregate.__tablename__
+            )
+            key = (intent, intent_params(intent, user_input),
+                   snapshot.version if snapshot else voters, issues, buckets)
+            reply = chat_cache.get(key)
+            if reply is None:
+                reply = insight_reply(intent, user_input)
+                chat_cache.set(key, reply)
     except Exception as e:
         print("Error generating reply:", e)
+        # Don't hand an aborted transaction back to the pool
+        db.session.rollback()
         reply = "Internal error — please try again."
 
     return jsonify({"reply": reply})
@@ -325,14 +428,14 @@ def enhanced_chat():
 # ===============================================================
 # Serve CSVs that frontend fetches (so JS can call 'ImpFiles/...')
 # ===============================================================
-@app.route("/ImpFiles/<path:filename>")
+@bp.route("/ImpFiles/<path:filename>")
 def impfiles(filename):
     """
     Serve files placed in static/ImpFiles/ at URL /ImpFiles/<filename>
     This keeps the frontend fetch('ImpFiles/Pandharpur_final.csv') working
     without modifying client code.
     """
-    imp_dir = os.path.join(app.static_folder, "ImpFiles")
+    imp_dir = os.path.join(current_app.static_folder, "ImpFiles")
     if not os.path.isdir(imp_dir):
         # defensive: if folder missing, return 404
         return jsonify({"error": "ImpFiles directory not found on server."}), 404
@@ -344,135 +447,325 @@ def impfiles(filename):
 # ========================================
 
 # --- Voters with filters + pagination ---
-@app.route("/api/voters")
+def search_voters(query, search):
+    search_term = f"%{search}%"
+    return query.filter(
+        (Voter.name.ilike(search_term)) |
+        (Voter.epic_number.ilike(search_term)) |
+        (Voter.house_number.ilike(search_term))
+    )
+
+@bp.route("/api/voters")
 def api_voters():
+    """
+    Filtered voter list. Pass `cursor` (empty for the first page) for keyset
+    pagination with an opaque `next_cursor`; otherwise `page`/`per_page` paging.
+    `count=estimate` returns the planner's row estimate instead of an exact total.
+    `fields=a,b` and `format=columns` pick the columns and layout (voter_projection.py).
+    """
     page = request.args.get("page", 1, type=int)
     per_page = request.args.get("per_page", 50, type=int)
-    gender = request.args.get("gender", type=str)
     search = request.args.get("search", type=str)
-    
-    # Candidate-specific filters
-    affiliation = request.args.get("affiliation", type=str)
-    age = request.args.get("age", type=str)
-    issues = request.args.get("issues", type=str)
-    occupation = request.args.get("occupation", type=str)
+    count_mode = request.args.get("count", "exact", type=str)
+    if page < 1:
+        page = 1
+    if per_page < 1:
+        per_page = 20
 
-    query = Voter.query
+    # A malformed cursor or field list is rejected before anything is counted
+    try:
+        paging = page_args()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
-    # Gender filter
-    if gender:
-        g = gender.strip().lower()
-        if g and g != "all":
-            query = query.filter(Voter.gender.ilike(gender))
+    filters = filters_from_args(request.args)
+    query = filter_voters(Voter.query, **filters)
 
     # Search filter
     if search:
-        search_term = f"%{search}%"
-        query = query.filter(
-            (Voter.name.ilike(search_term)) |
-            (Voter.epic_number.ilike(search_term)) |
-            (Voter.house_number.ilike(search_term))
-        )
+        query = search_voters(query, search)
+
+    if count_mode == "estimate":
+        total = estimate_count(query)
+    else:
+        total = cached_count(query, Voter.__tablename__, filter_key(dict(filters, search=search)))
+
+    return voter_page(query, page, per_page, total, paging, estimated=count_mode == "estimate")
 
-    # Candidate filters
-    if affiliation:
-        query = query.filter(Voter.political_affiliation.ilike(affiliation))
-    
-    if age:
-        if age == "18-25":
-            query = query.filter(Voter.age.between(18, 25))
-        elif age == "26-40":
-            query = query.filter(Voter.age.between(26, 40))
-        elif age == "41-60":
-            query = query.filter(Voter.age.between(41, 60))
-        elif age == "60+":
-            query = query.filter(Voter.age >= 60)
-    
-    if issues:
-        query = query.filter(Voter.key_issues.ilike(f"%{issues}%"))
-    
-    if occupation:
-        query = query.filter(Voter.occupation.ilike(f"%{occupation}%"))
+def page_args():
+    """
+    The request's `cursor`, `fields` and `format` arguments as a dict for
+    voter_page(). Raises ValueError if the cursor or field list is malformed.
+    """
+    fields = voter_projection.parse_fields(request.args.get("fields", type=str))
+    columnar = request.args.get("format", "rows", type=str) == "columns"
+    if columnar and fields is None:
+        fields = list(voter_projection.FIELDS)
+    return {
+        "keyset": "cursor" in request.args,
+        "after": decode_cursor(request.args.get("cursor")),
+        "fields": fields,
+        "columnar": columnar,
+    }
+
+def voter_page(query, page, per_page, total, paging, estimated=False):
+    """
+    One page of a voter query as JSON: keyset paging when the request has a
+    `cursor` argument, page/per_page offsets otherwise. `fields` and
+    `format=columns` select the projection and layout (see voter_projection.py).
+    """
+    fields = paging["fields"]
+    columnar = paging["columnar"]
+    if fields is not None:
+        query = voter_projection.select_fields(query, fields)
+
+    pages = -(-total // per_page) if total else 0
 
     # Stable ordering
     query = query.order_by(Voter.id.asc())
 
-    pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+    if paging["keyset"]:
+        after = paging["after"]
+        if after is not None:
+            query = query.filter(Voter.id > after)
+        voters = query.limit(per_page + 1).all()
+        has_more = len(voters) > per_page
+        voters = voters[:per_page]
+        return voter_items(voters, fields, columnar, {
+            "next_cursor": encode_cursor(voters[-1].id) if has_more else None,
+            "pages": pages,
+            "total": total,
+            "total_estimated": estimated
+        })
 
-    return jsonify({
-        "items": [v.to_dict() for v in pagination.items],
-        "page": pagination.page,
-        "pages": pagination.pages,
-        "total": pagination.total
+    voters = query.offset((page - 1) * per_page).limit(per_page).all()
+
+    return voter_items(voters, fields, columnar, {
+        "page": page,
+        "pages": pages,
+        "total": total
     })
 
+def voter_items(voters, fields, columnar, meta):
+    """Response for a page of voters (model objects, or rows of `fields`) plus paging keys."""
+    if columnar:
+        chunks, headers = voter_projection.columns_response(
+            fields, voters, meta, "gzip" in request.accept_encodings
+        )
+        return Response(chunks, mimetype="application/json", headers=headers)
+    if fields is not None:
+        return jsonify(dict(meta, items=[dict(zip(fields, row)) for row in voters]))
+    return jsonify(dict(meta, items=[v.to_dict() for v in voters]))
+
+# --- Voter search (ranked + type-ahead) ---
+@bp.route("/api/voters/search")
+def api_voter_search():
+    """
+    ?q=<text>&mode=ranked (default): fuzzy, relevance-ranked full voter rows.
+    ?q=<text>&mode=prefix: name/EPIC prefix suggestions for type-ahead.
+    Accepts the /api/voters filters as well.
+    """
+    q = request.args.get("q", "", type=str)
+    mode = request.args.get("mode", "ranked", type=str)
+    limit = request.args.get("limit", 20 if mode == "ranked" else 10, type=int)
+
+    query = filter_voters(Voter.query, **filters_from_args(request.args))
+
+    if mode == "prefix":
+        rows = voter_search.prefix(query, q, limit)
+        return jsonify({"mode": "prefix", "items": [
+            {"ID": r.id, "Name": r.name, "House number": r.house_number, "EPIC number": r.epic_number}
+            for r in rows
+        ]})
+
+    items = []
+    for voter, score in voter_search.ranked(query, q, limit):
+        row = voter.to_dict()
+        row["score"] = round(float(score), 3)
+        items.append(row)
+    return jsonify({"mode": "ranked", "items": items})
+
+# --- Streaming voter export ---
+EXPORT_FORMATS = {
+    "csv": ("text/csv; charset=utf-8", "csv", voter_export.csv_chunks),
+    "parquet": ("application/vnd.apache.parquet", "parquet", voter_export.parquet_chunks),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrows", voter_export.arrow_chunks),
+}
+
+@bp.route("/api/voters/export")
+def api_voters_export():
+    """Stream the filtered voter list as CSV (default), Parquet or Arrow."""
+    fmt = request.args.get("format", "csv", type=str).lower()
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({"error": f"Unsupported format: {fmt}"}), 400
+    if fmt != "csv" and not voter_export.pyarrow_available():
+        return jsonify({"error": f"{fmt} export requires pyarrow on the server"}), 501
+    mimetype, extension, writer = EXPORT_FORMATS[fmt]
+
+    query = filter_voters(Voter.query, **filters_from_args(request.args))
+    search = request.args.get("search", type=str)
+    if search:
+        query = search_voters(query, search)
+
+    chunks = writer(voter_export.export_rows(query))
+    headers = {"Content-Disposition": f"attachment; filename=voter_export.{extension}"}
+    if fmt == "csv" and "gzip" in request.accept_encodings:
+        chunks = voter_export.gzip_chunks(chunks)
+        headers["Content-Encoding"] = "gzip"
+        headers["Vary"] = "Accept-Encoding"
+
+    return Response(stream_with_context(chunks), mimetype=mimetype, headers=headers)
+
 # --- Update voter details ---
-@app.route("/api/voters/<int:voter_id>", methods=["PUT"])
+@bp.route("/api/voters/<int:voter_id>", methods=["PUT"])
 def update_voter(voter_id):
     voter = Voter.query.get_or_404(voter_id)
     data = request.get_json()
+    if "version" in data and data["version"] != voter.version:
+        return jsonify({"error": "Voter was changed by someone else", "version": voter.version}), 409
 
     voter.mobile_number = data.get("mobile_number", voter.mobile_number)
     voter.occupation = data.get("occupation", voter.occupation)
-    voter.education_level = data.get("education_level", voter.education_level)
-    voter.political_affiliation = data.get("political_affiliation", voter.political_affiliation)
+    try:
+        voter.education_level = data.get("education_level", voter.education_level)
+        voter.political_affiliation = data.get("political_affiliation", voter.political_affiliation)
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 400
     voter.key_issues = data.get("key_issues", voter.key_issues)
     voter.remarks = data.get("remarks", voter.remarks)
 
-    db.session.commit()
+    try:
+        db.session.commit()
+    except StaleDataError:
+        db.session.rollback()
+        return jsonify({"error": "Voter was changed by someone else"}), 409
     return jsonify(voter.to_dict())
 
-# --- Household Grouping ---
-@app.route("/api/household-data")
-def api_household_data():
-    from models import VoterLocation
-    
-    households = {}
-    voters = Voter.query.order_by(Voter.id.asc()).all()
-
-    for v in voters:
-        loc = VoterLocation.query.filter_by(
-            voter_name=v.name,
-            voter_house_no=v.house_number
-        ).first()
-
-        voter_info = {
-            "id": v.id,
-            "name": v.name,
-            "landmark": loc.landmark if loc else "",
-            "latitude": loc.latitude if loc else "",
-            "longitude": loc.longitude if loc else "",
-        }
-
-        house_key = v.house_number if v.house_number else "No House Number"
-        households.setdefault(house_key, []).append(voter_info)
-
-    return jsonify([
-        {"house_number": hn, "voters": voters}
-        for hn, voters in households.items()
-    ])
-
-@app.route("/api/voter-location", methods=["POST"])
-def save_voter_location():
-    from models import VoterLocation
+# --- Bulk update (canvassing batches) ---
+@bp.route("/api/voters/bulk-update", methods=["POST"])
+def api_voters_bulk_update():
+    """
+    Apply many voter patches in one transaction. Body: {"updates": [{"id",
+    "version", <fields>}, ...]}. Returns a result per patch (updated, conflict,
+    not_found or invalid) and the count of each.
+    """
+    data = request.get_json(silent=True) or {}
+    patches = data.get("updates")
+    if not isinstance(patches, list) or not patches:
+        return jsonify({"error": "Expected a non-empty 'updates' list"}), 400
 
-    data = request.get_json()
-    name = data.get("name")
-    house = data.get("house_number")
+    try:
+        results = voter_bulk.apply_patches(db.session.connection(), patches)
+        db.session.commit()
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        print("Error applying bulk update:", e)
+        return jsonify({"error": "Bulk update failed"}), 500
+
+    summary = {}
+    for result in results:
+        summary[result["status"]] = summary.get(result["status"], 0) + 1
+    return jsonify({"results": results, "summary": summary})
+
+# --- Delta sync for offline worker devices ---
+@bp.route("/api/sync", methods=["GET", "POST"])
+def api_sync():
+    """
+    GET: rows changed and IDs deleted since `since` (a token from the previous
+    call; omit for a full sync), at most `limit` per call. Call again with the
+    returned token while `more` is true.
+    POST: queued offline edits {"voters": [...], "locations": [...], "tasks": [...]};
+    returns a result per edit.
+    """
+    if request.method == "GET":
+        try:
+            return jsonify(delta_sync.changes(
+                request.args.get("since"),
+                limit=request.args.get("limit", delta_sync.DEFAULT_LIMIT, type=int),
+            ))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"error": "Expected a JSON object of edits"}), 400
+    try:
+        results = delta_sync.apply_edits(data)
+        db.session.commit()
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        print("Error applying offline edits:", e)
+        return jsonify({"error": "Sync failed"}), 500
+    return jsonify(results)
 
-    if not name:
-        return jsonify({"error": "Missing name"}), 400
+# --- Household Grouping ---
+HOUSE_KEY = func.coalesce(func.nullif(Voter.house_number, ""), "No House Number")
 
-    # ✅ Check if location for same voter already exists
-    location = VoterLocation.query.filter_by(
-        voter_name=name,
-        voter_house_no=house
-    ).first()
+@bp.route("/api/household-data")
+def api_household_data():
+    """
+    Voters grouped by house number, a page of households at a time, with
+    each voter's saved location. `search` matches part of the house number.
+    """
+    page = request.args.get("page", 1, type=int)
+    per_page = request.args.get("per_page", 25, type=int)
+    search = request.args.get("search", "", type=str).strip()
+    if page < 1:
+        page = 1
+    if per_page < 1:
+        per_page = 25
+
+    keys = db.session.query(HOUSE_KEY.label("house_number"))
+    if search:
+        keys = keys.filter(Voter.house_number.ilike(f"%{search}%"))
+    keys = keys.group_by(HOUSE_KEY)
+    total = cached_count(keys, Voter.__tablename__, ("households", search.lower()))
+
+    households = keys.order_by(HOUSE_KEY).offset((page - 1) * per_page).limit(per_page).subquery()
+    voter = func.json_build_object(
+        "id", Voter.id,
+        "name", Voter.name,
+        "landmark", func.coalesce(VoterLocation.landmark, ""),
+        "latitude", VoterLocation.latitude,
+        "longitude", VoterLocation.longitude,
+    )
+    rows = db.session.query(households.c.house_number, func.json_agg(aggregate_order_by(voter, Voter.id))) \
+        .join(Voter, HOUSE_KEY == households.c.house_number) \
+        .outerjoin(VoterLocation, VoterLocation.voter_id == Voter.id) \
+        .group_by(households.c.house_number) \
+        .order_by(households.c.house_number).all()
 
+    return jsonify({
+        "items": [{"house_number": hn, "voters": voters} for hn, voters in rows],
+        "page": page,
+        "pages": -(-total // per_page) if total else 0,
+        "total": total,
+    })
+
+@bp.route("/api/voter-location", methods=["POST"])
+def save_voter_location():
+    data = request.get_json()
+    voter_id = data.get("voter_id")
+    if not voter_id:
+        return jsonify({"error": "Missing voter_id"}), 400
+    voter = db.session.get(Voter, voter_id)
+    if not voter:
+        return jsonify({"error": "Voter not found"}), 404
+
+    location = VoterLocation.query.filter_by(voter_id=voter.id).first()
     if not location:
-        location = VoterLocation(voter_name=name, voter_house_no=house)
+        location = VoterLocation(voter_id=voter.id)
         db.session.add(location)
 
+    location.voter_name = voter.name
+    location.voter_house_no = voter.house_number
     location.landmark = data.get("landmark")
     location.latitude = data.get("latitude")
     location.longitude = data.get("longitude")
@@ -486,10 +779,15 @@ def save_voter_location():
     }})
 
 # --- Campaign Tasks CRUD ---
-@app.route("/api/tasks", methods=["GET", "POST"])
+@bp.route("/api/tasks", methods=["GET", "POST"])
+@versioned(Task.__tablename__)
 def api_tasks():
     if request.method == "GET":
-        tasks = Task.query.order_by(Task.due_date).all()
+        query = Task.query
+        status = request.args.get("status", type=str)
+        if status:
+            query = query.filter(Task.status == status)
+        tasks = query.order_by(Task.due_date).all()
         return jsonify([t.to_dict() for t in tasks])
 
     if request.method == "POST":
@@ -504,7 +802,7 @@ def api_tasks():
         db.session.commit()
         return jsonify(task.to_dict()), 201
 
-@app.route("/api/tasks/<int:task_id>", methods=["PUT", "DELETE"])
+@bp.route("/api/tasks/<int:task_id>", methods=["PUT", "DELETE"])
 def api_task_update_delete(task_id):
     task = Task.query.get_or_404(task_id)
 
@@ -524,7 +822,8 @@ def api_task_update_delete(task_id):
         return jsonify({"message": "Task deleted"})
 
 # --- Communications ---
-@app.route("/api/messages", methods=["GET", "POST"])
+@bp.route("/api/messages", methods=["GET", "POST"])
+@versioned(Communication.__tablename__)
 def api_messages():
     if request.method == "GET":
         messages = Communication.query.order_by(Communication.created_at.desc()).all()
@@ -542,7 +841,8 @@ def api_messages():
         return jsonify(msg.to_dict()), 201
 
 # --- Reports ---
-@app.route("/api/reports", methods=["GET", "POST"])
+@bp.route("/api/reports", methods=["GET", "POST"])
+@versioned(Report.__tablename__)
 def api_reports():
     if request.method == "GET":
         reports = Report.query.order_by(Report.submitted_at.desc()).all()
@@ -559,56 +859,63 @@ def api_reports():
         db.session.commit()
         return jsonify(report.to_dict()), 201
 
+# ========================================
+# API Endpoints - Admin Module
+# ========================================
+
+# --- Bulk voter import (CSV, upsert on EPIC number) ---
+@bp.route("/api/admin/voters/import", methods=["POST"])
+def api_admin_voters_import():
+    upload = request.files.get("voter_data")
+    if not upload or not upload.filename:
+        return jsonify({"error": "No file uploaded (expected form field 'voter_data')"}), 400
+    if not upload.filename.lower().endswith(".csv"):
+        return jsonify({"error": "Only CSV files can be imported"}), 400
+
+    stream = io.TextIOWrapper(upload.stream, encoding="utf-8-sig", newline="")
+    try:
+        stats = voter_import.import_csv(db.session.connection(), stream)
+        db.session.commit()
+    except (ValueError, UnicodeDecodeError) as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        print("Error importing voters:", e)
+        return jsonify({"error": "Import failed"}), 500
+    return jsonify(stats)
+
+# --- In-process cache effectiveness ---
+@bp.route("/api/admin/cache-stats")
+def api_admin_cache_stats():
+    return jsonify({
+        "chat": chat_cache.stats(),
+        "segments": voter_segments.cache_stats(),
+        "counts": count_stats(),
+        "llm": llm_client.stats(),
+        "etags": etag_stats(),
+    })
+
 # ========================================
 # API Endpoints - Candidate Module
 # ========================================
 
 # --- Candidate KPIs for Command Center ---
-@app.route("/api/candidate/kpis")
+@bp.route("/api/candidate/kpis")
+@versioned(Voter.__tablename__, VoterAggregate.__tablename__, Task.__tablename__)
 def api_candidate_kpis():
     """Returns KPI data for the candidate command center"""
-    # Get voter statistics
-    total_voters = Voter.query.count()
-    contacted_voters = Voter.query.filter(
-        (Voter.mobile_number.isnot(None)) & (Voter.mobile_number != '')
-    ).count()
-    
-    supporters = Voter.query.filter(
-        Voter.political_affiliation.ilike('Supporter')
-    ).count()
-    
-    undecided = Voter.query.filter(
-        (Voter.political_affiliation.ilike('Neutral')) |
-        (Voter.political_affiliation.ilike('SwingVoter')) |
-        (Voter.political_affiliation.is_(None))
-    ).count()
-    
-    # Get task statistics
-    total_tasks = Task.query.count()
-    completed_tasks = Task.query.filter(Task.status.ilike('Completed')).count()
-    
-    return jsonify({
-        "votersContacted": {
-            "count": contacted_voters,
-            "total": total_voters
-        },
-        "supporters": supporters,
-        "undecided": undecided,
-        "tasksCompleted": {
-            "count": completed_tasks,
-            "total": total_tasks
-        }
-    })
+    return jsonify(live_events.kpis())
 
 # --- Candidate specific voter endpoint with filters ---
-@app.route("/api/candidate/voters")
+@bp.route("/api/candidate/voters")
 def api_candidate_voters():
     """Filtered voter list specifically for candidate analytics"""
     return api_voters()  # Reuse the existing voters endpoint with filters
 
 
 # --- Visualization API (supports optional same filters) ---
-@app.route("/api/candidate/visualization")
+@bp.route("/api/candidate/visualization")
 def api_candidate_visualization():
     """
     Returns aggregated counts for affiliation, age groups, top issues and gender split.
@@ -616,126 +923,39 @@ def api_candidate_visualization():
     """
     try:
         # Accept optional filters (same params as /api/voters)
-        gender = request.args.get("gender", type=str)
-        affiliation = request.args.get("affiliation", type=str)
-        age = request.args.get("age", type=str)
-        issues = request.args.get("issues", type=str)
-        occupation = request.args.get("occupation", type=str)
-        ward = request.args.get("ward", type=str)
-        education = request.args.get("education", type=str)
-
-        query = Voter.query
-
-        if gender:
-            g = gender.strip()
-            if g and g.lower() != "all":
-                query = query.filter(Voter.gender.ilike(g))
-
-        if affiliation:
-            if affiliation.lower() == 'empty':
-                 query = query.filter(or_(Voter.political_affiliation == None, Voter.political_affiliation == ''))
-            elif affiliation.lower() == 'swingvoter':
-                query = query.filter(or_(Voter.political_affiliation.ilike('SwingVoter'), Voter.political_affiliation.ilike('Neutral')))
-            else:
-                query = query.filter(Voter.political_affiliation.ilike(affiliation))
-
-        if age:
-            if age == "18-25":
-                query = query.filter(Voter.age.between(18, 25))
-            elif age == "26-40":
-                query = query.filter(Voter.age.between(26, 40))
-            elif age == "41-60":
-                query = query.filter(Voter.age.between(41, 60))
-            elif age == "60+":
-                query = query.filter(Voter.age >= 60)
-
-        if issues:
-            query = query.filter(Voter.key_issues.ilike(f"%{issues}%"))
-
-        if occupation:
-            query = query.filter(Voter.occupation.ilike(f"%{occupation}%"))
-
-        if ward:
-            try:
-                query = query.filter(Voter.booth_id == int(ward))
-            except Exception:
-                query = query.filter(Voter.booth_id == ward)
-
-        if education:
-            query = query.filter(Voter.education_level.ilike(f"%{education}%"))
-
-        voters = query.all()
-
-        affiliations = Counter()
-        age_groups = {"18-25": 0, "26-40": 0, "41-60": 0, "60+": 0}
-        issue_counts = Counter()
-        gender_split = Counter()
-
-        for v in voters:
-            # Normalize affiliation: group 'Neutral' and 'SwingVoter' into 'SwingVoter'
-            raw = (v.political_affiliation or "").strip()
-            if raw == "":
-                affiliations["Empty"] += 1
-            else:
-                normalized = raw.capitalize()
-                if normalized.lower() in ("neutral", "swingvoter"):
-                    affiliations["SwingVoter"] += 1
-                else:
-                    affiliations[normalized] += 1
-
-            # Age groups
-            if v.age:
-                if v.age <= 25:
-                    age_groups["18-25"] += 1
-                elif v.age <= 40:
-                    age_groups["26-40"] += 1
-                elif v.age <= 60:
-                    age_groups["41-60"] += 1
-                else:
-                    age_groups["60+"] += 1
-
-            # Issues
-            if v.key_issues:
-                for issue in [i.strip().lower() for i in v.key_issues.split(",") if i.strip()]:
-                    issue_counts[issue] += 1
-
-            # Gender split
-            gender_split[(v.gender or "Other").capitalize()] += 1
-
-        top_issues = dict(issue_counts.most_common(10))
-
-        return jsonify({
-            "affiliations": dict(affiliations),
-            "ageGroups": age_groups,
-            "topIssues": top_issues,
-            "genderSplit": dict(gender_split)
-        })
+        filters = filters_from_args(request.args)
+
+        snapshot = voter_snapshot.get()
+        if snapshot:
+            return jsonify(snapshot.visualization(**filters))
+
+        if aggregates.covers(issues=filters["issues"], occupation=filters["occupation"], ward=filters["ward"]):
+            return jsonify(aggregates.visualization(
+                gender=filters["gender"], affiliation=filters["affiliation"], age=filters["age"],
+                ward=filters["ward"], education=filters["education"]
+            ))
+
+        # Issue/occupation filters need the voter rows; count them database-side
+        query = filter_voters(Voter.query, **filters)
+        return jsonify(aggregates.live_visualization(query))
 
     except Exception as e:
         print("Visualization Error:", e)
         return jsonify({"error": "Failed to compute visualization data"}), 500
 # --- Booth Management ---
-@app.route("/api/booths", methods=["GET", "POST"])
+@bp.route("/api/booths", methods=["GET", "POST"])
+@versioned(Booth.__tablename__, Voter.__tablename__, VoterAggregate.__tablename__)
 def api_booths():
     if request.method == "GET":
-        booths = Booth.query.all()
+        # Voter counts per booth come from the maintained booth buckets
+        totals = aggregates.booth_totals()
         booth_data = []
-        
-        for booth in booths:
-            # Calculate voter statistics for each booth
-            booth_voters = Voter.query.filter_by(booth_id=booth.id).all()
-            total_voters = len(booth_voters)
-            supporters = len([v for v in booth_voters if v.political_affiliation and v.political_affiliation.lower() == 'supporter'])
-            opponents = len([v for v in booth_voters if v.political_affiliation and v.political_affiliation.lower() == 'opponent'])
-            neutral = total_voters - supporters - opponents
-            
+
+        for booth in Booth.query.all():
+            stats = totals.get(booth.id, {"total_voters": 0, "supporters": 0, "opponents": 0})
             booth_dict = booth.to_dict()
-            booth_dict.update({
-                "total_voters": total_voters,
-                "supporters": supporters,
-                "opponents": opponents,
-                "neutral": neutral
-            })
+            booth_dict.update(stats)
+            booth_dict["neutral"] = stats["total_voters"] - stats["supporters"] - stats["opponents"]
             booth_data.append(booth_dict)
         
         return jsonify(booth_data)
@@ -758,7 +978,7 @@ def api_booths():
         db.session.commit()
         return jsonify(booth.to_dict()), 201
 
-@app.route("/api/booths/<int:booth_id>", methods=["PUT", "DELETE"])
+@bp.route("/api/booths/<int:booth_id>", methods=["PUT", "DELETE"])
 def api_booth_update_delete(booth_id):
     booth = Booth.query.get_or_404(booth_id)
 
@@ -785,7 +1005,8 @@ def api_booth_update_delete(booth_id):
         return jsonify({"message": "Booth deleted successfully"})
 
 # --- Segment Management ---
-@app.route("/api/segments", methods=["GET", "POST"])
+@bp.route("/api/segments", methods=["GET", "POST"])
+@versioned(Segment.__tablename__)
 def api_segments():
     if request.method == "GET":
         segments = Segment.query.order_by(Segment.created_at.desc()).all()
@@ -798,26 +1019,111 @@ def api_segments():
         existing_segment = Segment.query.filter_by(name=data.get("name")).first()
         if existing_segment:
             return jsonify({"error": "Segment name already exists"}), 400
+
+        try:
+            filters = voter_segments.compile_filters(data.get("filters", {}))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
         
         segment = Segment(
             name=data.get("name"),
-            filters=data.get("filters", {})
+            filters=filters
         )
         db.session.add(segment)
         db.session.commit()
         return jsonify(segment.to_dict()), 201
 
-@app.route("/api/segments/<int:segment_id>", methods=["DELETE"])
+@bp.route("/api/segments/<int:segment_id>", methods=["DELETE"])
 def api_segment_delete(segment_id):
     segment = Segment.query.get_or_404(segment_id)
     db.session.delete(segment)
     db.session.commit()
     return jsonify({"message": "Segment deleted successfully"})
 
+@bp.route("/api/segments/<int:segment_id>/voters")
+def api_segment_voters(segment_id):
+    """Members of a segment, paged like /api/voters."""
+    segment = Segment.query.get_or_404(segment_id)
+    page = max(request.args.get("page", 1, type=int), 1)
+    per_page = request.args.get("per_page", 50, type=int)
+    if per_page < 1:
+        per_page = 20
+    try:
+        paging = page_args()
+        query = voter_segments.segment_query(segment)
+        total = voter_segments.segment_stats(segment)["total"]
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return voter_page(query, page, per_page, total, paging)
+
+@bp.route("/api/segments/<int:segment_id>/stats")
+def api_segment_stats(segment_id):
+    segment = Segment.query.get_or_404(segment_id)
+    try:
+        stats = voter_segments.segment_stats(segment)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(dict(stats, id=segment.id, name=segment.name, filters=segment.filters))
+
+@bp.route("/api/candidate/segment-performance")
+def api_candidate_segment_performance():
+    """Member count and supporter share of every saved segment (cached per voter_list version)."""
+    performance = []
+    for segment in Segment.query.order_by(Segment.created_at.desc()).all():
+        try:
+            stats = voter_segments.segment_stats(segment)
+        except ValueError as e:
+            print(f"Skipping segment {segment.id}: {e}")
+            continue
+        performance.append(dict(stats, id=segment.id, name=segment.name))
+    return jsonify(performance)
+
+@bp.route("/api/segments/query", methods=["POST"])
+def api_segments_query():
+    """
+    Set algebra over segments and filter values from the bitmap index, e.g.
+    {"expr": {"and": [{"segment": 1}, {"not": {"segment": 2}}]}, "per_page": 50}.
+    Returns the member count and, unless per_page is 0, a keyset page of voters.
+    """
+    data = request.get_json() or {}
+    per_page = data.get("per_page", 50)
+    try:
+        bitmap = voter_bitmaps.evaluate(data.get("expr"))
+        after = decode_cursor(data.get("cursor"))
+        per_page = int(per_page)
+    except (ValueError, TypeError) as e:
+        return jsonify({"error": str(e)}), 400
+
+    result = {"count": len(bitmap)}
+    if per_page > 0:
+        ids = bitmap.page(after, per_page + 1)
+        has_more = len(ids) > per_page
+        ids = ids[:per_page]
+        voters = Voter.query.filter(Voter.id.in_(ids)).order_by(Voter.id.asc()).all() if ids else []
+        result["items"] = [v.to_dict() for v in voters]
+        result["next_cursor"] = encode_cursor(ids[-1]) if has_more else None
+    return jsonify(result)
+
+@bp.route("/api/segments/overlap")
+def api_segments_overlap():
+    """Pairwise member overlap of all saved segments."""
+    saved = Segment.query.order_by(Segment.id.asc()).all()
+    valid = []
+    for segment in saved:
+        try:
+            voter_segments.compile_filters(segment.filters)
+            valid.append(segment)
+        except ValueError as e:
+            print(f"Skipping segment {segment.id}: {e}")
+    return jsonify({
+        "segments": [{"id": s.id, "name": s.name} for s in valid],
+        "matrix": voter_bitmaps.overlap_matrix(valid),
+    })
+
 # --- Activity Feed for Command Center ---
 from datetime import datetime, timezone
 
-@app.route("/api/candidate/activity-feed")
+@bp.route("/api/candidate/activity-feed")
 def api_activity_feed():
     """Returns recent activities for the command center (safe timestamp handling)"""
     activities = []
@@ -868,47 +1174,72 @@ def api_activity_feed():
 
     return jsonify(activities[:10])
 
+# --- Live activity and KPI push (server-sent events) ---
+# One broadcaster per process, started by the first stream
+live = live_events.from_env()
+
+@bp.route("/api/candidate/activity-stream")
+def api_activity_stream():
+    """
+    Event stream for the command center: the full KPIs first, then activity
+    items (unnamed events), `kpis` events with the KPIs that changed and
+    `news` events with the news list when a feed refresh changed it.
+    A reconnecting browser sends Last-Event-ID and is sent the activity it missed.
+    """
+    listener = live.subscribe()
+    if listener is None:
+        return jsonify({"error": "Too many live listeners"}), 503, {"Retry-After": "30"}
+    try:
+        live.start(current_app._get_current_object())
+        news.start()
+        initial = [live_events.format_event(live.current_kpis(), event="kpis")]
+        last_id = request.headers.get("Last-Event-ID", "")
+        if last_id.isdigit():
+            initial += [
+                live_events.format_event(item, event_id=seq)
+                for seq, _, item in live_events.activity(int(last_id))
+            ]
+    except Exception as e:
+        live.unsubscribe(listener)
+        print("Error opening activity stream:", e)
+        return jsonify({"error": str(e)}), 500
+
+    # The generator only reads the listener's queue; the request's database
+    # session is released when the response starts
+    return Response(live.stream(listener, initial), mimetype="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+    })
+
 
 # ========================================
 # Candidate Module - Election News Feed
 # ========================================
-import feedparser
+# Refreshed in the background once the first request starts it; changes
+# are pushed to the open activity streams as `news` events
+news = news_feeds.from_env()
+news.on_change(lambda items: live.publish(live_events.format_event(items, event="news")))
 
-@app.route("/api/candidate/news")
+@bp.route("/api/candidate/news")
 def api_candidate_news():
-    """Fetch latest election-related news links from multiple RSS sources."""
-    feeds = [
-        "https://www.livemint.com/rss/elections",
-        "https://indianexpress.com/section/political-pulse/feed/",
-        "https://timesofindia.indiatimes.com/rssfeeds/66949542.cms",  # TOI Elections
-    ]
+    """Latest election-related news links merged from multiple RSS sources."""
+    return jsonify(news.latest())
 
-    all_news = []
-    for rss_url in feeds:
-        try:
-            feed = feedparser.parse(rss_url)
-            for entry in feed.entries[:5]:
-                all_news.append({
-                    "title": entry.get("title"),
-                    "url": entry.get("link"),
-                    "source": feed.feed.get("title", "Unknown Source"),
-                    "publishedAt": entry.get("published", "")
-                })
-        except Exception as e:
-            print(f"Error fetching {rss_url}: {e}")
-
-    # Sort all news by published date (descending)
-    all_news = sorted(all_news, key=lambda x: x["publishedAt"], reverse=True)
-    return jsonify(all_news[:15])  # Return top 15 combined items
 # ========================================
-# Cohere summarizes top voter issues
+# LLM summary of the top voter issues
 # ========================================
-@app.route("/api/candidate/insights", methods=["GET"])
-def api_candidate_insights():
+# Prompt for the current issue distribution, and the last summary generated,
+# served while the one for a changed distribution is prepared
+_insights = {"summary": None}
+
+def issues_summary_prompt():
+    """LLM prompt for the top ten issues, or None when there are none."""
+    mentions = func.count(VoterIssue.voter_id)
     key_issue_counts = (
-        db.session.query(Voter.key_issues, func.count(Voter.key_issues))
-        .group_by(Voter.key_issues)
-        .order_by(func.count(Voter.key_issues).desc())
+        db.session.query(Issue.name, mentions)
+        .join(VoterIssue, VoterIssue.issue_id == Issue.id)
+        .group_by(Issue.name)
+        .order_by(mentions.desc(), Issue.name)
         .limit(10)
         .all()
     )
@@ -917,25 +1248,262 @@ def api_candidate_insights():
         f"{issue}: {count} voters"
         for issue, count in key_issue_counts if issue
     )
+    return f"Summarize voter concerns: {issues_text}" if issues_text else None
 
-    if not issues_text:
-        return jsonify({"summary": "No issue data found"}), 200
+def prefetch_insights_summary():
+    """Start generating the summary of the current distribution in the background."""
+    _insights["prompt"] = prompt = issues_summary_prompt()
+    if prompt:
+        llm_client.prefetch(prompt, max_tokens=120)
 
-    response = cohere_client.generate(
-        model="command-xlarge-nightly",
-        prompt=f"Summarize voter concerns: {issues_text}",
-        max_tokens=120,
-        temperature=0.4
-    )
+# Run by the live events thread whenever the issue links change
+live.watch((VoterIssue.__tablename__,), prefetch_insights_summary)
 
+@bp.route("/api/candidate/insights", methods=["GET"])
+def api_candidate_insights():
+    """
+    Summary of the top ten issues. It is generated in the background when the
+    issue distribution changes (voter_issues' version moves), not when it is
+    viewed; until it is ready the previous summary is returned with
+    `pending: true`.
+    """
+    live.start(current_app._get_current_object())
+    if "prompt" not in _insights:
+        # First view, before the live events thread has looked at the issues
+        prefetch_insights_summary()
+    prompt = _insights["prompt"]
+    if not prompt:
+        return jsonify({"summary": "No issue data found"}), 200
+
+    # The reply generated for this distribution (prefetch only starts it
+    # again if the cached one expired)
+    summary = llm_client.prefetch(prompt, max_tokens=120)
+    if summary:
+        _insights["summary"] = summary
     return jsonify({
-        "insights_summary": response.generations[0].text.strip()
+        "insights_summary": summary or _insights["summary"],
+        "pending": summary is None and llm_client.enabled
     })
 
+# ========================================
+# CLI - Maintenance
+# ========================================
+@bp.cli.command("rebuild-aggregates")
+def rebuild_aggregates():
+    """Recompute the issue links and voter aggregate tables from voter_list."""
+    voter_issues.rebuild()
+    aggregates.rebuild()
+    db.session.commit()
+    click.echo("Voter aggregates rebuilt.")
+
+@bp.cli.command("prune-voter-changes")
+@click.option("--keep-days", default=7, help="Keep log entries newer than this many days.")
+def prune_voter_changes(keep_days):
+    """Drop old voter_changes entries (the snapshot's change log), keeping the newest ones."""
+    removed = voter_changes.prune(keep_days)
+    db.session.commit()
+    click.echo(f"Removed {removed} voter change log entries.")
+
+@bp.cli.command("check-plans")
+@click.option("--min-rows", default=10000, help="Ignore sequential scans of tables smaller than this.")
+@click.option("--max-share", default=0.2, help="Flag scans expected to keep less than this share of the table.")
+@click.option("--strict", is_flag=True,
+              help="Disable sequential scans and flag any left, whatever the table size (for CI databases).")
+def check_plans(min_rows, max_share, strict):
+    """EXPLAIN the voter filters and list queries; exit non-zero if a selective one scans a large table."""
+    missing = query_plans.missing_extensions()
+    if missing:
+        raise click.ClickException(
+            f"Missing PostgreSQL extension(s): {', '.join(missing)}; "
+            "the voter search and substring filter indexes need them (see README)"
+        )
+    failures = query_plans.check(min_rows=min_rows, max_share=max_share, strict=strict)
+    for label, table, rows, total in failures:
+        click.echo(f"{label}: Seq Scan on {table} keeping ~{rows} of {total} rows")
+    if failures:
+        raise click.ClickException(f"{len(failures)} query plan(s) fall back to a sequential scan")
+    click.echo("All query plans use indexes.")
+
+@bp.cli.command("check-visualization")
+def check_visualization():
+    """Compare every visualization path with the original Python loop over all filter combinations."""
+    checked, failures = visualization_parity.check()
+    for path, filters, found in failures[:20]:
+        active = ",".join(f"{k}={v}" for k, v in filters.items() if v is not None) or "no filters"
+        click.echo(f"{path} [{active}]: " + "; ".join(found))
+    if failures:
+        raise click.ClickException(f"{len(failures)} of {checked} visualization results differ from the reference")
+    click.echo(f"All {checked} visualization results match the reference.")
+
+@bp.cli.command("ingest-roll")
+@click.argument("pdf_path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--workers", type=int, default=None, help="Parser processes (default: CPU count).")
+@click.option("--booth-number", default=None, help="Assign the voters to this booth.")
+def ingest_roll(pdf_path, workers, booth_number):
+    """Load an ECI electoral roll PDF into voter_list (needs pdfplumber). Resumable."""
+    booth_id = None
+    if booth_number:
+        booth = Booth.query.filter_by(booth_number=booth_number).first()
+        if not booth:
+            raise click.ClickException(f"No booth with number {booth_number}")
+        booth_id = booth.id
+    started = time.perf_counter()
+    loaded = roll_ingest.ingest(pdf_path, workers=workers, booth_id=booth_id, report=click.echo)
+    elapsed = time.perf_counter() - started
+    click.echo(f"Loaded {loaded} voters in {elapsed:.1f}s.")
+
+@bp.cli.command("import-voters")
+@click.argument("csv_path", type=click.Path(exists=True, dir_okay=False))
+def import_voters(csv_path):
+    """Upsert a voter CSV (e.g. ImpFiles/Pandharpur_final.csv) into voter_list on EPIC number."""
+    started = time.perf_counter()
+    with open(csv_path, encoding="utf-8-sig", newline="") as fh:
+        try:
+            stats = voter_import.import_csv(db.session.connection(), fh)
+        except ValueError as e:
+            raise click.ClickException(str(e))
+    db.session.commit()
+    elapsed = time.perf_counter() - started
+    for error in stats["errors"]:
+        click.echo(f"line {error['line']}: {error['error']}")
+    click.echo(f"{stats['rows']} rows: {stats['inserted']} inserted, {stats['updated']} updated, "
+               f"{stats['duplicates']} duplicate EPICs, {stats['rejected']} rejected "
+               f"({elapsed:.1f}s, {stats['rows'] / elapsed:.0f} rows/s).")
+
+# ========================================
+# CLI - Benchmarks
+# ========================================
+@bp.cli.command("bench-chat")
+@click.option("--threads", default="1,2,4,8,16", help="Comma-separated worker thread counts.")
+@click.option("--requests", "total", default=400, help="Requests per run.")
+@click.option("--message", default="female voters", help="Chat message to send.")
+def bench_chat(threads, total, message):
+    """Measure /chat throughput as worker threads are added, with the reply cache off (cold) and warm."""
+    from concurrent.futures import ThreadPoolExecutor
+    app = current_app._get_current_object()
+
+    def worker(n):
+        client = app.test_client()
+        for _ in range(n):
+            client.post("/chat", json={"message": message})
+
+    def run(count):
+        share = [total // count + (1 if i < total % count else 0) for i in range(count)]
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=count) as pool:
+            list(pool.map(worker, share))
+        return time.perf_counter() - start
+
+    maxsize = chat_cache.maxsize
+    for count in [int(t) for t in threads.split(",") if t.strip()]:
+        # A zero-size cache drops every reply, so each request computes its insight
+        chat_cache.clear()
+        chat_cache.maxsize = 0
+        try:
+            cold = run(count)
+        finally:
+            chat_cache.maxsize = maxsize
+        worker(1)  # one request fills the cache
+        warm = run(count)
+        for label, elapsed in (("cold", cold), ("warm", warm)):
+            click.echo(f"threads={count:<3} {label} requests={total} time={elapsed:.2f}s rps={total / elapsed:.1f}")
+
+@bp.cli.command("bench-startup")
+@click.option("--runs", default=10, help="Cold starts per case.")
+def bench_startup(runs):
+    """Time cold process starts: bare Flask + SQLAlchemy, importing the app, and `flask db heads`."""
+    import statistics
+    import subprocess
+    import sys
+
+    cases = {
+        "flask + sqlalchemy imports": [sys.executable, "-c", "import flask, flask_sqlalchemy, sqlalchemy"],
+        "import app": [sys.executable, "-c", "import app"],
+        "flask db heads": [sys.executable, "-m", "flask", "--app", "app", "db", "heads"],
+    }
+    for label, command in cases.items():
+        timings = []
+        for _ in range(runs):
+            started = time.perf_counter()
+            subprocess.run(command, cwd=current_app.root_path, check=True, capture_output=True)
+            timings.append(time.perf_counter() - started)
+        click.echo(f"{label:<28} median={statistics.median(timings) * 1000:.0f}ms "
+                   f"min={min(timings) * 1000:.0f}ms")
+
+@bp.cli.command("bench-import")
+@click.option("--rows", default="10000,100000,1000000", help="Comma-separated synthetic CSV sizes.")
+def bench_import(rows):
+    """Measure CSV import rows/s for new and for existing EPICs. Rolls back; the database is unchanged."""
+    import tempfile
+
+    for count in [int(r) for r in rows.split(",") if r.strip()]:
+        with tempfile.TemporaryFile("w+", newline="") as fh:
+            writer = csv.writer(fh)
+            writer.writerow(["ID", "Name", "Father's or Husband's name", "Age", "Gender",
+                             "House number", "EPIC number"])
+            for i in range(count):
+                writer.writerow([i + 1, f"Bench Voter {i}", f"Bench Relative {i}", 18 + i % 70,
+                                 ("Male", "Female")[i % 2], f"{i % 500}", f"BENCH{i:09d}"])
+
+            # First pass inserts every row, the second updates them all
+            for label in ("insert", "update"):
+                fh.seek(0)
+                started = time.perf_counter()
+                stats = voter_import.import_csv(db.session.connection(), fh)
+                elapsed = time.perf_counter() - started
+                click.echo(f"rows={count:<8} {label}: {elapsed:.2f}s "
+                           f"rows/s={count / elapsed:.0f} "
+                           f"(inserted={stats['inserted']} updated={stats['updated']})")
+        db.session.rollback()
+
+@bp.cli.command("bench-snapshot")
+@click.option("--rows", "count", default=1000000, help="Synthetic voters in the snapshot.")
+@click.option("--runs", default=50, help="Timed runs per query.")
+def bench_snapshot(count, runs):
+    """Time filtered histograms on a synthetic in-memory columnar snapshot (needs NumPy)."""
+    if not voter_snapshot.available():
+        raise click.ClickException("NumPy is not installed")
+    import random
+
+    rng = random.Random(7)
+    genders = ["Male", "Female", "Other", None]
+    affiliations = ["Supporter", "Opponent", "SwingVoter", None]
+    education = ["Graduate", "HSC", "SSC", None]
+    occupations = ["Farmer", "Teacher", "Labour", "Business", None]
+    issues = ["water", "roads", "jobs", "electricity", "health"]
+    rows = [
+        (i, rng.randint(18, 95), rng.randint(1, 300), rng.random() < 0.3, rng.choice(genders),
+         rng.choice(affiliations), rng.choice(education), rng.choice(occupations))
+        for i in range(1, count + 1)
+    ]
+    links = [(i, name) for i in range(1, count + 1) if i % 2 for name in rng.sample(issues, 2)]
+    snapshot = voter_snapshot.VoterSnapshot.from_rows(rows, links)
+    del rows, links
+    click.echo(f"voters={len(snapshot)} memory={snapshot.nbytes() / len(snapshot):.1f} bytes/voter")
+
+    cases = {
+        "kpis": lambda: snapshot.kpis(),
+        "histogram gender+age": lambda: snapshot.visualization(gender="female", age="18-25"),
+        "histogram booth+affiliation": lambda: snapshot.visualization(ward="42", affiliation="swingvoter"),
+        "histogram issue+occupation": lambda: snapshot.visualization(issues="water", occupation="farm"),
+    }
+    for label, run in cases.items():
+        timings = []
+        for _ in range(runs):
+            started = time.perf_counter()
+            run()
+            timings.append(time.perf_counter() - started)
+        timings.sort()
+        click.echo(f"{label:<30} median={timings[len(timings) // 2] * 1000:.2f}ms "
+                   f"p95={timings[int(len(timings) * 0.95)] * 1000:.2f}ms")
+
 # ========================================
 # Run
 # ========================================
+app = create_app()
+
 if __name__ == "__main__":
     with app.app_context():
         db.create_all()
+        voter_snapshot.get()  # load the columnar snapshot up front when enabled
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,118 @@
+# categories.py
+"""
+Canonical values of the categorical voter columns.
+
+Gender, Political Affiliation and Education Level are stored as smallint
+codes referencing the genders, affiliations and education_levels lookup
+tables. The codes are fixed here, and the lookup tables hold the same rows,
+seeded by the migration. The ORM maps codes to canonical names both ways
+(CategoryCode), so Voter.gender reads and compares as "Female". Model
+validators canonicalize on assignment, so free-form input ("f", "neutral",
+"12th") is mapped to a canonical value or rejected.
+
+Neutral and SwingVoter were always treated as one group; both map to
+SwingVoter. An empty value is NULL.
+"""
+import re
+
+from sqlalchemy import SmallInteger, case
+from sqlalchemy.types import TypeDecorator
+
+NAMES = {
+    "gender": {1: "Male", 2: "Female", 3: "Other"},
+    "affiliation": {1: "Supporter", 2: "Opponent", 3: "SwingVoter"},
+    "education": {
+        1: "Illiterate", 2: "Primary", 3: "SSC", 4: "HSC", 5: "Diploma",
+        6: "Graduate", 7: "Post Graduate", 8: "Other",
+    },
+}
+TABLES = {"gender": "genders", "affiliation": "affiliations", "education": "education_levels"}
+
+# Extra spellings, keyed by _fold()ed text; every canonical name matches itself
+ALIASES = {
+    "gender": {
+        "m": "Male", "man": "Male", "purush": "Male", "पुरुष": "Male",
+        "f": "Female", "woman": "Female", "fermale": "Female", "stri": "Female", "स्त्री": "Female", "महिला": "Female",
+        "t": "Other", "transgender": "Other", "thirdgender": "Other", "इतर": "Other",
+    },
+    "affiliation": {
+        "neutral": "SwingVoter", "swing": "SwingVoter", "undecided": "SwingVoter",
+    },
+    "education": {
+        "none": "Illiterate", "uneducated": "Illiterate", "nil": "Illiterate",
+        "middle": "Primary", "5th": "Primary", "7th": "Primary", "8th": "Primary",
+        "10th": "SSC", "matric": "SSC", "matriculation": "SSC",
+        "12th": "HSC", "intermediate": "HSC",
+        "iti": "Diploma", "polytechnic": "Diploma",
+        "graduation": "Graduate", "degree": "Graduate", "ba": "Graduate", "bsc": "Graduate",
+        "bcom": "Graduate", "be": "Graduate", "btech": "Graduate",
+        "postgraduate": "Post Graduate", "pg": "Post Graduate", "ma": "Post Graduate",
+        "msc": "Post Graduate", "mcom": "Post Graduate", "mba": "Post Graduate",
+        "mtech": "Post Graduate", "phd": "Post Graduate",
+    },
+}
+
+
+def _fold(value):
+    return re.sub(r"[\s.\-_/]+", "", value).lower()
+
+_LOOKUP = {
+    kind: dict(
+        {_fold(name): name for name in names.values()},
+        **{alias: name for alias, name in ALIASES[kind].items()},
+    )
+    for kind, names in NAMES.items()
+}
+CODES = {kind: {name: code for code, name in names.items()} for kind, names in NAMES.items()}
+
+
+def canonical(kind, value):
+    """Canonical name for a raw value, None for empty. Raises ValueError if unknown."""
+    if value is None:
+        return None
+    value = " ".join(str(value).split())
+    if not value or value == "-":
+        return None
+    name = _LOOKUP[kind].get(_fold(value))
+    if name is None:
+        allowed = ", ".join(NAMES[kind].values())
+        raise ValueError(f"Unknown {kind} {value!r}; expected one of: {allowed}")
+    return name
+
+def code(kind, value):
+    """Code for a raw value, None for empty. Raises ValueError if unknown."""
+    name = canonical(kind, value)
+    return None if name is None else CODES[kind][name]
+
+def matching_codes(kind, term):
+    """Codes whose canonical name contains term, ignoring case."""
+    term = term.lower()
+    return [code for code, name in NAMES[kind].items() if term in name.lower()]
+
+def key(column, kind):
+    """SQL expression: lower-case canonical name of a code column, '' for NULL."""
+    return case({code: name.lower() for code, name in NAMES[kind].items()}, value=column, else_="")
+
+def key_sql(column, kind):
+    """Raw SQL for key(): `column` is the quoted column reference."""
+    whens = " ".join(f"WHEN {code} THEN '{name.lower()}'" for code, name in NAMES[kind].items())
+    return f"CASE {column} {whens} ELSE '' END"
+
+
+class CategoryCode(TypeDecorator):
+    """smallint code column that reads and binds as the canonical name."""
+
+    impl = SmallInteger
+    cache_ok = True
+
+    def __init__(self, kind):
+        super().__init__()
+        self.kind = kind
+
+    def process_bind_param(self, value, dialect):
+        if value is None or isinstance(value, int):
+            return value
+        return code(self.kind, value)
+
+    def process_result_value(self, value, dialect):
+        return None if value is None else NAMES[self.kind].get(value)
@@ -0,0 +1,78 @@
+# conditional_get.py
+"""
+Conditional GETs for read endpoints, driven by table_versions.
+
+@versioned("tasks") on a view gives its GET responses a strong ETag built
+from the request path and query string and the write counters of the
+tables the payload is read from. When If-None-Match holds the current tag
+the view doesn't run: one primary-key lookup in table_versions answers 304.
+Responses carry Cache-Control: no-cache, so browsers keep the body and
+revalidate on every fetch. Other methods pass straight through.
+
+The tables listed must cover everything the payload is derived from, and
+every write to them must bump its counter (ORM commits do; raw SQL writers
+call table_versions.bump()).
+"""
+import functools
+import hashlib
+import threading
+
+from flask import current_app, request
+from sqlalchemy import select
+
+from models import db, TableVersion
+
+_stats = {}
+_lock = threading.Lock()
+
+
+def etag(tables):
+    """Current tag for this request's URL over the given tables."""
+    versions = dict(db.session.execute(
+        select(TableVersion.table_name, TableVersion.version).where(TableVersion.table_name.in_(tables))
+    ).all())
+    raw = "|".join(
+        [request.path, request.query_string.decode("latin-1")]
+        + [f"{table}={versions.get(table, 0)}" for table in tables]
+    )
+    return hashlib.blake2b(raw.encode(), digest_size=12).hexdigest()
+
+def _count(endpoint, not_modified):
+    with _lock:
+        counts = _stats.setdefault(endpoint, {"requests": 0, "not_modified": 0})
+        counts["requests"] += 1
+        counts["not_modified"] += not_modified
+
+def etag_stats():
+    """Per endpoint: conditional-capable GETs served and how many were 304s."""
+    with _lock:
+        return {
+            endpoint: dict(counts, hit_rate=round(counts["not_modified"] / counts["requests"], 3))
+            for endpoint, counts in _stats.items()
+        }
+
+
+def versioned(*tables):
+    tables = tuple(sorted(tables))
+
+    def decorate(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method != "GET":
+                return view(*args, **kwargs)
+            tag = etag(tables)
+            # The tag is read before the payload: a write committed in between
+            # makes the body newer than its tag, which only costs a later 200
+            if request.if_none_match.contains(tag):
+                _count(request.endpoint, True)
+                response = current_app.response_class(status=304)
+            else:
+                _count(request.endpoint, False)
+                response = current_app.make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(tag)
+            response.headers["Cache-Control"] = "no-cache"
+            return response
+        return wrapper
+    return decorate
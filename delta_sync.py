@@ -0,0 +1,248 @@
+# delta_sync.py
+"""
+Delta sync for offline-capable worker devices.
+
+voter_list, voter_locations, tasks, communications and reports carry a
+sync_seq (from one shared sequence), the writing transaction's ID and
+updated_at. Every insert and update takes a new sync_seq; deletes leave a
+row in sync_tombstones. GET /api/sync?since=<token> returns the rows changed
+and the IDs deleted after the token, oldest first and at most `limit` per
+call, with the token to send next time.
+
+Sequence values are taken when a row is written, not when its transaction
+commits, so a slow transaction can commit a row whose sync_seq is below the
+rows a device has already seen. The token therefore also holds the oldest
+transaction that was still running when it was issued; rows written by that
+transaction or later ones are sent again on the next call. Devices apply
+rows as upserts, so a repeat is harmless.
+
+Raw UPDATEs must include models.SYNC_TOUCH_SQL (inserts get the column
+defaults). Rows deleted by a database cascade (a deleted voter's location)
+leave no tombstone; devices drop them with their voter.
+
+POST /api/sync takes queued offline edits back: voter patches (see
+voter_bulk.py), voter locations (the later saved_at wins) and task updates
+(rejected as conflicts when the task changed after the seq the device saw).
+"""
+import base64
+from datetime import date, datetime, timezone
+import json
+
+from sqlalchemy import event, func, or_, select, text
+
+from models import db, CURRENT_XID, SyncTombstone, SyncTracked, Task, Voter, VoterLocation, Communication, Report
+import voter_bulk
+
+DEFAULT_LIMIT = 500
+MAX_LIMIT = 2000
+MAX_EDITS = 1000
+
+# Name in the payload -> (model, columns sent); every row also ends with its sync_seq
+SYNC_TABLES = {
+    "voters": (Voter, (
+        "id", "name", "father_or_husband_name", "age", "gender", "house_number", "epic_number",
+        "mobile_number", "occupation", "education_level", "political_affiliation", "key_issues",
+        "remarks", "has_voted", "booth_id", "version",
+    )),
+    "locations": (VoterLocation, ("id", "voter_id", "landmark", "latitude", "longitude", "saved_at")),
+    "tasks": (Task, ("id", "title", "description", "status", "due_date", "created_at")),
+    "communications": (Communication, ("id", "title", "body", "audience", "created_at")),
+    "reports": (Report, ("id", "title", "content", "date", "submitted_at")),
+}
+PAYLOAD_NAMES = {model.__tablename__: name for name, (model, _) in SYNC_TABLES.items()}
+
+TASK_FIELDS = ("title", "description", "status", "due_date")
+
+
+# -------------------------
+# Tokens
+# -------------------------
+def encode_token(seq, xmin):
+    raw = json.dumps({"seq": seq, "xmin": xmin}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_token(token):
+    """(seq, xmin) to continue from; (0, 0) for a full sync. Raises ValueError if malformed."""
+    if not token:
+        return 0, 0
+    try:
+        raw = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+        seq, xmin = raw["seq"], raw["xmin"]
+    except Exception:
+        raise ValueError("Invalid sync token")
+    if not isinstance(seq, int) or not isinstance(xmin, int):
+        raise ValueError("Invalid sync token")
+    return seq, xmin
+
+
+# -------------------------
+# Reads
+# -------------------------
+def _json_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+def changes(token=None, limit=DEFAULT_LIMIT):
+    """Changed rows and deleted IDs after a token, as a JSON-ready dict."""
+    since, xmin = decode_token(token)
+    limit = max(1, min(limit, MAX_LIMIT))
+    # Taken before reading: anything the reads below can't see yet was written
+    # by a transaction at or after this one, so the next call picks it up
+    next_xmin = db.session.execute(text("SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint")).scalar()
+
+    found = []  # (seq, payload name, row or None for a deletion, deleted ID)
+    for name, (model, columns) in SYNC_TABLES.items():
+        stmt = (
+            select(*[getattr(model, c) for c in columns], model.sync_seq)
+            .where(or_(model.sync_seq > since, model.sync_xid >= xmin))
+            .order_by(model.sync_seq)
+            .limit(limit + 1)
+        )
+        for row in db.session.execute(stmt):
+            found.append((row[-1], name, [_json_value(v) for v in row], None))
+
+    stmt = (
+        select(SyncTombstone.seq, SyncTombstone.table_name, SyncTombstone.row_id)
+        .where(or_(SyncTombstone.seq > since, SyncTombstone.sync_xid >= xmin))
+        .order_by(SyncTombstone.seq)
+        .limit(limit + 1)
+    )
+    for seq, table_name, row_id in db.session.execute(stmt):
+        if table_name in PAYLOAD_NAMES:
+            found.append((seq, PAYLOAD_NAMES[table_name], None, row_id))
+
+    found.sort(key=lambda item: item[0])
+    more = len(found) > limit
+    found = found[:limit]
+
+    payload = {}
+    deleted = {}
+    for seq, name, row, row_id in found:
+        if row is None:
+            deleted.setdefault(name, []).append(row_id)
+        else:
+            table = payload.setdefault(name, {"columns": list(SYNC_TABLES[name][1]) + ["seq"], "rows": []})
+            table["rows"].append(row)
+    last = max([since] + [seq for seq, _, _, _ in found])
+    return {
+        "changes": payload,
+        "deleted": deleted,
+        "token": encode_token(last, next_xmin),
+        "more": more,
+    }
+
+
+# -------------------------
+# Offline edits
+# -------------------------
+def _parse_datetime(value):
+    if not isinstance(value, str):
+        raise ValueError("saved_at must be an ISO timestamp")
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    # voter_locations.saved_at is naive UTC
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+def apply_location(edit):
+    """Save a queued location unless the server holds a newer one."""
+    voter_id = edit.get("voter_id")
+    if not isinstance(voter_id, int) or isinstance(voter_id, bool):
+        return {"voter_id": voter_id, "status": "invalid", "error": "voter_id must be an integer"}
+    try:
+        saved_at = _parse_datetime(edit.get("saved_at"))
+    except ValueError as e:
+        return {"voter_id": voter_id, "status": "invalid", "error": str(e)}
+    voter = db.session.get(Voter, voter_id)
+    if not voter:
+        return {"voter_id": voter_id, "status": "not_found"}
+
+    location = VoterLocation.query.filter_by(voter_id=voter_id).first()
+    if location and location.saved_at and location.saved_at > saved_at:
+        return {"voter_id": voter_id, "status": "conflict", "seq": location.sync_seq}
+    if not location:
+        location = VoterLocation(voter_id=voter_id)
+        db.session.add(location)
+    location.voter_name = voter.name
+    location.voter_house_no = voter.house_number
+    location.landmark = edit.get("landmark")
+    location.latitude = edit.get("latitude")
+    location.longitude = edit.get("longitude")
+    location.saved_at = saved_at
+    db.session.flush()
+    return {"voter_id": voter_id, "status": "updated", "seq": location.sync_seq}
+
+def apply_task(edit):
+    """Apply a queued task update if the task is unchanged since the seq the device saw."""
+    task_id, seq = edit.get("id"), edit.get("seq")
+    if not isinstance(task_id, int) or not isinstance(seq, int):
+        return {"id": task_id, "status": "invalid", "error": "id and seq must be integers"}
+    unknown = sorted(set(edit) - {"id", "seq"} - set(TASK_FIELDS))
+    if unknown:
+        return {"id": task_id, "status": "invalid", "error": f"Unknown task fields: {', '.join(unknown)}"}
+    task = db.session.get(Task, task_id)
+    if not task:
+        return {"id": task_id, "status": "not_found"}
+    if task.sync_seq != seq:
+        return {"id": task_id, "status": "conflict", "seq": task.sync_seq}
+
+    for field in TASK_FIELDS:
+        if field not in edit:
+            continue
+        value = edit[field]
+        if field == "due_date" and value:
+            try:
+                value = datetime.strptime(value, "%Y-%m-%d").date()
+            except (TypeError, ValueError):
+                return {"id": task_id, "status": "invalid", "error": "due_date must be YYYY-MM-DD"}
+        setattr(task, field, value)
+    db.session.flush()
+    return {"id": task_id, "status": "updated", "seq": task.sync_seq}
+
+def apply_edits(edits):
+    """Apply queued offline edits in the session's transaction. The caller commits."""
+    voters = edits.get("voters") or []
+    locations = edits.get("locations") or []
+    tasks = edits.get("tasks") or []
+    if not all(isinstance(items, list) for items in (voters, locations, tasks)):
+        raise ValueError("voters, locations and tasks must be lists")
+    if len(voters) + len(locations) + len(tasks) > MAX_EDITS:
+        raise ValueError(f"At most {MAX_EDITS} edits per request")
+
+    results = {}
+    if voters:
+        results["voters"] = voter_bulk.apply_patches(db.session.connection(), voters)
+    results["locations"] = [
+        apply_location(edit) if isinstance(edit, dict) else {"status": "invalid", "error": "Edit must be an object"}
+        for edit in locations
+    ]
+    results["tasks"] = [
+        apply_task(edit) if isinstance(edit, dict) else {"status": "invalid", "error": "Edit must be an object"}
+        for edit in tasks
+    ]
+    return results
+
+
+# -------------------------
+# ORM maintenance
+# -------------------------
+@event.listens_for(db.session, "before_flush")
+def _touch_synced_rows(session, flush_context, instances):
+    for obj in session.dirty:
+        if isinstance(obj, SyncTracked) and session.is_modified(obj):
+            obj.sync_seq = func.nextval("sync_seq")
+            obj.sync_xid = CURRENT_XID
+            obj.updated_at = func.now()
+    deleted = [(obj.__tablename__, obj.id) for obj in session.deleted if isinstance(obj, SyncTracked)]
+    if deleted:
+        session.info.setdefault("sync_tombstones", []).extend(deleted)
+
+@event.listens_for(db.session, "after_flush")
+def _write_tombstones(session, flush_context):
+    deleted = session.info.pop("sync_tombstones", None)
+    if deleted:
+        session.connection().execute(
+            SyncTombstone.__table__.insert(),
+            [{"table_name": table, "row_id": row_id} for table, row_id in deleted],
+        )
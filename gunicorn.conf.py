@@ -0,0 +1,30 @@
+# gunicorn.conf.py
+"""
+Production server settings: gunicorn -c gunicorn.conf.py app:app
+
+Each open /api/candidate/activity-stream holds its worker for as long as
+the dashboard stays open, so the workers are gevent: a stream is a greenlet
+waiting on its queue, not an OS thread. psycogreen makes psycopg2 wait for
+the database through gevent; without it a query blocks every greenlet in
+the worker until it returns. Needs gunicorn, gevent and psycogreen
+(requirements-optional.txt).
+
+The app is loaded in each worker after gevent has patched it (no
+preload_app), so live_events sees the cooperative setup and allows
+LIVE_MAX_LISTENERS streams per worker.
+"""
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", 2))
+worker_class = "gevent"
+# Open connections (streams included) per worker
+worker_connections = int(os.getenv("WORKER_CONNECTIONS", 1000))
+# A worker whose event loop stays blocked this long is restarted (open streams
+# don't count: they wait cooperatively)
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 60))
+
+
+def post_fork(server, worker):
+    from psycogreen.gevent import patch_psycopg
+    patch_psycopg()
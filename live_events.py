@@ -0,0 +1,363 @@
+# live_events.py
+"""
+Server-sent events for the candidate command center.
+
+One background thread watches for writes and fans the results out to every
+connected dashboard, so the database work per change is the same for one
+listener or five hundred:
+
+* table_versions.bump() sends a NOTIFY that Postgres delivers on commit; the
+  thread LISTENs and wakes at once. It also rechecks every
+  LIVE_POLL_SECONDS in case a notification was lost while reconnecting.
+* It compares table_versions with what it saw last. When tasks or
+  communications changed it reads the rows written since the last sync_seq
+  it sent (unnamed events, one activity item each, with the sync_seq as the
+  event ID). When voter_list, voter_aggregates or tasks changed it
+  recomputes the KPIs and sends the ones whose value changed (`kpis`
+  events).
+
+Each listener reads from a bounded queue. A listener that falls
+LIVE_QUEUE_SIZE events behind is disconnected; EventSource reconnects with
+Last-Event-ID and gets the activity it missed plus the full KPIs. At most
+LIVE_MAX_LISTENERS streams are open at once, and an idle stream gets a
+comment line every LIVE_HEARTBEAT_SECONDS so proxies keep it open and
+closed clients are noticed.
+
+News feed refreshes that change the list are published as `news` events
+(see news_feeds.NewsAggregator.on_change). Other code can watch() tables:
+the thread calls it back when their versions move, whether or not a stream
+is open (the LLM issues summary is prepared this way).
+
+A stream holds its worker for as long as it is open. Under gevent (the
+gunicorn.conf.py setup: gevent workers, with psycogreen so psycopg2 waits
+cooperatively) each one is a greenlet waiting on its queue and a worker
+serves LIVE_MAX_LISTENERS (default 500) of them. Under a threaded server
+each one is an OS thread taken from the request pool, so the default limit
+there is THREADED_MAX_LISTENERS per process; the rest are refused with 503
+and the dashboards fall back to polling.
+"""
+from datetime import timezone
+import json
+import os
+import queue
+import select as io_select
+import threading
+import time
+
+from sqlalchemy import case, func, literal, or_, select, text, union_all
+
+from models import db, Communication, TableVersion, Task, Voter, VoterAggregate
+import aggregates
+import voter_snapshot
+
+CHANNEL = "table_versions"
+ACTIVITY_LIMIT = 30
+# Wait this long after a wake-up so a burst of commits is handled in one check
+SETTLE_SECONDS = 0.2
+
+# Default stream limit per process when each stream is an OS thread
+THREADED_MAX_LISTENERS = 20
+
+ACTIVITY_TABLES = (Task.__tablename__, Communication.__tablename__)
+# The voter KPIs are read from voter_aggregates, which rebuild() rewrites
+# without touching voter_list
+KPI_TABLES = (Voter.__tablename__, VoterAggregate.__tablename__, Task.__tablename__)
+
+
+def kpis():
+    """KPI data for the candidate command center."""
+    # Voter statistics come from the columnar snapshot or the pre-aggregated
+    # buckets. Both callers have already read the voter_list version (the
+    # ETag, the change check), so wait for a refresh in progress.
+    snapshot = voter_snapshot.get(wait=True)
+    counts = snapshot.kpis() if snapshot else aggregates.kpis()
+
+    total_tasks, completed_tasks = db.session.query(
+        func.count(Task.id),
+        func.count(case((Task.status.ilike('Completed'), 1)))
+    ).one()
+
+    return {
+        "votersContacted": {"count": counts["contacted"], "total": counts["total"]},
+        "supporters": counts["supporters"],
+        "undecided": counts["undecided"],
+        "tasksCompleted": {"count": completed_tasks, "total": total_tasks},
+    }
+
+
+def activity(since, xmin=None, limit=ACTIVITY_LIMIT):
+    """Tasks and communications written after sync_seq `since` (or by a
+    transaction at or after `xmin`), oldest first, as (seq, xid, item)."""
+    def changed(model):
+        condition = model.sync_seq > since
+        if xmin is not None:
+            condition = or_(condition, model.sync_xid >= xmin)
+        return condition
+
+    tasks = select(
+        Task.sync_seq.label("seq"), Task.sync_xid, Task.updated_at, literal("task"), Task.title, Task.status,
+    ).where(changed(Task))
+    comms = select(
+        Communication.sync_seq.label("seq"), Communication.sync_xid, Communication.updated_at,
+        literal("communication"), Communication.title, Communication.audience,
+    ).where(changed(Communication))
+    rows = db.session.execute(union_all(tasks, comms).order_by(text("seq")).limit(limit)).all()
+
+    found = []
+    for seq, xid, ts, kind, title, detail in rows:
+        if ts and ts.tzinfo is None:
+            ts = ts.replace(tzinfo=timezone.utc)
+        if kind == "task":
+            message = f"Task '{title}' - {detail}"
+        else:
+            message = f"Message sent to {detail}: '{title}'"
+        found.append((seq, xid, {
+            "type": kind,
+            "message": message,
+            "timestamp": ts.isoformat() if ts else None,
+        }))
+    return found
+
+
+def format_event(data, event=None, event_id=None):
+    lines = []
+    if event:
+        lines.append(f"event: {event}")
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append("data: " + json.dumps(data, separators=(",", ":")))
+    return "\n".join(lines) + "\n\n"
+
+
+class Listener:
+    def __init__(self, size):
+        self.queue = queue.Queue(maxsize=size)
+        self.dropped = False
+
+
+class LiveEvents:
+    def __init__(self, max_listeners=500, queue_size=100, heartbeat=15, poll=5):
+        self.max_listeners = max_listeners
+        self.queue_size = queue_size
+        self.heartbeat = heartbeat
+        self.poll = poll
+        self.listeners = set()
+        self._lock = threading.Lock()
+        self._check_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._watchers = []  # [tables, callback, versions last seen]
+        self._reset()
+
+    def _reset(self):
+        # Baseline taken at the next check
+        self.versions = None
+        self.seq = 0
+        self.xmin = None
+        self.sent = {}  # sync_seq -> xid of activity already sent that a later check may see again
+        self.kpis = None
+
+    # -------------------------
+    # Listeners
+    # -------------------------
+    def subscribe(self):
+        """A new Listener, or None when LIVE_MAX_LISTENERS streams are already open."""
+        with self._lock:
+            if len(self.listeners) >= self.max_listeners:
+                return None
+            listener = Listener(self.queue_size)
+            self.listeners.add(listener)
+        return listener
+
+    def unsubscribe(self, listener):
+        with self._lock:
+            self.listeners.discard(listener)
+
+    def publish(self, message):
+        with self._lock:
+            listeners = list(self.listeners)
+        for listener in listeners:
+            try:
+                listener.queue.put_nowait(message)
+            except queue.Full:
+                # Too far behind: its stream ends and the browser reconnects
+                listener.dropped = True
+                self.unsubscribe(listener)
+
+    def current_kpis(self):
+        """KPIs as of the last check, which later `kpis` events update; takes
+        the baseline first if there is none, so connecting costs no queries."""
+        with self._check_lock:
+            if self.versions is None:
+                self.check()
+            return self.kpis
+
+    def stream(self, listener, initial=()):
+        """SSE text for one listener: `initial` messages, then published ones."""
+        try:
+            yield "retry: 3000\n\n"
+            for message in initial:
+                yield message
+            while not listener.dropped and not self._stop.is_set():
+                try:
+                    yield listener.queue.get(timeout=self.heartbeat)
+                except queue.Empty:
+                    yield ": ping\n\n"
+        finally:
+            self.unsubscribe(listener)
+
+    # -------------------------
+    # Change detection
+    # -------------------------
+    def check(self):
+        """Compare table versions with the last check and publish what changed."""
+        versions = dict(db.session.execute(
+            select(TableVersion.table_name, TableVersion.version)
+            .where(TableVersion.table_name.in_(ACTIVITY_TABLES + KPI_TABLES))
+        ).all())
+        previous, self.versions = self.versions, versions
+        if previous is None:
+            self._baseline()
+            return
+        changed = {name for name in set(versions) | set(previous) if versions.get(name) != previous.get(name)}
+
+        if changed & set(ACTIVITY_TABLES):
+            self._publish_activity()
+        if changed & set(KPI_TABLES):
+            current = kpis()
+            delta = {key: value for key, value in current.items() if (self.kpis or {}).get(key) != value}
+            self.kpis = current
+            if delta:
+                self.publish(format_event(delta, event="kpis"))
+        db.session.rollback()
+
+    def _snapshot_xmin(self):
+        return db.session.execute(
+            text("SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint")
+        ).scalar()
+
+    def _baseline(self):
+        # Activity already written is not sent again
+        self.xmin = self._snapshot_xmin()
+        self.seq = db.session.execute(select(func.coalesce(func.greatest(
+            select(func.max(Task.sync_seq)).scalar_subquery(),
+            select(func.max(Communication.sync_seq)).scalar_subquery(),
+        ), 0))).scalar()
+        self.sent = {seq: xid for seq, xid, _ in activity(self.seq, self.xmin, limit=None)}
+        self.kpis = kpis()
+        db.session.rollback()
+
+    def _publish_activity(self):
+        # As in delta_sync: rows from transactions still open at the last check
+        # may have committed with a sync_seq below the last one sent
+        next_xmin = self._snapshot_xmin()
+        for seq, xid, item in activity(self.seq, self.xmin, limit=None):
+            if seq in self.sent:
+                continue
+            self.publish(format_event(item, event_id=seq))
+            self.seq = max(self.seq, seq)
+            self.sent[seq] = xid
+        self.xmin = next_xmin
+        self.sent = {seq: xid for seq, xid in self.sent.items() if xid >= next_xmin}
+
+    # -------------------------
+    # Version watchers
+    # -------------------------
+    def watch(self, tables, callback):
+        """Call callback() on the background thread, in an app context, when it
+        starts and whenever the version of one of the tables changes."""
+        with self._lock:
+            self._watchers.append([tuple(tables), callback, None])
+
+    def _run_watchers(self):
+        with self._lock:
+            watchers = list(self._watchers)
+        if not watchers:
+            return
+        versions = dict(db.session.execute(
+            select(TableVersion.table_name, TableVersion.version)
+            .where(TableVersion.table_name.in_({table for tables, _, _ in watchers for table in tables}))
+        ).all())
+        db.session.rollback()
+        for watcher in watchers:
+            tables, callback, seen = watcher
+            current = tuple(versions.get(table, 0) for table in tables)
+            if current != seen:
+                watcher[2] = current
+                try:
+                    callback()
+                except Exception as e:
+                    print("Live events watcher error:", e)
+                db.session.rollback()
+
+    # -------------------------
+    # Background thread
+    # -------------------------
+    def _listen(self):
+        connection = db.engine.raw_connection()
+        connection.driver_connection.autocommit = True
+        with connection.driver_connection.cursor() as cursor:
+            cursor.execute(f"LISTEN {CHANNEL}")
+        return connection
+
+    def _wait(self, connection):
+        """Block until a NOTIFY arrives or the poll interval passes."""
+        raw = connection.driver_connection
+        # Looked up at call time, so gevent's patched select is used when active
+        if io_select.select([raw], [], [], self.poll)[0]:
+            time.sleep(SETTLE_SECONDS)
+            raw.poll()
+            raw.notifies.clear()
+
+    def _run(self, app):
+        connection = None
+        while not self._stop.is_set():
+            try:
+                with app.app_context():
+                    if connection is None:
+                        connection = self._listen()
+                    self._run_watchers()
+                    self._wait(connection)
+                    # Under the lock, so a listener subscribing now either
+                    # sees the reset or is counted here
+                    with self._check_lock:
+                        if self.listeners:
+                            self.check()
+                        else:
+                            self._reset()
+            except Exception as e:
+                print("Live events error:", e)
+                if connection is not None:
+                    connection.invalidate()
+                    connection = None
+                self._reset()
+                self._stop.wait(self.poll)
+        if connection is not None:
+            connection.close()
+
+    def start(self, app):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, args=(app,), name="live-events", daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+
+def cooperative():
+    """Whether this process runs under gevent's monkey patching (gunicorn -k gevent)."""
+    try:
+        from gevent import monkey
+    except ImportError:
+        return False
+    return monkey.is_module_patched("threading")
+
+def from_env():
+    default_listeners = 500 if cooperative() else THREADED_MAX_LISTENERS
+    return LiveEvents(
+        max_listeners=int(os.getenv("LIVE_MAX_LISTENERS", default_listeners)),
+        queue_size=int(os.getenv("LIVE_QUEUE_SIZE", 100)),
+        heartbeat=int(os.getenv("LIVE_HEARTBEAT_SECONDS", 15)),
+        poll=int(os.getenv("LIVE_POLL_SECONDS", 5)),
+    )
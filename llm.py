@@ -0,0 +1,193 @@
+# llm.py
+"""
+LLM calls behind one provider interface.
+
+LLM_PROVIDER picks the backend: "cohere" (the default when COHERE_API_KEY
+is set), "stub" (canned local replies, no network; LLM_STUB_DELAY adds a
+delay in seconds), or "none".
+
+Every call runs on a small thread pool and the caller waits at most
+LLM_TIMEOUT seconds for it. LLM_CONCURRENCY calls may be in flight at
+once; past that, callers get None straight away instead of queueing behind
+a slow upstream. Replies are cached by (kind, text) in a bounded TTL cache.
+A None reply means "no answer": the caller falls back.
+"""
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+import os
+import threading
+import time
+
+from caching import TTLCache
+
+CHAT_MODEL = "command-a-03-2025"
+GENERATE_MODEL = "command-xlarge-nightly"
+
+
+class Provider(ABC):
+    name = "none"
+
+    @abstractmethod
+    def chat(self, message):
+        """Reply text for a chat message."""
+
+    @abstractmethod
+    def generate(self, prompt, max_tokens):
+        """Completion text for a prompt."""
+
+
+class CohereProvider(Provider):
+    name = "cohere"
+
+    def __init__(self, api_key, timeout):
+        self.api_key = api_key
+        self.timeout = timeout
+        self._client = None
+
+    @property
+    def client(self):
+        # The SDK is slow to import; load it on the first call, not at app startup
+        if self._client is None:
+            import cohere
+            self._client = cohere.Client(self.api_key, timeout=self.timeout, max_retries=0)
+        return self._client
+
+    def chat(self, message):
+        return self.client.chat(message=message, chat_history=[], model=CHAT_MODEL).text
+
+    def generate(self, prompt, max_tokens):
+        response = self.client.generate(
+            model=GENERATE_MODEL, prompt=prompt, max_tokens=max_tokens, temperature=0.4
+        )
+        return response.generations[0].text.strip()
+
+
+class StubProvider(Provider):
+    """Deterministic local replies for development and tests."""
+
+    name = "stub"
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+
+    def _reply(self, text):
+        if self.delay:
+            time.sleep(self.delay)
+        return f"[stub] {text[:200]}"
+
+    def chat(self, message):
+        return self._reply(message)
+
+    def generate(self, prompt, max_tokens):
+        return self._reply(prompt)
+
+
+class LLMClient:
+    def __init__(self, provider=None, timeout=8.0, concurrency=4, cache_size=256, cache_ttl=3600):
+        self.provider = provider
+        self.timeout = timeout
+        self.cache = TTLCache(maxsize=cache_size, ttl=cache_ttl)
+        self._slots = threading.BoundedSemaphore(concurrency)
+        self._pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="llm")
+        self._pending = set()
+        self._lock = threading.Lock()
+        self.timeouts = 0
+        self.errors = 0
+        self.rejected = 0
+
+    @property
+    def enabled(self):
+        return self.provider is not None
+
+    def _count(self, counter):
+        # Pool threads and request threads update these concurrently
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def _submit(self, key, call):
+        """Run call on the pool if a slot is free and cache its reply; None if busy."""
+        if not self._slots.acquire(blocking=False):
+            self._count("rejected")
+            return None
+
+        def run():
+            try:
+                reply = call()
+                if reply:
+                    self.cache.set(key, reply)
+                return reply
+            except Exception as e:
+                self._count("errors")
+                print("LLM error:", e)
+                return None
+            finally:
+                with self._lock:
+                    self._pending.discard(key)
+                self._slots.release()
+
+        with self._lock:
+            self._pending.add(key)
+        return self._pool.submit(run)
+
+    def _call(self, key, call):
+        if not self.enabled:
+            return None
+        reply = self.cache.get(key)
+        if reply is not None:
+            return reply
+        future = self._submit(key, call)
+        if future is None:
+            return None
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            # The call keeps its slot until it finishes; a late reply still lands in the cache
+            self._count("timeouts")
+            return None
+
+    def chat(self, message):
+        return self._call(("chat", message), lambda: self.provider.chat(message))
+
+    def generate(self, prompt, max_tokens=120):
+        return self._call(("generate", prompt, max_tokens), lambda: self.provider.generate(prompt, max_tokens))
+
+    def prefetch(self, prompt, max_tokens=120):
+        """Cached generate() reply, or None after starting it in the background."""
+        if not self.enabled:
+            return None
+        key = ("generate", prompt, max_tokens)
+        reply = self.cache.get(key)
+        if reply is None:
+            with self._lock:
+                pending = key in self._pending
+            if not pending:
+                self._submit(key, lambda: self.provider.generate(prompt, max_tokens))
+        return reply
+
+    def stats(self):
+        with self._lock:
+            counts = {"timeouts": self.timeouts, "errors": self.errors, "rejected": self.rejected}
+        return {
+            "provider": self.provider.name if self.provider else None,
+            **counts,
+            "cache": self.cache.stats(),
+        }
+
+
+def client_from_env():
+    timeout = float(os.getenv("LLM_TIMEOUT", 8))
+    name = os.getenv("LLM_PROVIDER") or ("cohere" if os.getenv("COHERE_API_KEY") else "none")
+    provider = None
+    if name == "cohere":
+        provider = CohereProvider(os.getenv("COHERE_API_KEY"), timeout)
+    elif name == "stub":
+        provider = StubProvider(float(os.getenv("LLM_STUB_DELAY", 0)))
+    elif name != "none":
+        print(f"Unknown LLM_PROVIDER {name!r}; LLM replies disabled")
+    return LLMClient(
+        provider,
+        timeout=timeout,
+        concurrency=int(os.getenv("LLM_CONCURRENCY", 4)),
+        cache_size=int(os.getenv("LLM_CACHE_SIZE", 256)),
+        cache_ttl=int(os.getenv("LLM_CACHE_TTL", 3600)),
+    )
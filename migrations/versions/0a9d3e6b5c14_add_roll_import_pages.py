@@ -0,0 +1,31 @@
+"""Add roll_import_pages for resumable PDF ingestion
+
+Revision ID: 0a9d3e6b5c14
+Revises: f4b6a1d8c253
+Create Date: 2026-10-18 13:26:09.113852
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0a9d3e6b5c14'
+down_revision = 'f4b6a1d8c253'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('roll_import_pages',
+    sa.Column('source_sha256', sa.String(length=64), nullable=False),
+    sa.Column('page_number', sa.Integer(), nullable=False),
+    sa.Column('source_name', sa.String(length=255), nullable=True),
+    sa.Column('voters', sa.Integer(), nullable=False),
+    sa.Column('imported_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.PrimaryKeyConstraint('source_sha256', 'page_number')
+    )
+
+
+def downgrade():
+    op.drop_table('roll_import_pages')
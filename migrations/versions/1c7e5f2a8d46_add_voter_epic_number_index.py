@@ -0,0 +1,24 @@
+"""Add EPIC number index for CSV import upserts
+
+Revision ID: 1c7e5f2a8d46
+Revises: 0a9d3e6b5c14
+Create Date: 2026-10-18 14:02:37.518204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '1c7e5f2a8d46'
+down_revision = '0a9d3e6b5c14'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_voter_list_epic_number', 'voter_list', ['EPIC number'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_voter_list_epic_number', table_name='voter_list')
@@ -0,0 +1,58 @@
+"""Link voter_locations to voter_list by voter_id
+
+Revision ID: 3e8a0b6c9f21
+Revises: 1c7e5f2a8d46
+Create Date: 2026-10-18 14:40:12.083516
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3e8a0b6c9f21'
+down_revision = '1c7e5f2a8d46'
+branch_labels = None
+depends_on = None
+
+HOUSE_KEY = "COALESCE(NULLIF(\"House number\", ''), 'No House Number')"
+
+
+def upgrade():
+    op.add_column('voter_locations', sa.Column('voter_id', sa.Integer(), nullable=True))
+    op.create_foreign_key('voter_locations_voter_id_fkey', 'voter_locations', 'voter_list',
+                          ['voter_id'], ['ID'], ondelete='CASCADE')
+
+    # Locations were matched by name + house number, so one row may belong to
+    # several voters and a voter may have several rows. Give every matched
+    # voter its own copy of the most recently saved location, then drop the
+    # originals that were copied. Locations that match no voter are kept.
+    op.execute("""
+        INSERT INTO voter_locations (voter_id, voter_name, voter_house_no, landmark, latitude, longitude, saved_at)
+        SELECT DISTINCT ON (v."ID")
+               v."ID", l.voter_name, l.voter_house_no, l.landmark, l.latitude, l.longitude, l.saved_at
+        FROM voter_list v
+        JOIN voter_locations l
+          ON l.voter_name = v."Name" AND l.voter_house_no IS NOT DISTINCT FROM v."House number"
+        WHERE l.voter_id IS NULL
+        ORDER BY v."ID", l.saved_at DESC NULLS LAST, l.id DESC
+    """)
+    op.execute("""
+        DELETE FROM voter_locations l
+        WHERE l.voter_id IS NULL
+          AND EXISTS (
+              SELECT 1 FROM voter_list v
+              WHERE v."Name" = l.voter_name AND v."House number" IS NOT DISTINCT FROM l.voter_house_no
+          )
+    """)
+    op.create_unique_constraint('voter_locations_voter_id_key', 'voter_locations', ['voter_id'])
+
+    # Households are grouped and paged by this expression
+    op.create_index('ix_voter_list_house_key', 'voter_list', [sa.text(HOUSE_KEY)], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_voter_list_house_key', table_name='voter_list')
+    op.drop_constraint('voter_locations_voter_id_key', 'voter_locations', type_='unique')
+    op.drop_constraint('voter_locations_voter_id_fkey', 'voter_locations', type_='foreignkey')
+    op.drop_column('voter_locations', 'voter_id')
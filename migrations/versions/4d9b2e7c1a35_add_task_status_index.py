@@ -0,0 +1,25 @@
+"""Add an index for task lists filtered by status
+
+Revision ID: 4d9b2e7c1a35
+Revises: c6e1a7d4b3f8
+Create Date: 2026-10-18 19:42:08.315274
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4d9b2e7c1a35'
+down_revision = 'c6e1a7d4b3f8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # GET /api/tasks?status=... lists one status in due-date order
+    op.create_index('ix_tasks_status_due_date', 'tasks', ['status', 'due_date'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_tasks_status_due_date', table_name='tasks')
@@ -0,0 +1,31 @@
+"""Add voter_changes log
+
+Revision ID: 5b2f9d4e7a60
+Revises: 3e8a0b6c9f21
+Create Date: 2026-10-18 15:21:44.902317
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b2f9d4e7a60'
+down_revision = '3e8a0b6c9f21'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('voter_changes',
+    sa.Column('seq', sa.BigInteger(), nullable=False),
+    sa.Column('voter_id', sa.Integer(), nullable=False),
+    sa.Column('changed_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.PrimaryKeyConstraint('seq')
+    )
+    op.create_index('ix_voter_changes_changed_at', 'voter_changes', ['changed_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_voter_changes_changed_at', table_name='voter_changes')
+    op.drop_table('voter_changes')
@@ -0,0 +1,61 @@
+"""Add indexes for voter filters and list ordering
+
+Revision ID: 7d1f3a9c2e85
+Revises: 5b2f9d4e7a60
+Create Date: 2026-10-18 16:05:13.228419
+
+Needs the pg_trgm extension (in PostgreSQL's contrib package). The upgrade
+runs CREATE EXTENSION, which takes a superuser or, since PostgreSQL 13, a
+role with CREATE on the database.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7d1f3a9c2e85'
+down_revision = '5b2f9d4e7a60'
+branch_labels = None
+depends_on = None
+
+# Case-insensitive equality filters (gender, affiliation) compare lower()
+LOWER_INDEXES = {
+    'ix_voter_list_gender_lower': 'Gender',
+    'ix_voter_list_affiliation_lower': 'Political Affiliation',
+}
+# Substring filters (occupation, education) use ILIKE '%term%'
+TRIGRAM_INDEXES = {
+    'ix_voter_list_occupation_trgm': 'Occupation',
+    'ix_voter_list_education_level_trgm': 'Education Level',
+}
+
+
+def upgrade():
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+
+    op.create_index('ix_voter_list_age', 'voter_list', ['Age'], unique=False)
+    op.create_index('ix_voter_list_booth_id', 'voter_list', ['booth_id'], unique=False)
+    for name, column in LOWER_INDEXES.items():
+        op.create_index(name, 'voter_list', [sa.text(f'lower("{column}")')], unique=False)
+    for name, column in TRIGRAM_INDEXES.items():
+        op.create_index(name, 'voter_list', [column], unique=False,
+                        postgresql_using='gin', postgresql_ops={column: 'gin_trgm_ops'})
+
+    op.create_index('ix_tasks_due_date', 'tasks', ['due_date'], unique=False)
+    op.create_index('ix_tasks_created_at', 'tasks', ['created_at'], unique=False)
+    op.create_index('ix_communications_created_at', 'communications', ['created_at'], unique=False)
+    op.create_index('ix_reports_submitted_at', 'reports', ['submitted_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_reports_submitted_at', table_name='reports')
+    op.drop_index('ix_communications_created_at', table_name='communications')
+    op.drop_index('ix_tasks_created_at', table_name='tasks')
+    op.drop_index('ix_tasks_due_date', table_name='tasks')
+    for name in reversed(list(TRIGRAM_INDEXES)):
+        op.drop_index(name, table_name='voter_list')
+    for name in reversed(list(LOWER_INDEXES)):
+        op.drop_index(name, table_name='voter_list')
+    op.drop_index('ix_voter_list_booth_id', table_name='voter_list')
+    op.drop_index('ix_voter_list_age', table_name='voter_list')
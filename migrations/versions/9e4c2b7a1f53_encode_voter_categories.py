@@ -0,0 +1,241 @@
+"""Store gender, affiliation and education level as lookup codes
+
+Revision ID: 9e4c2b7a1f53
+Revises: 7d1f3a9c2e85
+Create Date: 2026-10-18 16:31:40.517206
+
+"""
+import logging
+import re
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9e4c2b7a1f53'
+down_revision = '7d1f3a9c2e85'
+branch_labels = None
+depends_on = None
+
+log = logging.getLogger('alembic.runtime.migration')
+
+# Frozen copy of categories.py as of this revision: later edits to the app's
+# names or aliases must not change what this migration does
+NAMES = {
+    'gender': {1: 'Male', 2: 'Female', 3: 'Other'},
+    'affiliation': {1: 'Supporter', 2: 'Opponent', 3: 'SwingVoter'},
+    'education': {
+        1: 'Illiterate', 2: 'Primary', 3: 'SSC', 4: 'HSC', 5: 'Diploma',
+        6: 'Graduate', 7: 'Post Graduate', 8: 'Other',
+    },
+}
+TABLES = {'gender': 'genders', 'affiliation': 'affiliations', 'education': 'education_levels'}
+ALIASES = {
+    'gender': {
+        'm': 'Male', 'man': 'Male', 'purush': 'Male', 'पुरुष': 'Male',
+        'f': 'Female', 'woman': 'Female', 'fermale': 'Female', 'stri': 'Female', 'स्त्री': 'Female', 'महिला': 'Female',
+        't': 'Other', 'transgender': 'Other', 'thirdgender': 'Other', 'इतर': 'Other',
+    },
+    'affiliation': {
+        'neutral': 'SwingVoter', 'swing': 'SwingVoter', 'undecided': 'SwingVoter',
+    },
+    'education': {
+        'none': 'Illiterate', 'uneducated': 'Illiterate', 'nil': 'Illiterate',
+        'middle': 'Primary', '5th': 'Primary', '7th': 'Primary', '8th': 'Primary',
+        '10th': 'SSC', 'matric': 'SSC', 'matriculation': 'SSC',
+        '12th': 'HSC', 'intermediate': 'HSC',
+        'iti': 'Diploma', 'polytechnic': 'Diploma',
+        'graduation': 'Graduate', 'degree': 'Graduate', 'ba': 'Graduate', 'bsc': 'Graduate',
+        'bcom': 'Graduate', 'be': 'Graduate', 'btech': 'Graduate',
+        'postgraduate': 'Post Graduate', 'pg': 'Post Graduate', 'ma': 'Post Graduate',
+        'msc': 'Post Graduate', 'mcom': 'Post Graduate', 'mba': 'Post Graduate',
+        'mtech': 'Post Graduate', 'phd': 'Post Graduate',
+    },
+}
+
+
+def _fold(value):
+    return re.sub(r"[\s.\-_/]+", "", value).lower()
+
+LOOKUP = {
+    kind: dict({_fold(name): name for name in names.values()}, **ALIASES[kind])
+    for kind, names in NAMES.items()
+}
+CODES = {kind: {name: code for code, name in names.items()} for kind, names in NAMES.items()}
+
+
+def _code(kind, value):
+    """Code of a raw value, None for empty. Raises ValueError if unknown."""
+    value = " ".join(str(value).split())
+    if not value or value == '-':
+        return None
+    name = LOOKUP[kind].get(_fold(value))
+    if name is None:
+        raise ValueError(value)
+    return CODES[kind][name]
+
+def _key_sql(column, kind):
+    whens = " ".join(f"WHEN {code} THEN '{name.lower()}'" for code, name in NAMES[kind].items())
+    return f"CASE {column} {whens} ELSE '' END"
+
+
+# column -> (kind, old string length, code for unrecognised values)
+COLUMNS = {
+    'Gender': ('gender', 20, None),
+    'Political Affiliation': ('affiliation', 50, None),
+    'Education Level': ('education', 50, CODES['education']['Other']),
+}
+# Values that map to no name are kept here so downgrade() can put them back
+UNMAPPED_TABLE = 'voter_category_unmapped'
+INDEXES = {
+    'Gender': 'ix_voter_list_gender',
+    'Political Affiliation': 'ix_voter_list_political_affiliation',
+    'Education Level': 'ix_voter_list_education_level',
+}
+FOREIGN_KEYS = {
+    'Gender': 'fk_voter_list_gender',
+    'Political Affiliation': 'fk_voter_list_political_affiliation',
+    'Education Level': 'fk_voter_list_education_level',
+}
+
+BUCKET_COLUMNS = "booth_id, gender, age_band, affiliation, education_level"
+AGE_BAND_SQL = """
+    CASE WHEN "Age" IS NULL OR "Age" = 0 THEN ''
+         WHEN "Age" < 18 THEN 'u18'
+         WHEN "Age" <= 25 THEN '18-25'
+         WHEN "Age" <= 40 THEN '26-40'
+         WHEN "Age" < 60 THEN '41-59'
+         WHEN "Age" = 60 THEN '60'
+         ELSE '61+' END AS age_band
+"""
+
+
+def _rebuild_aggregates(gender, affiliation, education):
+    bucket_sql = f"""
+        COALESCE(booth_id, 0) AS booth_id, {gender} AS gender, {AGE_BAND_SQL},
+        {affiliation} AS affiliation, {education} AS education_level
+    """
+    op.execute("DELETE FROM voter_aggregates")
+    op.execute("DELETE FROM voter_issue_aggregates")
+    op.execute(f"""
+        INSERT INTO voter_aggregates ({BUCKET_COLUMNS}, voters, contacted)
+        SELECT {BUCKET_COLUMNS}, COUNT(*), COUNT(*) FILTER (WHERE has_mobile)
+        FROM (
+            SELECT {bucket_sql},
+                   COALESCE("Mobile Number", '') <> '' AS has_mobile
+            FROM voter_list
+        ) v
+        GROUP BY {BUCKET_COLUMNS}
+    """)
+    op.execute(f"""
+        INSERT INTO voter_issue_aggregates ({BUCKET_COLUMNS}, issue, mentions)
+        SELECT {BUCKET_COLUMNS}, issue, COUNT(*)
+        FROM (
+            SELECT {bucket_sql}, i.name AS issue
+            FROM voter_list
+            JOIN voter_issues vi ON vi.voter_id = voter_list."ID"
+            JOIN issues i ON i.id = vi.issue_id
+        ) v
+        GROUP BY {BUCKET_COLUMNS}, issue
+    """)
+
+
+def upgrade():
+    bind = op.get_bind()
+    for kind, table in TABLES.items():
+        lookup = op.create_table(table,
+        sa.Column('id', sa.SmallInteger(), nullable=False),
+        sa.Column('name', sa.String(length=50 if kind != 'gender' else 20), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('name')
+        )
+        op.bulk_insert(lookup, [{'id': code, 'name': name} for code, name in NAMES[kind].items()])
+    op.create_table(UNMAPPED_TABLE,
+    sa.Column('voter_id', sa.Integer(), nullable=False),
+    sa.Column('column_name', sa.String(length=50), nullable=False),
+    sa.Column('raw', sa.Text(), nullable=False),
+    sa.ForeignKeyConstraint(['voter_id'], ['voter_list.ID'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('voter_id', 'column_name')
+    )
+
+    # The old lower() / trigram indexes on these columns are replaced by btree indexes on the codes
+    op.drop_index('ix_voter_list_gender_lower', table_name='voter_list')
+    op.drop_index('ix_voter_list_affiliation_lower', table_name='voter_list')
+    op.drop_index('ix_voter_list_education_level_trgm', table_name='voter_list')
+
+    for column, (kind, _, fallback) in COLUMNS.items():
+        # Map each distinct free-text value once, then rewrite the column by join
+        mapping, unknown = [], []
+        for (raw,) in bind.execute(sa.text(f'SELECT DISTINCT "{column}" FROM voter_list WHERE "{column}" IS NOT NULL')):
+            try:
+                code = _code(kind, raw)
+            except ValueError:
+                code = fallback
+                unknown.append(raw)
+            if code is not None:
+                mapping.append({'raw': raw, 'code': code})
+        if unknown:
+            # Keep the original text per voter before the column loses it
+            bind.execute(sa.text(f"""
+                INSERT INTO {UNMAPPED_TABLE} (voter_id, column_name, raw)
+                SELECT "ID", :column, "{column}" FROM voter_list WHERE "{column}" = ANY(:raws)
+            """), {'column': column, 'raws': unknown})
+            log.warning("%s: %d unrecognised value(s) stored as %s, originals kept in %s: %s",
+                        column, len(unknown), NAMES[kind][fallback] if fallback else 'NULL',
+                        UNMAPPED_TABLE, unknown[:10])
+
+        op.execute("CREATE TEMP TABLE category_map (raw text PRIMARY KEY, code smallint NOT NULL)")
+        if mapping:
+            bind.execute(sa.text("INSERT INTO category_map (raw, code) VALUES (:raw, :code)"), mapping)
+        op.add_column('voter_list', sa.Column(f'{column} code', sa.SmallInteger(), nullable=True))
+        op.execute(f"""
+            UPDATE voter_list v SET "{column} code" = m.code
+            FROM category_map m WHERE m.raw = v."{column}"
+        """)
+        op.execute("DROP TABLE category_map")
+        op.drop_column('voter_list', column)
+        op.alter_column('voter_list', f'{column} code', new_column_name=column)
+        op.create_foreign_key(FOREIGN_KEYS[column], 'voter_list', TABLES[kind], [column], ['id'])
+        op.create_index(INDEXES[column], 'voter_list', [column], unique=False)
+
+    # Aggregate keys are the lower-case canonical names from now on
+    _rebuild_aggregates(
+        _key_sql('"Gender"', 'gender'),
+        _key_sql('"Political Affiliation"', 'affiliation'),
+        _key_sql('"Education Level"', 'education'),
+    )
+
+
+def downgrade():
+    for column, (kind, length, _) in COLUMNS.items():
+        table = TABLES[kind]
+        op.add_column('voter_list', sa.Column(f'{column} text', sa.String(length=length), nullable=True))
+        op.execute(f"""
+            UPDATE voter_list v SET "{column} text" = t.name
+            FROM {table} t WHERE t.id = v."{column}"
+        """)
+        op.execute(f"""
+            UPDATE voter_list v SET "{column} text" = u.raw
+            FROM {UNMAPPED_TABLE} u WHERE u.voter_id = v."ID" AND u.column_name = '{column}'
+        """)
+        op.drop_index(INDEXES[column], table_name='voter_list')
+        op.drop_constraint(FOREIGN_KEYS[column], 'voter_list', type_='foreignkey')
+        op.drop_column('voter_list', column)
+        op.alter_column('voter_list', f'{column} text', new_column_name=column)
+
+    op.create_index('ix_voter_list_gender_lower', 'voter_list', [sa.text('lower("Gender")')], unique=False)
+    op.create_index('ix_voter_list_affiliation_lower', 'voter_list',
+                    [sa.text('lower("Political Affiliation")')], unique=False)
+    op.create_index('ix_voter_list_education_level_trgm', 'voter_list', ['Education Level'], unique=False,
+                    postgresql_using='gin', postgresql_ops={'Education Level': 'gin_trgm_ops'})
+
+    op.drop_table(UNMAPPED_TABLE)
+    for table in reversed(list(TABLES.values())):
+        op.drop_table(table)
+
+    _rebuild_aggregates(
+        """LOWER(COALESCE("Gender", ''))""",
+        """LOWER(COALESCE("Political Affiliation", ''))""",
+        """LOWER(COALESCE("Education Level", ''))""",
+    )
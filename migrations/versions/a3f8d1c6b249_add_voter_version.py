@@ -0,0 +1,24 @@
+"""Add voter row version for optimistic concurrency
+
+Revision ID: a3f8d1c6b249
+Revises: 9e4c2b7a1f53
+Create Date: 2026-10-18 16:52:07.306418
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3f8d1c6b249'
+down_revision = '9e4c2b7a1f53'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('voter_list', sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade():
+    op.drop_column('voter_list', 'version')
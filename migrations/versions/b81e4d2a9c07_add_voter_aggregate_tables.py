@@ -0,0 +1,83 @@
+"""Add voter aggregate tables
+
+Revision ID: b81e4d2a9c07
+Revises: 7c0ca5f63461
+Create Date: 2026-10-18 10:12:41.508213
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b81e4d2a9c07'
+down_revision = '7c0ca5f63461'
+branch_labels = None
+depends_on = None
+
+BUCKET_SQL = """
+    COALESCE(booth_id, 0) AS booth_id,
+    LOWER(COALESCE("Gender", '')) AS gender,
+    CASE WHEN "Age" IS NULL OR "Age" = 0 THEN ''
+         WHEN "Age" < 18 THEN 'u18'
+         WHEN "Age" <= 25 THEN '18-25'
+         WHEN "Age" <= 40 THEN '26-40'
+         WHEN "Age" < 60 THEN '41-59'
+         WHEN "Age" = 60 THEN '60'
+         ELSE '61+' END AS age_band,
+    LOWER(COALESCE("Political Affiliation", '')) AS affiliation,
+    LOWER(COALESCE("Education Level", '')) AS education_level
+"""
+BUCKET_COLUMNS = "booth_id, gender, age_band, affiliation, education_level"
+
+
+def upgrade():
+    op.create_table('voter_aggregates',
+    sa.Column('booth_id', sa.Integer(), nullable=False),
+    sa.Column('gender', sa.String(length=20), nullable=False),
+    sa.Column('age_band', sa.String(length=10), nullable=False),
+    sa.Column('affiliation', sa.String(length=50), nullable=False),
+    sa.Column('education_level', sa.String(length=50), nullable=False),
+    sa.Column('voters', sa.Integer(), nullable=False),
+    sa.Column('contacted', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('booth_id', 'gender', 'age_band', 'affiliation', 'education_level')
+    )
+    op.create_table('voter_issue_aggregates',
+    sa.Column('booth_id', sa.Integer(), nullable=False),
+    sa.Column('gender', sa.String(length=20), nullable=False),
+    sa.Column('age_band', sa.String(length=10), nullable=False),
+    sa.Column('affiliation', sa.String(length=50), nullable=False),
+    sa.Column('education_level', sa.String(length=50), nullable=False),
+    sa.Column('issue', sa.Text(), nullable=False),
+    sa.Column('mentions', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('booth_id', 'gender', 'age_band', 'affiliation', 'education_level', 'issue')
+    )
+
+    # Backfill from the existing roll
+    op.execute(f"""
+        INSERT INTO voter_aggregates ({BUCKET_COLUMNS}, voters, contacted)
+        SELECT {BUCKET_COLUMNS}, COUNT(*), COUNT(*) FILTER (WHERE has_mobile)
+        FROM (
+            SELECT {BUCKET_SQL},
+                   COALESCE("Mobile Number", '') <> '' AS has_mobile
+            FROM voter_list
+        ) v
+        GROUP BY {BUCKET_COLUMNS}
+    """)
+    op.execute(f"""
+        INSERT INTO voter_issue_aggregates ({BUCKET_COLUMNS}, issue, mentions)
+        SELECT {BUCKET_COLUMNS}, issue, COUNT(*)
+        FROM (
+            SELECT {BUCKET_SQL},
+                   LOWER(BTRIM(raw_issue, E' \\t\\r\\n')) AS issue
+            FROM voter_list,
+                 unnest(string_to_array("Key Issues", ',')) AS raw_issue
+        ) v
+        WHERE issue <> ''
+        GROUP BY {BUCKET_COLUMNS}, issue
+    """)
+
+
+def downgrade():
+    op.drop_table('voter_issue_aggregates')
+    op.drop_table('voter_aggregates')
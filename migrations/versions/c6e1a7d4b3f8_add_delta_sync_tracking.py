@@ -0,0 +1,54 @@
+"""Add delta sync tracking columns and tombstones
+
+Revision ID: c6e1a7d4b3f8
+Revises: a3f8d1c6b249
+Create Date: 2026-10-18 17:14:29.640153
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c6e1a7d4b3f8'
+down_revision = 'a3f8d1c6b249'
+branch_labels = None
+depends_on = None
+
+TABLES = ('voter_list', 'voter_locations', 'tasks', 'communications', 'reports')
+NEXT_SEQ = sa.text("nextval('sync_seq')")
+CURRENT_XID = sa.text("pg_current_xact_id()::text::bigint")
+
+
+def upgrade():
+    op.execute(sa.schema.CreateSequence(sa.Sequence('sync_seq')))
+    # Existing rows are numbered by the volatile defaults as the columns are added
+    for table in TABLES:
+        op.add_column(table, sa.Column('updated_at', sa.DateTime(timezone=True),
+                                       server_default=sa.text('now()'), nullable=True))
+        op.add_column(table, sa.Column('sync_seq', sa.BigInteger(), server_default=NEXT_SEQ, nullable=False))
+        op.add_column(table, sa.Column('sync_xid', sa.BigInteger(), server_default=CURRENT_XID, nullable=False))
+        op.create_index(op.f(f'ix_{table}_sync_seq'), table, ['sync_seq'], unique=False)
+        op.create_index(op.f(f'ix_{table}_sync_xid'), table, ['sync_xid'], unique=False)
+
+    op.create_table('sync_tombstones',
+    sa.Column('seq', sa.BigInteger(), server_default=NEXT_SEQ, nullable=False),
+    sa.Column('table_name', sa.String(length=64), nullable=False),
+    sa.Column('row_id', sa.Integer(), nullable=False),
+    sa.Column('sync_xid', sa.BigInteger(), server_default=CURRENT_XID, nullable=False),
+    sa.Column('deleted_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.PrimaryKeyConstraint('seq')
+    )
+    op.create_index(op.f('ix_sync_tombstones_sync_xid'), 'sync_tombstones', ['sync_xid'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_sync_tombstones_sync_xid'), table_name='sync_tombstones')
+    op.drop_table('sync_tombstones')
+    for table in reversed(TABLES):
+        op.drop_index(op.f(f'ix_{table}_sync_xid'), table_name=table)
+        op.drop_index(op.f(f'ix_{table}_sync_seq'), table_name=table)
+        op.drop_column(table, 'sync_xid')
+        op.drop_column(table, 'sync_seq')
+        op.drop_column(table, 'updated_at')
+    op.execute(sa.schema.DropSequence(sa.Sequence('sync_seq')))
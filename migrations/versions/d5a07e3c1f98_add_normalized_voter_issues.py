@@ -0,0 +1,83 @@
+"""Add normalized issues vocabulary and voter_issues link table
+
+Revision ID: d5a07e3c1f98
+Revises: b81e4d2a9c07
+Create Date: 2026-10-18 11:02:17.934120
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd5a07e3c1f98'
+down_revision = 'b81e4d2a9c07'
+branch_labels = None
+depends_on = None
+
+BUCKET_SQL = """
+    COALESCE(booth_id, 0) AS booth_id,
+    LOWER(COALESCE("Gender", '')) AS gender,
+    CASE WHEN "Age" IS NULL OR "Age" = 0 THEN ''
+         WHEN "Age" < 18 THEN 'u18'
+         WHEN "Age" <= 25 THEN '18-25'
+         WHEN "Age" <= 40 THEN '26-40'
+         WHEN "Age" < 60 THEN '41-59'
+         WHEN "Age" = 60 THEN '60'
+         ELSE '61+' END AS age_band,
+    LOWER(COALESCE("Political Affiliation", '')) AS affiliation,
+    LOWER(COALESCE("Education Level", '')) AS education_level
+"""
+BUCKET_COLUMNS = "booth_id, gender, age_band, affiliation, education_level"
+
+
+def upgrade():
+    op.create_table('issues',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.Text(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('name')
+    )
+    op.create_table('voter_issues',
+    sa.Column('voter_id', sa.Integer(), nullable=False),
+    sa.Column('issue_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['voter_id'], ['voter_list.ID'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['issue_id'], ['issues.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('voter_id', 'issue_id')
+    )
+    op.create_index('ix_voter_issues_issue_id_voter_id', 'voter_issues', ['issue_id', 'voter_id'], unique=False)
+
+    # Backfill from the comma-separated "Key Issues" text
+    op.execute("""
+        INSERT INTO issues (name)
+        SELECT DISTINCT LOWER(BTRIM(raw_issue, E' \\t\\r\\n'))
+        FROM voter_list, unnest(string_to_array("Key Issues", ',')) AS raw_issue
+        WHERE BTRIM(raw_issue, E' \\t\\r\\n') <> ''
+    """)
+    op.execute("""
+        INSERT INTO voter_issues (voter_id, issue_id)
+        SELECT DISTINCT v."ID", i.id
+        FROM voter_list v
+        CROSS JOIN LATERAL unnest(string_to_array(v."Key Issues", ',')) AS raw_issue
+        JOIN issues i ON i.name = LOWER(BTRIM(raw_issue, E' \\t\\r\\n'))
+    """)
+
+    # Issue aggregates now count each issue once per voter
+    op.execute("DELETE FROM voter_issue_aggregates")
+    op.execute(f"""
+        INSERT INTO voter_issue_aggregates ({BUCKET_COLUMNS}, issue, mentions)
+        SELECT {BUCKET_COLUMNS}, issue, COUNT(*)
+        FROM (
+            SELECT {BUCKET_SQL}, i.name AS issue
+            FROM voter_list
+            JOIN voter_issues vi ON vi.voter_id = voter_list."ID"
+            JOIN issues i ON i.id = vi.issue_id
+        ) v
+        GROUP BY {BUCKET_COLUMNS}, issue
+    """)
+
+
+def downgrade():
+    op.drop_index('ix_voter_issues_issue_id_voter_id', table_name='voter_issues')
+    op.drop_table('voter_issues')
+    op.drop_table('issues')
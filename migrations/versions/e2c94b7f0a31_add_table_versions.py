@@ -0,0 +1,28 @@
+"""Add table_versions write counters
+
+Revision ID: e2c94b7f0a31
+Revises: d5a07e3c1f98
+Create Date: 2026-10-18 11:48:05.271446
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2c94b7f0a31'
+down_revision = 'd5a07e3c1f98'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('table_versions',
+    sa.Column('table_name', sa.String(length=64), nullable=False),
+    sa.Column('version', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('table_name')
+    )
+
+
+def downgrade():
+    op.drop_table('table_versions')
@@ -0,0 +1,48 @@
+"""Add trigram and prefix indexes for voter search
+
+Revision ID: f4b6a1d8c253
+Revises: e2c94b7f0a31
+Create Date: 2026-10-18 12:31:52.640718
+
+Needs the pg_trgm extension (in PostgreSQL's contrib package). The upgrade
+runs CREATE EXTENSION, which takes a superuser or, since PostgreSQL 13, a
+role with CREATE on the database.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f4b6a1d8c253'
+down_revision = 'e2c94b7f0a31'
+branch_labels = None
+depends_on = None
+
+TRIGRAM_INDEXES = {
+    'ix_voter_list_name_trgm': 'Name',
+    'ix_voter_list_relative_name_trgm': "Father's or Husband's name",
+    'ix_voter_list_epic_number_trgm': 'EPIC number',
+    'ix_voter_list_house_number_trgm': 'House number',
+}
+
+
+def upgrade():
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+
+    for name, column in TRIGRAM_INDEXES.items():
+        op.create_index(name, 'voter_list', [column], unique=False,
+                        postgresql_using='gin', postgresql_ops={column: 'gin_trgm_ops'})
+
+    # C collation lets one btree serve both LIKE 'prefix%' and ORDER BY
+    op.create_index('ix_voter_list_name_prefix', 'voter_list',
+                    [sa.text('lower("Name") COLLATE "C"')], unique=False)
+    op.create_index('ix_voter_list_epic_number_prefix', 'voter_list',
+                    [sa.text('lower("EPIC number") COLLATE "C"')], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_voter_list_epic_number_prefix', table_name='voter_list')
+    op.drop_index('ix_voter_list_name_prefix', table_name='voter_list')
+    for name in reversed(list(TRIGRAM_INDEXES)):
+        op.drop_index(name, table_name='voter_list')
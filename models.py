@@ -1,33 +1,113 @@
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy.sql import func
 from sqlalchemy.dialects.postgresql import JSONB
-from sqlalchemy import Float
+from sqlalchemy import Float, event
+from sqlalchemy.orm import validates
 from datetime import datetime
+
+import categories
+from categories import CategoryCode
+
 db = SQLAlchemy()
 
+# ------------------------
+# Delta sync tracking (see delta_sync.py)
+# ------------------------
+SYNC_SEQ = db.Sequence('sync_seq', metadata=db.metadata)
+CURRENT_XID = db.text("pg_current_xact_id()::text::bigint")
+# SET clause for raw UPDATEs of a SyncTracked table (the ORM sets these itself)
+SYNC_TOUCH_SQL = "sync_seq = nextval('sync_seq'), sync_xid = pg_current_xact_id()::text::bigint, updated_at = now()"
+
+class SyncTracked:
+    """Every insert and update gives the row a new sync_seq and records the writing transaction."""
+    updated_at = db.Column(db.DateTime(timezone=True), server_default=func.now())
+    sync_seq = db.Column(db.BigInteger, nullable=False, index=True, server_default=SYNC_SEQ.next_value())
+    sync_xid = db.Column(db.BigInteger, nullable=False, index=True, server_default=CURRENT_XID)
+
+# ------------------------
+# Categorical lookups (codes and names fixed in categories.py)
+# ------------------------
+class Gender(db.Model):
+    __tablename__ = 'genders'
+
+    id = db.Column(db.SmallInteger, primary_key=True)
+    name = db.Column(db.String(20), nullable=False, unique=True)
+
+
+class Affiliation(db.Model):
+    __tablename__ = 'affiliations'
+
+    id = db.Column(db.SmallInteger, primary_key=True)
+    name = db.Column(db.String(50), nullable=False, unique=True)
+
+
+class EducationLevel(db.Model):
+    __tablename__ = 'education_levels'
+
+    id = db.Column(db.SmallInteger, primary_key=True)
+    name = db.Column(db.String(50), nullable=False, unique=True)
+
+
+# db.create_all() fills the lookups too (migrations seed them themselves)
+def _seed_lookup(kind):
+    def seed(table, connection, **kw):
+        connection.execute(table.insert(), [
+            {"id": code, "name": name} for code, name in categories.NAMES[kind].items()
+        ])
+    return seed
+
+for _model, _kind in ((Gender, "gender"), (Affiliation, "affiliation"), (EducationLevel, "education")):
+    event.listen(_model.__table__, "after_create", _seed_lookup(_kind))
+
+
 # ------------------------
 # Voter Table
 # ------------------------
-class Voter(db.Model):
+class Voter(SyncTracked, db.Model):
     __tablename__ = 'voter_list'
 
     id = db.Column('ID', db.Integer, primary_key=True)
     name = db.Column('Name', db.String(255), nullable=False)
     father_or_husband_name = db.Column("Father's or Husband's name", db.String(255))
     age = db.Column('Age', db.Integer)
-    gender = db.Column('Gender', db.String(20))
+    gender = db.Column('Gender', CategoryCode('gender'), db.ForeignKey('genders.id'))
     house_number = db.Column('House number', db.String(50))
     epic_number = db.Column('EPIC number', db.String(30))
     mobile_number = db.Column('Mobile Number', db.String(20))
     occupation = db.Column('Occupation', db.String(100))
-    education_level = db.Column('Education Level', db.String(50))
-    political_affiliation = db.Column('Political Affiliation', db.String(50))
+    education_level = db.Column('Education Level', CategoryCode('education'), db.ForeignKey('education_levels.id'))
+    political_affiliation = db.Column('Political Affiliation', CategoryCode('affiliation'), db.ForeignKey('affiliations.id'))
     key_issues = db.Column('Key Issues', db.Text)
     remarks = db.Column('Remarks', db.Text)
     has_voted = db.Column(db.Boolean, default=False)
+    # Bumped on every update; clients send it back for optimistic concurrency
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
 
     booth_id = db.Column(db.Integer, db.ForeignKey('booths.id'))
 
+    __table_args__ = (
+        db.Index('ix_voter_list_epic_number', 'EPIC number'),
+        db.Index('ix_voter_list_age', 'Age'),
+        db.Index('ix_voter_list_booth_id', 'booth_id'),
+        db.Index('ix_voter_list_gender', 'Gender'),
+        db.Index('ix_voter_list_political_affiliation', 'Political Affiliation'),
+        db.Index('ix_voter_list_education_level', 'Education Level'),
+    )
+    __mapper_args__ = {'version_id_col': version}
+
+    # Categorical values are canonicalized on assignment; unknown ones raise ValueError
+    @validates('gender')
+    def _validate_gender(self, key, value):
+        return categories.canonical('gender', value)
+
+    @validates('political_affiliation')
+    def _validate_affiliation(self, key, value):
+        return categories.canonical('affiliation', value)
+
+    @validates('education_level')
+    def _validate_education(self, key, value):
+        return categories.canonical('education', value)
+
     def to_dict(self):
         return {
             "ID": self.id,
@@ -45,13 +125,22 @@ class Voter(db.Model):
             "Remarks": self.remarks,
             "has_voted": self.has_voted,
             "booth_id": self.booth_id,
+            "version": self.version,
         }
 
+# Voter attributes entered by field workers (bulk patches, never overwritten by imports)
+WORKER_FIELDS = (
+    "mobile_number", "occupation", "education_level",
+    "political_affiliation", "key_issues", "remarks",
+)
+# Voter attributes stored as categories.py codes, with their category kind
+CATEGORY_FIELDS = {"gender": "gender", "education_level": "education", "political_affiliation": "affiliation"}
+
 
 # ------------------------
 # Worker Module: Tasks
 # ------------------------
-class Task(db.Model):
+class Task(SyncTracked, db.Model):
     __tablename__ = 'tasks'
 
     id = db.Column(db.Integer, primary_key=True)
@@ -61,6 +150,12 @@ class Task(db.Model):
     due_date = db.Column(db.Date)
     created_at = db.Column(db.DateTime(timezone=True), server_default=func.now())
 
+    __table_args__ = (
+        db.Index('ix_tasks_due_date', 'due_date'),
+        db.Index('ix_tasks_status_due_date', 'status', 'due_date'),
+        db.Index('ix_tasks_created_at', 'created_at'),
+    )
+
     def to_dict(self):
         return {
             "id": self.id,
@@ -75,7 +170,7 @@ class Task(db.Model):
 # ------------------------
 # Worker Module: Messages / Communication
 # ------------------------
-class Communication(db.Model):
+class Communication(SyncTracked, db.Model):
     __tablename__ = 'communications'
 
     id = db.Column(db.Integer, primary_key=True)
@@ -84,6 +179,10 @@ class Communication(db.Model):
     audience = db.Column(db.String(255))   # e.g. "All", "Booth-12", "Youth", etc.
     created_at = db.Column(db.DateTime(timezone=True), server_default=func.now())
 
+    __table_args__ = (
+        db.Index('ix_communications_created_at', 'created_at'),
+    )
+
     def to_dict(self):
         return {
             "id": self.id,
@@ -97,7 +196,7 @@ class Communication(db.Model):
 # ------------------------
 # Worker Module: Reports
 # ------------------------
-class Report(db.Model):
+class Report(SyncTracked, db.Model):
     __tablename__ = 'reports'
 
     id = db.Column(db.Integer, primary_key=True)
@@ -106,6 +205,10 @@ class Report(db.Model):
     date = db.Column(db.Date)  # logical "date of report"
     submitted_at = db.Column(db.DateTime(timezone=True), server_default=func.now())
 
+    __table_args__ = (
+        db.Index('ix_reports_submitted_at', 'submitted_at'),
+    )
+
     def to_dict(self):
         return {
             "id": self.id,
@@ -161,13 +264,117 @@ class Booth(db.Model):
 
 
 
-class VoterLocation(db.Model):
+class VoterLocation(SyncTracked, db.Model):
     __tablename__ = 'voter_locations'
 
     id = db.Column(db.Integer, primary_key=True)
+    voter_id = db.Column(db.Integer, db.ForeignKey('voter_list.ID', ondelete='CASCADE'), unique=True)
     voter_name = db.Column(db.String(120))
     voter_house_no = db.Column(db.String(50))
     landmark = db.Column(db.Text)
     latitude = db.Column(db.Float)
     longitude = db.Column(db.Float)
     saved_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+# ------------------------
+# Voter Key Issues (normalized)
+# ------------------------
+class Issue(db.Model):
+    __tablename__ = 'issues'
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.Text, nullable=False, unique=True)  # trimmed, lowercase
+
+    def to_dict(self):
+        return {"id": self.id, "name": self.name}
+
+
+class VoterIssue(db.Model):
+    __tablename__ = 'voter_issues'
+    __table_args__ = (
+        db.Index('ix_voter_issues_issue_id_voter_id', 'issue_id', 'voter_id'),
+    )
+
+    voter_id = db.Column(db.Integer, db.ForeignKey('voter_list.ID', ondelete='CASCADE'), primary_key=True)
+    issue_id = db.Column(db.Integer, db.ForeignKey('issues.id', ondelete='CASCADE'), primary_key=True)
+
+# ------------------------
+# Candidate Module: Pre-aggregated voter counts
+# ------------------------
+# Key columns are never NULL so they can form a primary key: a missing
+# booth is stored as 0 and missing values as ''. Category keys are the
+# lower-case canonical name (categories.key()), so aliases share a bucket.
+class VoterAggregate(db.Model):
+    __tablename__ = 'voter_aggregates'
+
+    booth_id = db.Column(db.Integer, primary_key=True)
+    gender = db.Column(db.String(20), primary_key=True)
+    age_band = db.Column(db.String(10), primary_key=True)
+    affiliation = db.Column(db.String(50), primary_key=True)
+    education_level = db.Column(db.String(50), primary_key=True)
+    voters = db.Column(db.Integer, nullable=False, default=0)
+    contacted = db.Column(db.Integer, nullable=False, default=0)
+
+
+class VoterIssueAggregate(db.Model):
+    __tablename__ = 'voter_issue_aggregates'
+
+    booth_id = db.Column(db.Integer, primary_key=True)
+    gender = db.Column(db.String(20), primary_key=True)
+    age_band = db.Column(db.String(10), primary_key=True)
+    affiliation = db.Column(db.String(50), primary_key=True)
+    education_level = db.Column(db.String(50), primary_key=True)
+    issue = db.Column(db.Text, primary_key=True)
+    mentions = db.Column(db.Integer, nullable=False, default=0)
+
+
+# ------------------------
+# Change tracking: per-table write counters
+# ------------------------
+class TableVersion(db.Model):
+    __tablename__ = 'table_versions'
+
+    table_name = db.Column(db.String(64), primary_key=True)
+    version = db.Column(db.BigInteger, nullable=False, default=0)
+
+
+# ------------------------
+# Electoral roll PDF ingestion progress
+# ------------------------
+class RollImportPage(db.Model):
+    __tablename__ = 'roll_import_pages'
+
+    source_sha256 = db.Column(db.String(64), primary_key=True)
+    page_number = db.Column(db.Integer, primary_key=True)
+    source_name = db.Column(db.String(255))
+    voters = db.Column(db.Integer, nullable=False, default=0)
+    imported_at = db.Column(db.DateTime(timezone=True), server_default=func.now())
+
+
+# ------------------------
+# Deleted rows of the delta-synced tables
+# ------------------------
+class SyncTombstone(db.Model):
+    __tablename__ = 'sync_tombstones'
+
+    seq = db.Column(db.BigInteger, primary_key=True, server_default=SYNC_SEQ.next_value())
+    table_name = db.Column(db.String(64), nullable=False)
+    row_id = db.Column(db.Integer, nullable=False)
+    sync_xid = db.Column(db.BigInteger, nullable=False, index=True, server_default=CURRENT_XID)
+    deleted_at = db.Column(db.DateTime(timezone=True), server_default=func.now())
+
+
+# ------------------------
+# Voter change log (IDs of inserted, updated and deleted voters)
+# ------------------------
+class VoterChange(db.Model):
+    __tablename__ = 'voter_changes'
+
+    seq = db.Column(db.BigInteger, primary_key=True)
+    voter_id = db.Column(db.Integer, nullable=False)
+    changed_at = db.Column(db.DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        db.Index('ix_voter_changes_changed_at', 'changed_at'),
+    )
@@ -0,0 +1,158 @@
+# news_feeds.py
+"""
+Election news aggregated from a few RSS feeds.
+
+A background thread refetches all feeds concurrently every
+NEWS_REFRESH_SECONDS, using conditional GETs (ETag / Last-Modified) so an
+unchanged feed costs a 304. Entries are deduplicated by link (or title),
+their published dates are parsed into datetimes, and the merged list is
+kept in memory; /api/candidate/news only reads it. Callbacks registered
+with on_change() get the new list whenever a refresh changed it (the live
+event stream pushes it to open dashboards).
+
+NEWS_FEEDS (comma separated URLs) overrides the default feeds, e.g. to
+point at a local HTTP server during development.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+import os
+import threading
+import urllib.error
+import urllib.request
+
+FEEDS = (
+    "https://www.livemint.com/rss/elections",
+    "https://indianexpress.com/section/political-pulse/feed/",
+    "https://timesofindia.indiatimes.com/rssfeeds/66949542.cms",  # TOI Elections
+)
+PER_FEED = 5
+LIMIT = 15
+
+
+def _published(entry):
+    parsed = entry.get("published_parsed") or entry.get("updated_parsed")
+    if not parsed:
+        return None
+    return datetime(*parsed[:6], tzinfo=timezone.utc)
+
+
+class FeedState:
+    def __init__(self, url):
+        self.url = url
+        self.etag = None
+        self.modified = None
+        self.items = []
+
+
+class NewsAggregator:
+    def __init__(self, feeds=FEEDS, interval=300, timeout=10):
+        self.feeds = [FeedState(url) for url in feeds]
+        self.interval = interval
+        self.timeout = timeout
+        self.items = []
+        self.refreshed_at = None
+        self._ready = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._callbacks = []
+
+    def fetch(self, state):
+        """Refetch one feed; keeps its previous items on 304 or error."""
+        request = urllib.request.Request(state.url, headers={"User-Agent": "JanPath news"})
+        if state.etag:
+            request.add_header("If-None-Match", state.etag)
+        if state.modified:
+            request.add_header("If-Modified-Since", state.modified)
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                body = response.read()
+                etag, modified = response.headers.get("ETag"), response.headers.get("Last-Modified")
+        except urllib.error.HTTPError as e:
+            if e.code != 304:
+                print(f"Error fetching {state.url}: HTTP {e.code}")
+            return
+        except Exception as e:
+            print(f"Error fetching {state.url}: {e}")
+            return
+
+        import feedparser  # loaded on the first refresh, not at app startup
+
+        feed = feedparser.parse(body)
+        source = feed.feed.get("title", "Unknown Source")
+        state.items = [
+            {
+                "title": entry.get("title"),
+                "url": entry.get("link"),
+                "source": source,
+                "published": _published(entry),
+            }
+            for entry in feed.entries[:PER_FEED]
+        ]
+        state.etag, state.modified = etag, modified
+
+    def refresh(self):
+        with ThreadPoolExecutor(max_workers=len(self.feeds) or 1) as pool:
+            list(pool.map(self.fetch, self.feeds))
+
+        merged = {}
+        for state in self.feeds:
+            for item in state.items:
+                key = (item["url"] or "").strip() or (item["title"] or "").strip().lower()
+                if key and key not in merged:
+                    merged[key] = item
+        oldest = datetime.min.replace(tzinfo=timezone.utc)
+        items = sorted(merged.values(), key=lambda item: item["published"] or oldest, reverse=True)
+        with self._lock:
+            changed = items[:LIMIT] != self.items
+            self.items = items[:LIMIT]
+            self.refreshed_at = datetime.now(timezone.utc)
+            callbacks = list(self._callbacks) if changed else []
+        self._ready.set()
+        for callback in callbacks:
+            callback(self._payload(items[:LIMIT]))
+
+    def on_change(self, callback):
+        with self._lock:
+            self._callbacks.append(callback)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.refresh()
+            except Exception as e:
+                print("News refresh error:", e)
+            self._stop.wait(self.interval)
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="news-feeds", daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def latest(self, wait=5):
+        """Cached merged items as JSON-ready dicts; waits up to `wait` seconds for the first refresh."""
+        self.start()
+        self._ready.wait(wait)
+        with self._lock:
+            items = list(self.items)
+        return self._payload(items)
+
+    def _payload(self, items):
+        return [
+            {
+                "title": item["title"],
+                "url": item["url"],
+                "source": item["source"],
+                "publishedAt": item["published"].isoformat() if item["published"] else "",
+            }
+            for item in items
+        ]
+
+
+def from_env():
+    feeds = [url.strip() for url in os.getenv("NEWS_FEEDS", "").split(",") if url.strip()]
+    return NewsAggregator(feeds or FEEDS, interval=int(os.getenv("NEWS_REFRESH_SECONDS", 300)))
@@ -0,0 +1,55 @@
+# pagination.py
+"""
+Keyset cursors and cached row counts for list endpoints.
+"""
+import base64
+import json
+
+from models import db
+from caching import LRUCache
+import table_versions
+
+# (table, filter key, table version) -> total
+_totals = LRUCache(maxsize=2048)
+
+
+def encode_cursor(last_id):
+    raw = json.dumps({"after": last_id}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor):
+    """ID to continue after, None for the first page. Raises ValueError if malformed."""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        after = json.loads(raw)["after"]
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if not isinstance(after, int):
+        raise ValueError("Invalid cursor")
+    return after
+
+def estimate_count(query):
+    """Planner row estimate for a query; cheap but approximate."""
+    stmt = query.order_by(None).statement
+    compiled = stmt.compile(
+        dialect=db.session.get_bind().dialect,
+        compile_kwargs={"render_postcompile": True},
+    )
+    plan = db.session.connection().exec_driver_sql(
+        "EXPLAIN (FORMAT JSON) " + str(compiled), compiled.params
+    ).scalar()
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+def cached_count(query, table, key):
+    """Exact count of a query, reused until the table is written to again."""
+    cache_key = (table, key, table_versions.current(table))
+    total = _totals.get(cache_key)
+    if total is None:
+        total = query.order_by(None).count()
+        _totals.set(cache_key, total)
+    return total
+
+def count_stats():
+    return _totals.stats()
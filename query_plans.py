@@ -0,0 +1,113 @@
+# query_plans.py
+"""
+EXPLAIN-based check that the list and filter queries stay on indexes.
+
+Every voter filter (alone and in pairs), the voter searches (ILIKE, the
+ranked `%>` search and the type-ahead prefix), the task list by status and
+the "most recent" lists are planned with EXPLAIN. A plan fails when it
+sequentially scans a table of at least min_rows rows while expecting to keep
+less than max_share of them, which is the case an index should serve.
+Unselective filters (e.g. gender alone) are allowed to scan.
+
+A small database (as in CI) has no table of min_rows rows, so that check
+passes whatever the indexes are. strict=True plans with sequential scans
+disabled and fails on every one left, which only happens when no index
+can serve the query; it holds on any amount of data.
+
+The substring filters and the voter search need the pg_trgm extension
+for their GIN indexes (see missing_extensions()).
+"""
+from itertools import combinations
+
+from sqlalchemy import func, select, text
+
+from models import db, Voter, Task, Communication, Report
+from voter_filters import filter_voters
+import voter_search
+
+# One representative value per filter
+FILTER_SAMPLES = {
+    "gender": "female",
+    "affiliation": "supporter",
+    "age": "18-25",
+    "issues": "water",
+    "occupation": "farm",
+    "ward": "1",
+    "education": "grad",
+}
+EXTENSIONS = ("pg_trgm",)
+
+
+def explain(stmt):
+    """EXPLAIN (FORMAT JSON) plan tree of a statement or ORM query."""
+    if hasattr(stmt, "statement"):
+        stmt = stmt.statement
+    compiled = stmt.compile(
+        dialect=db.session.get_bind().dialect,
+        compile_kwargs={"render_postcompile": True},
+    )
+    plan = db.session.connection().exec_driver_sql(
+        "EXPLAIN (FORMAT JSON) " + str(compiled), compiled.params
+    ).scalar()
+    return plan[0]["Plan"]
+
+def seq_scans(plan):
+    """(table, expected rows) for every Seq Scan node in a plan tree."""
+    found = []
+    if plan["Node Type"] == "Seq Scan":
+        found.append((plan["Relation Name"], plan["Plan Rows"]))
+    for child in plan.get("Plans", []):
+        found += seq_scans(child)
+    return found
+
+def _count(query):
+    return select(func.count()).select_from(query.order_by(None).subquery())
+
+def cases():
+    """(label, statement) pairs to plan."""
+    filter_sets = [{name: value} for name, value in FILTER_SAMPLES.items()]
+    filter_sets += [dict(a, **b) for a, b in combinations(filter_sets, 2)]
+    for filters in filter_sets:
+        label = ",".join(f"{k}={v}" for k, v in filters.items())
+        query = filter_voters(Voter.query, **filters)
+        yield f"voters count [{label}]", _count(query)
+        yield f"voters page [{label}]", query.order_by(Voter.id).limit(50)
+
+    term = "%ram%"
+    search = Voter.query.filter(
+        Voter.name.ilike(term) | Voter.epic_number.ilike(term) | Voter.house_number.ilike(term)
+    )
+    yield "voters search", _count(search)
+    for q in ("ramesh", "ABC12"):
+        yield f"voters ranked search [{q}]", voter_search.ranked_query(Voter.query, q)
+        yield f"voters prefix search [{q}]", voter_search.prefix_query(Voter.query, q)
+    yield "epic lookup", Voter.query.filter(Voter.epic_number == "ABC1234567")
+    yield "recent tasks", Task.query.order_by(Task.created_at.desc()).limit(5)
+    yield "tasks by due date", Task.query.order_by(Task.due_date).limit(50)
+    yield "tasks by status", Task.query.filter(Task.status == "Pending").order_by(Task.due_date).limit(50)
+    yield "recent communications", Communication.query.order_by(Communication.created_at.desc()).limit(3)
+    yield "recent reports", Report.query.order_by(Report.submitted_at.desc()).limit(50)
+
+def missing_extensions():
+    """Extensions the indexes rely on that are not installed in this database."""
+    installed = set(db.session.execute(text("SELECT extname FROM pg_extension")).scalars())
+    return [name for name in EXTENSIONS if name not in installed]
+
+def check(min_rows=10000, max_share=0.2, strict=False):
+    """[(label, table, expected rows, table rows)] for every selective seq scan of a large table,
+    or with strict, for every seq scan the planner can't avoid."""
+    table_rows = dict(db.session.execute(text(
+        "SELECT relname, reltuples::bigint FROM pg_class WHERE relkind = 'r'"
+    )).all())
+    if strict:
+        db.session.execute(text("SET LOCAL enable_seqscan = off"))
+    failures = []
+    try:
+        for label, stmt in cases():
+            for table, rows in seq_scans(explain(stmt)):
+                total = table_rows.get(table, 0)
+                if strict or (total >= min_rows and rows < max_share * total):
+                    failures.append((label, table, rows, total))
+    finally:
+        db.session.rollback()
+    return failures
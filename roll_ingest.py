@@ -0,0 +1,176 @@
+# roll_ingest.py
+"""
+Electoral roll PDF ingestion.
+
+ECI rolls print three voter boxes per row. Pages are parsed in a process
+pool: each worker opens the PDF once, splits a page into its three box
+columns and reads the voters with a regex. The parent process loads each
+page's voters into voter_list with COPY. That happens in one transaction
+together with the aggregate deltas, the table version bump and a row in
+roll_import_pages. A page is therefore loaded exactly once, and an
+interrupted run resumes where it stopped.
+"""
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import csv
+import hashlib
+import io
+import os
+import re
+import time
+
+from sqlalchemy import select
+
+from models import db, Voter, RollImportPage
+import aggregates
+import categories
+import table_versions
+
+# Left edges of the 2nd and 3rd voter box columns on an A4 roll page (points)
+COLUMN_EDGES = (206, 396)
+
+# A box starts with an optional status mark ("#" modified, "S" shifted), the
+# serial number, the supplement serial on supplement pages and the EPIC number
+VOTER_RE = re.compile(
+    r"^(?:[#S*][ \t]+)?(?P<serial>\d+)(?:[ \t]+\d+)?[ \t]+(?P<epic>[A-Z]{2,4}/?[0-9/]{5,})?[ \t]*\n"
+    r"\s*Name\s*:\s*(?P<name>.*?)\s*\n"
+    r"\s*(?:Father|Husband|Mother|Wife|Other)(?:'s|s)?\s*(?:Name)?\s*:\s*(?P<relative>.*?)\s*\n"
+    r"\s*House\s*Number\s*:\s*(?P<house>.*?)\s*(?:Photo)?\s*\n"
+    r"\s*Age\s*:\s*(?P<age>\d+)\s*Gender\s*:\s*(?P<gender>[A-Za-z ]+?)(?:\s+Available)?\s*$",
+    re.M | re.S,
+)
+
+COPY_COLUMNS = [
+    Voter.name, Voter.father_or_husband_name, Voter.age, Voter.gender,
+    Voter.house_number, Voter.epic_number, Voter.booth_id,
+]
+
+
+def _clean(value):
+    value = " ".join((value or "").split())
+    return value if value and value != "-" else None
+
+def _gender(value):
+    # Rolls print Male/Female/Third Gender; anything unreadable is left empty
+    try:
+        return categories.canonical("gender", _clean(value))
+    except ValueError:
+        return None
+
+def parse_text(text):
+    """Voter dicts, keyed like the Voter model attributes, from one box column's text."""
+    voters = []
+    for m in VOTER_RE.finditer(text):
+        voters.append({
+            "name": _clean(m.group("name")),
+            "father_or_husband_name": _clean(m.group("relative")),
+            "age": int(m.group("age")),
+            "gender": _gender(m.group("gender")),
+            "house_number": _clean(m.group("house")),
+            "epic_number": _clean(m.group("epic")),
+            "serial": int(m.group("serial")),
+        })
+    return voters
+
+
+# -------------------------
+# Worker process side
+# -------------------------
+_pdf = None
+
+def _open_pdf(path):
+    global _pdf
+    import pdfplumber
+    _pdf = pdfplumber.open(path)
+
+def parse_page(page_number):
+    """Return (page_number, voters) for a 1-based page of the worker's PDF."""
+    page = _pdf.pages[page_number - 1]
+    edges = (0,) + COLUMN_EDGES + (page.width + 1,)
+    voters = []
+    for left, right in zip(edges, edges[1:]):
+        column = page.filter(lambda obj, l=left, r=right: obj.get("object_type") != "char" or l <= obj["x0"] < r)
+        voters.extend(parse_text(column.extract_text() or ""))
+    voters.sort(key=lambda v: v["serial"])
+    page.flush_cache()
+    return page_number, voters
+
+
+# -------------------------
+# Loader side
+# -------------------------
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for block in iter(lambda: fh.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def page_count(path):
+    import pdfplumber
+    with pdfplumber.open(path) as pdf:
+        return len(pdf.pages)
+
+def copy_voters(connection, voters, booth_id=None):
+    """COPY parsed voters into voter_list on the connection's transaction."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for v in voters:
+        writer.writerow([
+            v["name"], v["father_or_husband_name"], v["age"], categories.code("gender", v["gender"]),
+            v["house_number"], v["epic_number"], booth_id,
+        ])
+    buffer.seek(0)
+    columns = ", ".join(f'"{c.name}"' for c in COPY_COLUMNS)
+    cursor = connection.connection.cursor()
+    try:
+        cursor.copy_expert(f"COPY voter_list ({columns}) FROM STDIN WITH (FORMAT csv)", buffer)
+    finally:
+        cursor.close()
+
+def load_page(source, page_number, voters, booth_id=None):
+    """Load one parsed page and mark it done, atomically."""
+    connection = db.session.connection()
+    if voters:
+        copy_voters(connection, voters, booth_id)
+
+        deltas = aggregates.empty_deltas()
+        for v in voters:
+            aggregates.add_deltas(deltas, {
+                "booth_id": booth_id, "gender": v["gender"], "age": v["age"],
+                "political_affiliation": None, "education_level": None,
+                "mobile_number": None, "key_issues": None,
+            }, 1)
+        aggregates.apply_deltas(connection, deltas)
+        table_versions.bump(connection, Voter.__tablename__)
+
+    db.session.add(RollImportPage(
+        source_sha256=source["sha256"], source_name=source["name"],
+        page_number=page_number, voters=len(voters),
+    ))
+    db.session.commit()
+
+def ingest(path, workers=None, booth_id=None, report=print):
+    """Parse and load every not-yet-imported page of a roll PDF. Returns voters loaded."""
+    source = {"sha256": file_digest(path), "name": os.path.basename(path)}
+    done = set(db.session.execute(
+        select(RollImportPage.page_number).where(RollImportPage.source_sha256 == source["sha256"])
+    ).scalars())
+    pages = [n for n in range(1, page_count(path) + 1) if n not in done]
+    if done:
+        report(f"Resuming {source['name']}: {len(done)} pages already imported, {len(pages)} to go")
+    if not pages:
+        return 0
+
+    workers = workers or os.cpu_count() or 1
+    started = time.perf_counter()
+    loaded = 0
+    with ProcessPoolExecutor(max_workers=workers, initializer=_open_pdf, initargs=(path,)) as pool:
+        futures = [pool.submit(parse_page, n) for n in pages]
+        for i, future in enumerate(as_completed(futures), 1):
+            page_number, voters = future.result()
+            load_page(source, page_number, voters, booth_id)
+            loaded += len(voters)
+            elapsed = time.perf_counter() - started
+            report(f"[{i}/{len(pages)}] page {page_number}: {len(voters)} voters "
+                   f"({i / elapsed:.1f} pages/s, {loaded / elapsed:.0f} voters/s)")
+    return loaded
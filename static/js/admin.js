@@ -67,18 +67,25 @@ function importVoterData() {
     if (fileInput.files.length > 0) {
         const file = fileInput.files[0];
         statusDiv.textContent = `Uploading ${file.name}...`;
-        // Simulate upload
-        setTimeout(() => {
-            statusDiv.textContent = `${file.name} imported successfully! (This is a dummy message)`;
-            alert('File uploaded and ready for processing by backend.');
-        }, 2000);
-        // In real app:
-        // const formData = new FormData();
-        // formData.append('voter_data', file);
-        // fetch('/api/admin/voters/import', { method: 'POST', body: formData })
-        // .then(response => response.json())
-        // .then(data => { /* handle response */ })
-        // .catch(error => { /* handle error */ });
+        const formData = new FormData();
+        formData.append('voter_data', file);
+        fetch('/api/admin/voters/import', { method: 'POST', body: formData })
+        .then(response => response.json())
+        .then(data => {
+            if (data.error) {
+                statusDiv.textContent = `Import failed: ${data.error}`;
+                return;
+            }
+            statusDiv.textContent = `${file.name}: ${data.inserted} added, ${data.updated} updated, ` +
+                `${data.rejected} rejected of ${data.rows} rows.`;
+            if (data.errors && data.errors.length) {
+                console.warn('Rejected rows:', data.errors);
+            }
+        })
+        .catch(error => {
+            console.error('Import error:', error);
+            statusDiv.textContent = 'Import failed. Please try again.';
+        });
     } else {
         statusDiv.textContent = 'Please select a file to import.';
     }
@@ -67,18 +67,7 @@ async function loadCommandCenterData() {
         // API call to the backend endpoint
         const response = await fetch('/api/candidate/kpis');
         if (!response.ok) throw new Error('Network response was not ok');
-        const kpiData = await response.json();
-
-        // Update KPI Cards with data from the server
-        const contactedPercentage = (kpiData.votersContacted.count / kpiData.votersContacted.total) * 100;
-        document.getElementById('kpiContacted').textContent = `${kpiData.votersContacted.count} / ${kpiData.votersContacted.total}`;
-        document.getElementById('kpiContactedBar').style.width = `${contactedPercentage}%`;
-        
-        document.getElementById('kpiSupporters').textContent = kpiData.supporters.toLocaleString();
-        document.getElementById('kpiUndecided').textContent = kpiData.undecided.toLocaleString();
-        
-        const tasksPercentage = (kpiData.tasksCompleted.count / kpiData.tasksCompleted.total) * 100;
-        document.getElementById('kpiTasks').textContent = `${Math.round(tasksPercentage || 0)}% (${kpiData.tasksCompleted.count})`;
+        renderKpis(await response.json());
 
         // Load activity feed
         loadActivityFeed();
@@ -92,6 +81,26 @@ async function loadCommandCenterData() {
         document.getElementById('kpiTasks').textContent = 'Error';
     }
 }
+
+// Last KPIs received; the live stream sends only the ones that changed
+let kpiState = {};
+
+function renderKpis(changed) {
+    kpiState = { ...kpiState, ...changed };
+    const kpiData = kpiState;
+    if (!kpiData.votersContacted || !kpiData.tasksCompleted) return;
+
+    // Update KPI Cards with data from the server
+    const contactedPercentage = (kpiData.votersContacted.count / kpiData.votersContacted.total) * 100;
+    document.getElementById('kpiContacted').textContent = `${kpiData.votersContacted.count} / ${kpiData.votersContacted.total}`;
+    document.getElementById('kpiContactedBar').style.width = `${contactedPercentage || 0}%`;
+
+    document.getElementById('kpiSupporters').textContent = kpiData.supporters.toLocaleString();
+    document.getElementById('kpiUndecided').textContent = kpiData.undecided.toLocaleString();
+
+    const tasksPercentage = (kpiData.tasksCompleted.count / kpiData.tasksCompleted.total) * 100;
+    document.getElementById('kpiTasks').textContent = `${Math.round(tasksPercentage || 0)}% (${kpiData.tasksCompleted.count})`;
+}
 // -------------------- NEW COMMAND CENTRE FUNCTIONS --------------------
 
 /**
@@ -236,32 +245,51 @@ async function loadSegmentPerformance() {
 }
 
 // -------------------- ACTIVITY FEED --------------------
+let activityPolling = null;
+
 function startLiveActivityFeed() {
     loadActivityFeed(); // initial load
 
-    if (window.EventSource) {
+    if (!window.EventSource) {
+        startActivityPolling();
+        return;
+    }
+    // The stream sends the KPIs on connect, then activity items and KPI changes as they happen
+    const evtSource = new EventSource('/api/candidate/activity-stream');
+    evtSource.onmessage = e => {
         try {
-            const evtSource = new EventSource('/api/candidate/activity-stream');
-            evtSource.onmessage = e => {
-                try {
-                    const activity = JSON.parse(e.data);
-                    addActivityItem(activity);
-                } catch {
-                    console.error("Invalid SSE activity data:", e.data);
-                }
-            };
-            evtSource.onerror = () => {
-                console.warn('SSE failed, switching to polling...');
-                evtSource.close();
-                setInterval(loadActivityFeed, 10000);
-            };
+            addActivityItem(JSON.parse(e.data));
         } catch {
-            console.warn('SSE not supported, using polling...');
-            setInterval(loadActivityFeed, 10000);
+            console.error("Invalid SSE activity data:", e.data);
         }
-    } else {
-        setInterval(loadActivityFeed, 10000);
-    }
+    };
+    evtSource.addEventListener('kpis', e => {
+        try {
+            renderKpis(JSON.parse(e.data));
+        } catch {
+            console.error("Invalid SSE KPI data:", e.data);
+        }
+    });
+    evtSource.addEventListener('news', e => {
+        try {
+            renderNews(JSON.parse(e.data));
+        } catch {
+            console.error("Invalid SSE news data:", e.data);
+        }
+    });
+    evtSource.onerror = () => {
+        // The browser reconnects on its own unless the server refused the stream
+        if (evtSource.readyState === EventSource.CLOSED) {
+            console.warn('SSE unavailable, switching to polling...');
+            startActivityPolling();
+        }
+    };
+}
+
+function startActivityPolling() {
+    if (activityPolling) return;
+    activityPolling = setInterval(loadCommandCenterData, 10000);
+    setInterval(loadNewsFeed, 60000);
 }
 
 async function loadActivityFeed() {
@@ -308,12 +336,13 @@ function addActivityItem(activity, prepend = true) {
 }
 
 // -------------------- NEWS FEED --------------------
+// Loaded once; later changes arrive as `news` events on the activity stream
+// (polled only when the stream is unavailable)
 function startNewsFeed() {
     loadNewsFeed();
-    setInterval(loadNewsFeed, 60000);
 }
 
-async function loadNewsFeed() {
+function newsList() {
     let newsContainer = document.getElementById('newsFeedList');
     if (!newsContainer) {
         const newsSection = document.createElement('div');
@@ -322,35 +351,43 @@ async function loadNewsFeed() {
         document.querySelector('.command-center-grid').appendChild(newsSection);
         newsContainer = document.getElementById('newsFeedList');
     }
+    return newsContainer;
+}
+
+async function loadNewsFeed() {
+    const newsContainer = newsList();
     newsContainer.innerHTML = '<li>Loading news...</li>';
 
     try {
         const response = await fetch('/api/candidate/news');
         if (!response.ok) throw new Error('Failed to fetch news');
-        const newsItems = await response.json();
-
-        if (!newsItems.length) {
-            newsContainer.innerHTML = '<li>No recent news</li>';
-            return;
-        }
-
-        newsContainer.innerHTML = newsItems.map(item => {
-            const date = item.publishedAt ? new Date(item.publishedAt).toLocaleString() : "";
-            return `
-                <li>
-                    <a href="${item.url}" target="_blank" rel="noopener">
-                        ${item.title}
-                    </a>
-                    <br><small style="color:#6c757d;">${date}</small>
-                </li>
-            `;
-        }).join('');
+        renderNews(await response.json());
     } catch (error) {
         console.error('Failed to load news feed:', error);
         newsContainer.innerHTML = '<li>⚠️ Unable to load news feed</li>';
     }
 }
 
+function renderNews(newsItems) {
+    const newsContainer = newsList();
+    if (!newsItems.length) {
+        newsContainer.innerHTML = '<li>No recent news</li>';
+        return;
+    }
+
+    newsContainer.innerHTML = newsItems.map(item => {
+        const date = item.publishedAt ? new Date(item.publishedAt).toLocaleString() : "";
+        return `
+            <li>
+                <a href="${item.url}" target="_blank" rel="noopener">
+                    ${item.title}
+                </a>
+                <br><small style="color:#6c757d;">${date}</small>
+            </li>
+        `;
+    }).join('');
+}
+
 
 // ---- MAP ----
 async function loadWardMap() {
@@ -414,14 +451,20 @@ async function applyVoterFilters() {
     }
     const queryString = queryParams.toString();
 
-    // 2. Fetch Voter List
+    // 2. Fetch Voter List (only the columns the table shows)
+    const listParams = new URLSearchParams(queryParams);
+    listParams.append('fields', 'name,age,gender,political_affiliation,key_issues');
+    listParams.append('format', 'columns');
     const tbody = document.getElementById('analyticsVoterList');
     tbody.innerHTML = `<tr><td colspan="5">Loading...</td></tr>`;
     try {
-        const response = await fetch(`/api/candidate/voters?${queryString}`);
+        const response = await fetch(`/api/candidate/voters?${listParams.toString()}`);
         if (!response.ok) throw new Error('Network response was not ok');
         const data = await response.json();
-        const voters = data.items;
+        const names = data.schema.map(f => f.name);
+        const voters = data.columns.length
+            ? data.columns[0].map((_, i) => Object.fromEntries(names.map((name, j) => [name, data.columns[j][i]])))
+            : [];
 
         tbody.innerHTML = "";
         
@@ -430,13 +473,13 @@ async function applyVoterFilters() {
         } else {
             voters.forEach(voter => {
                 const tr = document.createElement('tr');
-                const affiliationClass = getAffiliationClass(voter['Political Affiliation']);
+                const affiliationClass = getAffiliationClass(voter.political_affiliation);
                 tr.innerHTML = `
-                    <td>${voter.Name || ''}</td>
-                    <td>${voter.Age || ''}</td>
-                    <td>${voter.Gender || ''}</td>
-                    <td><span class="badge ${affiliationClass}">${voter['Political Affiliation'] || 'Empty'}</span></td>
-                    <td>${voter['Key Issues'] || ''}</td>
+                    <td>${voter.name || ''}</td>
+                    <td>${voter.age || ''}</td>
+                    <td>${voter.gender || ''}</td>
+                    <td><span class="badge ${affiliationClass}">${voter.political_affiliation || 'Empty'}</span></td>
+                    <td>${voter.key_issues || ''}</td>
                 `;
                 tbody.appendChild(tr);
             });
@@ -494,6 +537,9 @@ async function saveSegment() {
         age: document.getElementById('filterAge').value,
         issues: document.getElementById('filterIssues').value,
         occupation: document.getElementById('filterOccupation').value,
+        gender: document.getElementById('filterGender').value,
+        ward: document.getElementById('filterWard').value,
+        education: document.getElementById('filterEducation').value,
     };
 
     // Remove empty filters
@@ -939,7 +985,7 @@ function renderGenderChart(data = {}) {
    CSV Export Logic
    ========================= */
 
-async function exportVoters() {
+function exportVoters() {
     console.log("Exporting voters...");
     const filters = {
         affiliation: document.getElementById('filterAffiliation').value,
@@ -956,59 +1002,16 @@ async function exportVoters() {
             queryParams.append(key, filters[key]);
         }
     }
-    queryParams.append('page', '1');
-    queryParams.append('per_page', '100000'); 
-    try {
-        const response = await fetch(`/api/candidate/voters?${queryParams.toString()}`);
-        if (!response.ok) throw new Error('Failed to fetch data for export');
-        const data = await response.json();
-        const voters = data.items;
-        if (voters.length === 0) {
-            alert("No voters to export for this filter.");
-            return;
-        }
-        const csv = jsonToCsv(voters);
-        downloadCsv(csv, 'voter_export.csv');
-    } catch (error) {
-        console.error("Error exporting CSV:", error);
-        alert("Could not export voter data.");
-    }
-}
+    queryParams.append('format', 'csv');
 
-function jsonToCsv(json) {
-    const items = json;
-    const headers = [
-        "ID", "Name", "Father's or Husband's name", "Age", "Gender", 
-        "House number", "EPIC number", "Mobile Number", "Occupation", 
-        "Education Level", "Political Affiliation", "Key Issues", "Remarks"
-    ];
-    let csv = headers.join(',') + '\r\n';
-    for (const row of items) {
-        const values = headers.map(header => {
-            let val = row[header] === null || row[header] === undefined ? '' : row[header];
-            let strVal = String(val);
-            if (strVal.includes('"') || strVal.includes(',')) {
-                strVal = `"${strVal.replace(/"/g, '""')}"`;
-            }
-            return strVal;
-        });
-        csv += values.join(',') + '\r\n';
-    }
-    return csv;
-}
-
-function downloadCsv(csv, filename) {
-    const blob = new Blob([csv], { type: 'text/csv;charset=utf-8;' });
+    // The server streams the file; let the browser download it directly
     const link = document.createElement('a');
-    if (link.download !== undefined) { 
-        const url = URL.createObjectURL(blob);
-        link.setAttribute('href', url);
-        link.setAttribute('download', filename);
-        link.style.visibility = 'hidden';
-        document.body.appendChild(link);
-        link.click();
-        document.body.removeChild(link);
-    }
+    link.setAttribute('href', `/api/voters/export?${queryParams.toString()}`);
+    link.setAttribute('download', 'voter_export.csv');
+    link.style.visibility = 'hidden';
+    document.body.appendChild(link);
+    link.click();
+    document.body.removeChild(link);
 }
 
 // ✅ Chatbot Messaging Logic — FINAL
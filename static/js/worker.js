@@ -4,6 +4,21 @@
 
 let currentPage = 1;
 let entriesPerPage = 50;
+let pageCursors = [''];  // pageCursors[n] is the keyset cursor for page n + 1
+
+// Columns the voter table and its details row show (the ID always comes back)
+const VOTER_FIELDS = [
+  'name', 'father_or_husband_name', 'age', 'gender', 'house_number', 'epic_number',
+  'mobile_number', 'occupation', 'education_level', 'political_affiliation', 'key_issues', 'remarks'
+].join(',');
+
+/* Rows of a format=columns response as objects keyed by field name */
+function columnsToRows(data) {
+  const names = (data.schema || []).map(f => f.name);
+  const columns = data.columns || [];
+  if (!columns.length) return [];
+  return columns[0].map((_, i) => Object.fromEntries(names.map((name, j) => [name, columns[j][i]])));
+}
 
 /* -------- Navigation Between Sections -------- */
 function showSection(sectionId) {
@@ -43,9 +58,17 @@ async function fetchVoters() {
 
   tbody.innerHTML = `<tr><td colspan="${headerCount}">Loading...</td></tr>`;
 
+  if (search) {
+    await searchVoters(search, gender, headerCount);
+    return;
+  }
+
+  if (currentPage === 1) pageCursors = [''];
   const params = new URLSearchParams({
-    page: String(currentPage),
-    per_page: String(entriesPerPage)
+    cursor: pageCursors[currentPage - 1] || '',
+    per_page: String(entriesPerPage),
+    fields: VOTER_FIELDS,
+    format: 'columns'
   });
   if (gender) params.append('gender', gender);
   if (search) params.append('search', search);
@@ -55,20 +78,63 @@ async function fetchVoters() {
     if (!res.ok) throw new Error(`HTTP ${res.status}`);
     const data = await res.json();
 
-    const items = Array.isArray(data.items) ? data.items : [];
-    renderVoterRows(items, headerCount);
+    renderVoterRows(columnsToRows(data), headerCount);
 
-    const page = data.page || 1;
+    if (data.next_cursor) pageCursors[currentPage] = data.next_cursor;
     const pages = data.pages || 1;
-    document.getElementById('pageInfo').textContent = `Page ${page} of ${pages || 1}`;
-    document.getElementById('prevPage').disabled = page <= 1;
-    document.getElementById('nextPage').disabled = page >= pages;
+    document.getElementById('pageInfo').textContent = `Page ${currentPage} of ${pages || 1}`;
+    document.getElementById('prevPage').disabled = currentPage <= 1;
+    document.getElementById('nextPage').disabled = !data.next_cursor;
   } catch (err) {
     console.error('Error fetching voters:', err);
     tbody.innerHTML = `<tr><td colspan="${headerCount}">Error loading data</td></tr>`;
   }
 }
 
+/* Ranked fuzzy search: best matches first, no paging */
+async function searchVoters(search, gender, headerCount) {
+  const tbody = document.getElementById('workerVotersTableBody');
+  const params = new URLSearchParams({ q: search, limit: String(entriesPerPage) });
+  if (gender) params.append('gender', gender);
+
+  try {
+    const res = await fetch(`/api/voters/search?${params.toString()}`);
+    if (!res.ok) throw new Error(`HTTP ${res.status}`);
+    const data = await res.json();
+
+    const items = Array.isArray(data.items) ? data.items : [];
+    renderVoterRows(items, headerCount);
+
+    document.getElementById('pageInfo').textContent = `${items.length} best matches`;
+    document.getElementById('prevPage').disabled = true;
+    document.getElementById('nextPage').disabled = true;
+  } catch (err) {
+    console.error('Error searching voters:', err);
+    tbody.innerHTML = `<tr><td colspan="${headerCount}">Error loading data</td></tr>`;
+  }
+}
+
+/* Type-ahead suggestions for the search box */
+let suggestTimer = null;
+async function suggestVoters(term) {
+  const list = document.getElementById('searchSuggestions');
+  if (!list) return;
+  if (term.length < 2) {
+    list.innerHTML = '';
+    return;
+  }
+  try {
+    const res = await fetch(`/api/voters/search?${new URLSearchParams({ q: term, mode: 'prefix', limit: '8' })}`);
+    if (!res.ok) return;
+    const data = await res.json();
+    list.innerHTML = (data.items || [])
+      .map(v => `<option value="${safe(/\d/.test(term) ? v['EPIC number'] : v.Name)}">${safe(v['House number'] || '')}</option>`)
+      .join('');
+  } catch (err) {
+    console.error('Error fetching suggestions:', err);
+  }
+}
+
 function formatAffiliation(affiliation) {
   if (!affiliation) return '';
   const value = String(affiliation).toLowerCase();
@@ -167,7 +233,17 @@ const formHtml = `
     </div>
     <div>
       <label>Education Level</label>
-      <input type="text" data-field="education_level" placeholder="Enter education level">
+      <select data-field="education_level">
+        <option value="">Select...</option>
+        <option value="Illiterate">Illiterate</option>
+        <option value="Primary">Primary</option>
+        <option value="SSC">SSC (10th)</option>
+        <option value="HSC">HSC (12th)</option>
+        <option value="Diploma">Diploma / ITI</option>
+        <option value="Graduate">Graduate</option>
+        <option value="Post Graduate">Post Graduate</option>
+        <option value="Other">Other</option>
+      </select>
       <small class="field-error" data-error-for="education_level" style="color:red"></small>
     </div>
     <div>
@@ -215,9 +291,6 @@ const formHtml = `
   if (key === 'occupation' && val.length < 2) {
     setError(key, 'At least 2 characters'); return false;
   }
-  if (key === 'education_level' && val.length < 2) {
-    setError(key, 'At least 2 characters'); return false;
-  }
   if (key === 'key_issues' && val.length > 300) {
     setError(key, 'Max 300 characters'); return false;
   }
@@ -324,7 +397,7 @@ if (genderEl) {
 ========================================================== */
 let householdCurrentPage = 1;
 let householdEntriesPerPage = 25;
-let allHouseholds = [];
+let householdTotalPages = 1;
 let activeVoterId = null;
 let mapInstance = null;
 let marker = null;
@@ -366,18 +439,12 @@ function saveLocationDetails() {
 
   const landmark = document.getElementById("locationLandmark").value;
   const { lat, lng } = marker.getLatLng();
-  const voterName = document.getElementById("voterNameTitle").innerText;
-
-  // ✅ get house number from UI table
-  const row = document.querySelector(`span.voter-chip[data-name="${voterName}"]`)
-  const house = row.closest("tr").children[0].innerText.trim();
 
   fetch(`/api/voter-location`, {
     method: "POST",
     headers: { "Content-Type": "application/json" },
     body: JSON.stringify({
-      name: voterName,
-      house_number: house,
+      voter_id: Number(activeVoterId),
       landmark: landmark,
       latitude: lat,
       longitude: lng,
@@ -397,35 +464,38 @@ function closeLocationModal() {
 }
 
 async function fetchHouseholds() {
+  const tbody = document.getElementById('householdTableBody');
+  if (!tbody) return;
+
+  const search = (document.getElementById('householdSearchInput')?.value || '').trim();
+  householdEntriesPerPage = Number(document.getElementById('householdEntriesPerPage')?.value || 25);
+
+  const params = new URLSearchParams({
+    page: String(householdCurrentPage),
+    per_page: String(householdEntriesPerPage)
+  });
+  if (search) params.append('search', search);
+
   try {
-    const res = await fetch('/api/household-data');
+    const res = await fetch(`/api/household-data?${params.toString()}`);
     if (!res.ok) throw new Error(`HTTP ${res.status}`);
-    allHouseholds = await res.json();
-    renderHouseholds();
+    const data = await res.json();
+    householdTotalPages = Math.max(1, data.pages || 1);
+    if (householdCurrentPage > householdTotalPages) {
+      householdCurrentPage = householdTotalPages;
+      return fetchHouseholds();
+    }
+    renderHouseholds(Array.isArray(data.items) ? data.items : []);
   } catch (err) {
     console.error(err);
+    tbody.innerHTML = `<tr><td colspan="2">Error loading data</td></tr>`;
   }
 }
 
-function renderHouseholds() {
+function renderHouseholds(items) {
   const tbody = document.getElementById('householdTableBody');
   if (!tbody) return;
 
-  const searchTerm = document.getElementById('householdSearchInput')?.value.toLowerCase() || '';
-  householdEntriesPerPage = Number(document.getElementById('householdEntriesPerPage')?.value || 25);
-
-  const filtered = allHouseholds.filter(h =>
-    (h.house_number || '').toLowerCase().includes(searchTerm)
-  );
-
-  const totalPages = Math.max(1, Math.ceil(filtered.length / householdEntriesPerPage));
-  if (householdCurrentPage > totalPages) householdCurrentPage = totalPages;
-
-  const items = filtered.slice(
-    (householdCurrentPage - 1) * householdEntriesPerPage,
-    householdCurrentPage * householdEntriesPerPage
-  );
-
   tbody.innerHTML = items.length ?
     items.map(h => `
       <tr>
@@ -459,7 +529,11 @@ function renderHouseholds() {
   });
 
   const pageInfo = document.getElementById("householdPageInfo");
-  if (pageInfo) pageInfo.textContent = `Page ${householdCurrentPage} of ${totalPages}`;
+  if (pageInfo) pageInfo.textContent = `Page ${householdCurrentPage} of ${householdTotalPages}`;
+  const prevBtn = document.getElementById('householdPrevPage');
+  if (prevBtn) prevBtn.disabled = householdCurrentPage <= 1;
+  const nextBtn = document.getElementById('householdNextPage');
+  if (nextBtn) nextBtn.disabled = householdCurrentPage >= householdTotalPages;
 }
 
 
@@ -467,24 +541,24 @@ function renderHouseholds() {
   const householdPrevBtn = document.getElementById('householdPrevPage');
   const householdNextBtn = document.getElementById('householdNextPage');
   const householdSearchInput = document.getElementById('householdSearchInput');
+  const householdSearchBtn = document.getElementById('householdSearchBtn');
   const householdEntriesEl = document.getElementById('householdEntriesPerPage');
+  let householdSearchTimer = null;
 
 if (householdPrevBtn) {
-  householdPrevBtn.disabled = householdCurrentPage <= 1;
   householdPrevBtn.onclick = () => {
     if (householdCurrentPage > 1) {
       householdCurrentPage--;
-      renderHouseholds();
+      fetchHouseholds();
     }
   };
 }
 
 if (householdNextBtn) {
-  householdNextBtn.disabled = householdCurrentPage >= totalPages;
   householdNextBtn.onclick = () => {
-    if (householdCurrentPage < totalPages) {
+    if (householdCurrentPage < householdTotalPages) {
       householdCurrentPage++;
-      renderHouseholds();
+      fetchHouseholds();
     }
   };
 }
@@ -492,14 +566,22 @@ if (householdNextBtn) {
   if (householdSearchInput) {
     householdSearchInput.oninput = () => {
       householdCurrentPage = 1;
-      renderHouseholds();
+      clearTimeout(householdSearchTimer);
+      householdSearchTimer = setTimeout(fetchHouseholds, 250);
+    };
+  }
+
+  if (householdSearchBtn) {
+    householdSearchBtn.onclick = () => {
+      householdCurrentPage = 1;
+      fetchHouseholds();
     };
   }
 
   if (householdEntriesEl) {
     householdEntriesEl.onchange = () => {
       householdCurrentPage = 1;
-      renderHouseholds();
+      fetchHouseholds();
     };
   }
 
@@ -679,6 +761,11 @@ if (reportForm) {
 /* -------- Allow Enter key to trigger search -------- */
 const searchInputEl = document.getElementById('searchInput');
 if (searchInputEl) {
+  searchInputEl.addEventListener('input', function (e) {
+    clearTimeout(suggestTimer);
+    const term = (e.target.value || '').trim();
+    suggestTimer = setTimeout(() => suggestVoters(term), 150);
+  });
   searchInputEl.addEventListener('keypress', function (e) {
     if (e.key === 'Enter') {
       e.preventDefault();
@@ -0,0 +1,82 @@
+# table_versions.py
+"""
+Per-table write counters.
+
+Every ORM transaction that touches a table bumps its row in table_versions
+as it commits, so any process can tell whether cached results derived from
+that table are still current with a single primary-key lookup. Writes that
+bypass the ORM must call bump() themselves.
+
+The bump is an UPDATE of one row per table, so it holds that row's lock
+until the transaction ends, and a concurrent transaction bumping the same
+table waits for it. Flushes only record which tables they touched; the bump
+runs in before_commit, so the lock is held for the commit alone, not for
+the rest of the transaction. Raw-SQL writers should likewise call bump() as
+their last statement before committing.
+
+bump() also sends a NOTIFY on the table_versions channel, which Postgres
+delivers when the transaction commits; live_events.py LISTENs for it.
+"""
+from sqlalchemy import event, select, text
+from sqlalchemy.dialects.postgresql import insert
+
+from models import db, TableVersion
+
+
+def bump(connection, *tables):
+    if not tables:
+        return
+    table = TableVersion.__table__
+    stmt = insert(table).values([{"table_name": name, "version": 1} for name in sorted(set(tables))])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["table_name"],
+        set_={"version": table.c.version + 1},
+    )
+    connection.execute(stmt)
+    # Identical notifications in one transaction are delivered once
+    connection.execute(text("SELECT pg_notify('table_versions', '')"))
+
+def current(table):
+    """Current write counter of a table (0 if it was never written through the app)."""
+    version = db.session.execute(
+        select(TableVersion.version).where(TableVersion.table_name == table)
+    ).scalar()
+    return version or 0
+
+def versions(*tables):
+    """Current write counters of several tables, in the order given, in one query."""
+    found = dict(db.session.execute(
+        select(TableVersion.table_name, TableVersion.version).where(TableVersion.table_name.in_(tables))
+    ).all())
+    return tuple(found.get(table, 0) for table in tables)
+
+def touch(session, *tables):
+    """Bump these tables when the session commits, for writes a flush makes
+    outside the ORM (e.g. from an after_flush listener)."""
+    session.info.setdefault("touched_tables", set()).update(tables)
+
+def _touched_tables(session):
+    objects = list(session.new) + list(session.deleted)
+    objects += [obj for obj in session.dirty if session.is_modified(obj)]
+    return {obj.__table__.name for obj in objects if not isinstance(obj, TableVersion)}
+
+@event.listens_for(db.session, "before_flush")
+def _collect_touched_tables(session, flush_context, instances):
+    tables = _touched_tables(session)
+    if tables:
+        session.info.setdefault("touched_tables", set()).update(tables)
+
+@event.listens_for(db.session, "before_commit")
+def _bump_touched_tables(session):
+    # Flush first so this commit's pending changes are counted and nothing
+    # is written after the bump
+    session.flush()
+    tables = session.info.pop("touched_tables", None)
+    if tables:
+        bump(session.connection(), *tables)
+
+@event.listens_for(db.session, "after_transaction_end")
+def _forget_touched_tables(session, transaction):
+    # Rolled back (or closed without committing): nothing to bump
+    if transaction.parent is None:
+        session.info.pop("touched_tables", None)
@@ -0,0 +1,64 @@
+# tests/conftest.py
+"""
+Fixtures for the database tests.
+
+They need PostgreSQL: set TEST_DATABASE_URL to a scratch database (its
+tables are dropped and recreated) or every test using `db_app` is skipped.
+"""
+import os
+import random
+
+import pytest
+
+OCCUPATIONS = ["Farmer", "Teacher", "Shop owner", "Driver", "Student", "", None]
+ISSUES = ["water", "roads", "jobs", "health care", "electricity", "sanitation"]
+# Raw spellings, as workers and imports enter them
+GENDERS = ["Male", "female", "F", "m", "Other", "", None]
+AFFILIATIONS = ["Supporter", "opponent", "SwingVoter", "neutral", "Undecided", "", None]
+EDUCATION = ["Graduate", "12th", "SSC", "illiterate", "B.A.", "Post Graduate", "", None]
+
+
+def voters(booth_ids, count=400, seed=7):
+    """Deterministic voter rows covering every filter, empty values and repeated issues."""
+    rng = random.Random(seed)
+    rows = []
+    for i in range(count):
+        issues = rng.sample(ISSUES, rng.randint(0, 3))
+        if issues and rng.random() < 0.1:
+            issues.append(issues[0].upper())  # repeated within one voter
+        rows.append({
+            "name": f"Voter {i}",
+            "epic_number": f"TST{i:07d}",
+            "age": rng.choice([None, 17, 18, 25, 26, 40, 41, 59, 60, 61, 85]),
+            "gender": rng.choice(GENDERS),
+            "political_affiliation": rng.choice(AFFILIATIONS),
+            "education_level": rng.choice(EDUCATION),
+            "occupation": rng.choice(OCCUPATIONS),
+            "key_issues": ", ".join(issues) or None,
+            "mobile_number": rng.choice([None, "", "9800000000"]),
+            "booth_id": rng.choice(booth_ids + [None]),
+        })
+    return rows
+
+
+@pytest.fixture(scope="session")
+def db_app():
+    url = os.getenv("TEST_DATABASE_URL")
+    if not url:
+        pytest.skip("TEST_DATABASE_URL is not set")
+    os.environ["DATABASE_URL"] = url
+    from app import app
+    from models import db, Booth, Voter
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()  # seeds the category lookup tables
+        booths = [Booth(name=f"Booth {n}", booth_number=str(n)) for n in (1, 2, 3)]
+        db.session.add_all(booths)
+        db.session.flush()
+        # ORM inserts, so the aggregates and issue links are maintained as in the app
+        db.session.add_all(Voter(**row) for row in voters([b.id for b in booths]))
+        db.session.commit()
+        yield app
+        db.session.remove()
+        db.drop_all()
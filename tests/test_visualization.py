@@ -0,0 +1,25 @@
+# tests/test_visualization.py
+"""The visualization paths against the original Python loop (visualization_parity)."""
+from models import Voter
+import aggregates
+import visualization_parity
+from voter_filters import filter_voters
+
+
+def test_live_visualization_matches_reference(db_app):
+    with db_app.app_context():
+        expected = visualization_parity.reference(Voter.query.all())
+        result = aggregates.live_visualization(Voter.query)
+        assert visualization_parity.differences(result, expected) == []
+
+def test_aggregates_match_reference(db_app):
+    with db_app.app_context():
+        expected = visualization_parity.reference(filter_voters(Voter.query, gender="female").all())
+        result = aggregates.visualization(gender="female")
+        assert visualization_parity.differences(result, expected) == []
+
+def test_every_path_matches_over_the_filter_product(db_app):
+    with db_app.app_context():
+        checked, failures = visualization_parity.check()
+        assert checked
+        assert failures == [], failures[:5]
@@ -0,0 +1,147 @@
+# visualization_parity.py
+"""
+Parity check for /api/candidate/visualization.
+
+The payload used to be computed by loading every matching Voter and
+counting in Python. reference() keeps that loop (with one deliberate
+change, noted in it); check() runs it
+next to the SQL paths (live_visualization over the filtered query, the
+aggregate buckets when they cover the filters, and the columnar snapshot
+when NumPy is installed) for every combination of filter values and reports
+each difference.
+
+Filter values come from the data itself (the busiest booths, occupation and
+issue) so the combinations select real voters on any database.
+"""
+from collections import Counter
+from itertools import product
+
+from sqlalchemy import func
+
+from models import db, Voter, Issue, VoterIssue
+import aggregates
+import voter_snapshot
+from voter_filters import filter_voters
+
+TOP_ISSUES = 10
+
+
+def reference(voters):
+    """The original Python loop over Voter objects (all issues, not just the top ten)."""
+    affiliations = Counter()
+    age_groups = {"18-25": 0, "26-40": 0, "41-60": 0, "60+": 0}
+    issue_counts = Counter()
+    gender_split = Counter()
+
+    for v in voters:
+        # Normalize affiliation: group 'Neutral' and 'SwingVoter' into 'SwingVoter'
+        raw = (v.political_affiliation or "").strip()
+        if raw == "":
+            affiliations["Empty"] += 1
+        else:
+            normalized = raw.capitalize()
+            if normalized.lower() in ("neutral", "swingvoter"):
+                affiliations["SwingVoter"] += 1
+            else:
+                affiliations[normalized] += 1
+
+        # Age groups
+        if v.age:
+            if v.age <= 25:
+                age_groups["18-25"] += 1
+            elif v.age <= 40:
+                age_groups["26-40"] += 1
+            elif v.age <= 60:
+                age_groups["41-60"] += 1
+            else:
+                age_groups["60+"] += 1
+
+        # Issues (once per voter: since the voter_issues table, an issue
+        # repeated in one voter's Key Issues counts once, which is the only
+        # intended difference from the original loop)
+        if v.key_issues:
+            for issue in dict.fromkeys(i.strip().lower() for i in v.key_issues.split(",") if i.strip()):
+                issue_counts[issue] += 1
+
+        # Gender split
+        gender_split[(v.gender or "Other").capitalize()] += 1
+
+    return {
+        "affiliations": dict(affiliations),
+        "ageGroups": age_groups,
+        "issueCounts": issue_counts,
+        "genderSplit": dict(gender_split),
+    }
+
+
+def differences(result, expected):
+    """Descriptions of where a payload differs from reference(); empty if it matches.
+
+    Top issues tied at the cut-off may be chosen differently, so the top ten
+    must carry the reference counts and leave out no issue counted higher
+    than the lowest one kept.
+    """
+    found = [
+        f"{key}: {result.get(key)} != {expected[key]}"
+        for key in ("affiliations", "ageGroups", "genderSplit")
+        if result.get(key) != expected[key]
+    ]
+    counts = expected["issueCounts"]
+    top = result.get("topIssues", {})
+    wrong = {issue: n for issue, n in top.items() if counts.get(issue) != n}
+    if wrong:
+        found.append(f"topIssues counts: {wrong} (reference {[(i, counts.get(i)) for i in wrong]})")
+    if len(top) != min(TOP_ISSUES, len(counts)):
+        found.append(f"topIssues: {len(top)} issues, expected {min(TOP_ISSUES, len(counts))}")
+    elif top:
+        lowest = min(top.values())
+        missed = [issue for issue, n in counts.items() if n > lowest and issue not in top]
+        if missed:
+            found.append(f"topIssues: left out {missed}")
+    return found
+
+
+def filter_values():
+    """Values tried for each filter, None (no filter) included."""
+    booths = [str(b) for (b,) in db.session.query(Voter.booth_id).filter(Voter.booth_id.isnot(None))
+              .group_by(Voter.booth_id).order_by(func.count().desc()).limit(2)]
+    occupation = db.session.query(Voter.occupation).filter(Voter.occupation.isnot(None), Voter.occupation != "") \
+        .group_by(Voter.occupation).order_by(func.count().desc()).limit(1).scalar()
+    issue = db.session.query(Issue.name).join(VoterIssue, VoterIssue.issue_id == Issue.id) \
+        .group_by(Issue.name).order_by(func.count().desc()).limit(1).scalar()
+    return {
+        "gender": [None, "male", "Female ", "other", "all"],
+        "affiliation": [None, "empty", "swingvoter", "Supporter", "opponent", "neutral"],
+        "age": [None, "18-25", "26-40", "41-60", "60+"],
+        "issues": [None] + ([issue] if issue else []),
+        "occupation": [None] + ([occupation[:4].lower()] if occupation else []),
+        "ward": [None] + booths + ["0"],
+        "education": [None, "grad", "sc", "illiterate"],
+    }
+
+
+def check():
+    """(combinations checked, [(path, filters, differences)]) over the whole filter product."""
+    values = filter_values()
+    snapshot = voter_snapshot.load() if voter_snapshot.available() else None
+    names = list(values)
+    checked, failures = 0, []
+    for combination in product(*values.values()):
+        filters = dict(zip(names, combination))
+        expected = reference(filter_voters(Voter.query, **filters).all())
+
+        results = {"sql": aggregates.live_visualization(filter_voters(Voter.query, **filters))}
+        if aggregates.covers(issues=filters["issues"], occupation=filters["occupation"], ward=filters["ward"]):
+            results["aggregates"] = aggregates.visualization(
+                gender=filters["gender"], affiliation=filters["affiliation"], age=filters["age"],
+                ward=filters["ward"], education=filters["education"],
+            )
+        if snapshot is not None:
+            results["snapshot"] = snapshot.visualization(**filters)
+
+        for path, result in results.items():
+            checked += 1
+            found = differences(result, expected)
+            if found:
+                failures.append((path, filters, found))
+    return checked, failures
@@ -0,0 +1,339 @@
+# voter_bitmaps.py
+"""
+In-memory bitmap index over voter IDs for segment set algebra.
+
+Every common filter value (gender, affiliation, age band, booth, issue) and
+every saved segment is held as a bitmap of the voter IDs it contains, so
+unions, intersections, differences and counts are a few big-integer
+operations instead of SQL queries. A bitmap is a Python int with bit i set
+for voter ID offset + i; trimming it to the range of IDs it actually holds
+keeps per-booth and per-issue bitmaps small.
+
+The index is built from the database on first use. After voter_list
+changed (its table version moved on) it is brought up to date the way the
+columnar snapshot is: with the change log on (VOTER_CHANGE_LOG=1 or
+VOTER_SNAPSHOT=1) the voters logged since the last refresh, plus any IDs
+above the highest one indexed, are re-read and patched into every bitmap;
+without it a full rebuild runs on a background thread. Either way only one
+thread refreshes at a time and the others keep answering from the previous
+index. Segment bitmaps are evaluated through SQL on first use and patched
+with the same changed voters.
+
+Expressions are nested JSON:
+
+    {"and": [{"segment": 1}, {"gender": "female"}, {"age": "18-25"},
+             {"not": {"segment": 2}}]}
+
+Leaves: gender, affiliation (incl. "empty" and "swingvoter"), age (18-25,
+26-40, 41-60, 60+), booth, issue, segment, and {"all": true}. Operators:
+and, or (lists), not, minus ([base, subtracted...]).
+"""
+from itertools import islice
+import threading
+
+from flask import current_app
+from sqlalchemy import func, select
+
+from models import db, Voter, Issue, VoterIssue, Segment
+from voter_filters import filter_key
+from voter_issues import split_issues
+import aggregates
+import categories
+import table_versions
+import voter_changes
+import voter_segments
+from voter_filters import filter_voters
+
+LEAVES = ("gender", "affiliation", "age", "booth", "issue", "segment", "all")
+# As in voter_snapshot: log entries and IDs re-read behind the last applied ones
+OVERLAP = voter_changes.KEEP_LATEST
+# Rebuild from scratch when more than this share of voters changed
+RELOAD_SHARE = 0.2
+
+
+class Bitmap:
+    """Immutable set of voter IDs stored as an int bitset starting at offset."""
+
+    __slots__ = ("offset", "bits")
+
+    def __init__(self, bits=0, offset=0):
+        if bits:
+            shift = (bits & -bits).bit_length() - 1
+            bits >>= shift
+            offset += shift
+        else:
+            offset = 0
+        self.bits = bits
+        self.offset = offset
+
+    @classmethod
+    def from_ids(cls, ids):
+        if not ids:
+            return cls()
+        low = min(ids)
+        buffer = bytearray(((max(ids) - low) >> 3) + 1)
+        for i in ids:
+            i -= low
+            buffer[i >> 3] |= 1 << (i & 7)
+        return cls(int.from_bytes(buffer, "little"), low)
+
+    def _aligned(self, other):
+        base = min(self.offset, other.offset)
+        return self.bits << (self.offset - base), other.bits << (other.offset - base), base
+
+    def __and__(self, other):
+        if not self.bits or not other.bits:
+            return Bitmap()
+        a, b, base = self._aligned(other)
+        return Bitmap(a & b, base)
+
+    def __or__(self, other):
+        if not self.bits:
+            return other
+        if not other.bits:
+            return self
+        a, b, base = self._aligned(other)
+        return Bitmap(a | b, base)
+
+    def __sub__(self, other):
+        if not self.bits or not other.bits:
+            return self
+        a, b, base = self._aligned(other)
+        return Bitmap(a & ~b, base)
+
+    def __len__(self):
+        return self.bits.bit_count()
+
+    def __iter__(self):
+        """Voter IDs in ascending order."""
+        data = self.bits.to_bytes((self.bits.bit_length() + 7) // 8, "little")
+        for i, byte in enumerate(data):
+            while byte:
+                low = byte & -byte
+                yield self.offset + (i << 3) + low.bit_length() - 1
+                byte ^= low
+
+    def page(self, after=None, limit=50):
+        """Up to limit IDs greater than after."""
+        bitmap = self
+        if after is not None and after >= self.offset:
+            bitmap = Bitmap(self.bits >> (after - self.offset + 1), after + 1)
+        return list(islice(bitmap, limit))
+
+
+class BitmapIndex:
+    def __init__(self, version, bitmaps, universe, seq=0, high=0, segments=None):
+        self.version = version
+        self.bitmaps = bitmaps
+        self.universe = universe
+        self.seq = seq  # last voter_changes entry applied
+        self.high = high  # highest voter ID indexed
+        self.segments = segments or {}  # key -> (filters, bitmap)
+        self.lock = threading.Lock()
+
+    def value(self, kind, value):
+        return self.bitmaps.get((kind, value), Bitmap())
+
+    def segment(self, segment):
+        """Bitmap of a saved segment, evaluated through SQL on first use."""
+        filters = voter_segments.compile_filters(segment.filters)
+        key = (segment.id, filter_key(filters))
+        with self.lock:
+            entry = self.segments.get(key)
+        if entry is None:
+            ids = db.session.execute(
+                filter_voters(Voter.query, **filters).with_entities(Voter.id).statement
+            ).scalars().all()
+            entry = (filters, Bitmap.from_ids(ids))
+            with self.lock:
+                self.segments[key] = entry
+        return entry[1]
+
+    def patched(self, ids, version, seq):
+        """New index with the given voters re-read; the others are kept."""
+        removed = Bitmap.from_ids(ids)
+        present, members = _members(Voter.id.in_(ids))
+        keys = set(self.bitmaps) | set(members)
+        bitmaps = {}
+        for key in keys:
+            bitmap = (self.bitmaps.get(key, Bitmap()) - removed) | Bitmap.from_ids(members.get(key, []))
+            if bitmap.bits:
+                bitmaps[key] = bitmap
+        universe = (self.universe - removed) | Bitmap.from_ids(present)
+
+        with self.lock:
+            cached = dict(self.segments)
+        segments = {}
+        for key, (filters, bitmap) in cached.items():
+            matched = db.session.execute(
+                filter_voters(Voter.query, **filters).filter(Voter.id.in_(ids)).with_entities(Voter.id).statement
+            ).scalars().all()
+            segments[key] = (filters, (bitmap - removed) | Bitmap.from_ids(matched))
+        return BitmapIndex(version, bitmaps, universe, seq, max([self.high] + present), segments)
+
+
+_index = None
+_build_lock = threading.Lock()
+
+
+def _members(where=None):
+    """(voter IDs, {(kind, value): [voter IDs]}) for the voters matching where (all by default)."""
+    members = {}
+    universe = []
+    stmt = select(Voter.id, aggregates.GENDER_KEY, aggregates.AFFILIATION_KEY, aggregates.AGE_BAND,
+                  func.coalesce(Voter.booth_id, 0))
+    if where is not None:
+        stmt = stmt.where(where)
+    rows = db.session.execute(stmt.execution_options(yield_per=50000))
+    for voter_id, gender, affiliation, band, booth_id in rows:
+        universe.append(voter_id)
+        members.setdefault(("gender", gender), []).append(voter_id)
+        members.setdefault(("affiliation", affiliation if affiliation.strip() else "empty"), []).append(voter_id)
+        members.setdefault(("band", band), []).append(voter_id)
+        members.setdefault(("booth", booth_id), []).append(voter_id)
+
+    stmt = select(VoterIssue.voter_id, Issue.name).join(Issue, Issue.id == VoterIssue.issue_id)
+    if where is not None:
+        stmt = stmt.where(VoterIssue.voter_id.in_(select(Voter.id).where(where)))
+    for voter_id, name in db.session.execute(stmt.execution_options(yield_per=50000)):
+        members.setdefault(("issue", name), []).append(voter_id)
+    return universe, members
+
+def build(version=None):
+    """A complete index of voter_list."""
+    if version is None:
+        version = table_versions.current(Voter.__tablename__)
+    seq = voter_changes.latest()
+    universe, members = _members()
+    bitmaps = {key: Bitmap.from_ids(ids) for key, ids in members.items()}
+    return BitmapIndex(version, bitmaps, Bitmap.from_ids(universe), seq, max(universe, default=0))
+
+def refresh(index):
+    """Index brought up to date with the voters changed since it was built (needs the change log)."""
+    version = table_versions.current(Voter.__tablename__)
+    if version == index.version:
+        return index
+
+    seq, changed, oldest = voter_changes.since(max(index.seq - OVERLAP, 0))
+    if oldest is not None and oldest > index.seq + 1:
+        return build(version)  # the log was pruned past our position
+    added = db.session.execute(
+        select(Voter.id).where(Voter.id > index.high - OVERLAP)
+    ).scalars().all()
+    changed = set(changed) | set(added)
+    if len(changed) > RELOAD_SHARE * max(len(index.universe), 1):
+        return build(version)
+    return index.patched(sorted(changed), version, seq)
+
+def _rebuild_in_background(app):
+    global _index
+    try:
+        with app.app_context():
+            _index = build()
+    except Exception as e:
+        print("Bitmap index rebuild error:", e)
+    finally:
+        _build_lock.release()
+
+def current_index():
+    """The bitmap index, brought up to date with voter_list when it changed.
+
+    An up-to-date index is returned without locking. While one thread
+    refreshes it the others keep using the previous one.
+    """
+    global _index
+    index = _index
+    if index is not None:
+        if table_versions.current(Voter.__tablename__) == index.version:
+            return index
+        if not _build_lock.acquire(blocking=False):
+            return index
+        if not voter_changes.enabled():
+            # Nothing to patch from: rebuild without holding up the request
+            threading.Thread(
+                target=_rebuild_in_background, args=(current_app._get_current_object(),),
+                name="voter-bitmaps", daemon=True,
+            ).start()
+            return index
+    else:
+        _build_lock.acquire()
+    try:
+        index = _index
+        index = build() if index is None else refresh(index)
+        _index = index  # a single assignment: readers see the old or the new one
+        return index
+    finally:
+        _build_lock.release()
+
+
+# -------------------------
+# Expressions
+# -------------------------
+def _leaf(index, kind, value):
+    if kind == "all":
+        return index.universe
+    if kind == "segment":
+        try:
+            segment = db.session.get(Segment, int(value))
+        except (TypeError, ValueError):
+            segment = None
+        if segment is None:
+            raise ValueError(f"Unknown segment: {value}")
+        return index.segment(segment)
+    if kind == "booth":
+        try:
+            return index.value("booth", int(value))
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid booth: {value}")
+
+    value = str(value).lower()
+    if kind == "gender":
+        return index.value("gender", (categories.canonical("gender", value) or "").lower())
+    if kind == "affiliation":
+        if value == "empty":
+            return index.value("affiliation", "empty")
+        return index.value("affiliation", (categories.canonical("affiliation", value) or "empty").lower())
+    if kind == "age":
+        if value not in aggregates.FILTER_BANDS:
+            raise ValueError(f"Invalid age band: {value}")
+        result = Bitmap()
+        for band in aggregates.FILTER_BANDS[value]:
+            result = result | index.value("band", band)
+        return result
+    if kind == "issue":
+        result = Bitmap()
+        for name in split_issues(value):
+            result = result | index.value("issue", name)
+        return result
+
+def evaluate(expr, index=None):
+    """Bitmap of the voters matching a set expression. Raises ValueError if malformed."""
+    index = index or current_index()
+    if not isinstance(expr, dict) or len(expr) != 1:
+        raise ValueError("Each expression must be an object with exactly one key")
+    (op, arg), = expr.items()
+
+    if op in ("and", "or", "minus"):
+        if not isinstance(arg, list) or not arg:
+            raise ValueError(f"'{op}' needs a non-empty list")
+        parts = [evaluate(e, index) for e in arg]
+        result = parts[0]
+        for part in parts[1:]:
+            if op == "and":
+                result = result & part
+            elif op == "or":
+                result = result | part
+            else:
+                result = result - part
+        return result
+    if op == "not":
+        return index.universe - evaluate(arg, index)
+    if op in LEAVES:
+        return _leaf(index, op, arg)
+    raise ValueError(f"Unknown operator: {op}")
+
+def overlap_matrix(segments):
+    """Pairwise member counts (diagonal: segment size) for the given segments."""
+    index = current_index()
+    bitmaps = [index.segment(s) for s in segments]
+    return [[len(a & b) for b in bitmaps] for a in bitmaps]
@@ -0,0 +1,161 @@
+# voter_bulk.py
+"""
+Bulk voter updates for canvassing batches.
+
+A batch is a list of patches, each naming a voter ID, the version the client
+last read and the worker-entered fields to change:
+
+    {"id": 42, "version": 3, "mobile_number": "9876543210", "political_affiliation": "Supporter"}
+
+Patches are validated one by one, then applied together: the targeted rows
+are locked, the ones whose version still matches are updated in one
+set-based UPDATE (bumping their version), and the rest are reported as
+conflicts. Aggregates, voter_issues, the voter change log and the voter_list
+table version are maintained once for the whole batch, in the same
+transaction. The caller commits.
+
+Each patch gets a result: updated (with the new version), conflict (with the
+current version), not_found or invalid (with an error).
+"""
+import json
+
+from sqlalchemy import text
+
+from models import Voter, SYNC_TOUCH_SQL, CATEGORY_FIELDS, WORKER_FIELDS
+import aggregates
+import categories
+import table_versions
+import voter_changes
+import voter_issues
+
+MAX_PATCHES = 1000
+
+BATCH_IDS = "SELECT voter_id FROM voter_bulk_ids"
+
+
+def _column(field):
+    return Voter.__mapper__.columns[field]
+
+def _quoted(field):
+    return '"' + _column(field).name + '"'
+
+
+def validate_patch(patch):
+    """Return (values, None) for a valid patch or (None, error message).
+
+    values maps "id", "version" and the patched fields (by attribute name) to
+    their stored form; categorical fields become their codes.
+    """
+    if not isinstance(patch, dict):
+        return None, "Patch must be an object"
+    values = {}
+    for key in ("id", "version"):
+        value = patch.get(key)
+        if isinstance(value, bool) or not isinstance(value, int):
+            return None, f"{key} must be an integer"
+        values[key] = value
+
+    unknown = sorted(set(patch) - {"id", "version"} - set(WORKER_FIELDS))
+    if unknown:
+        return None, f"Fields cannot be bulk updated: {', '.join(unknown)}"
+    for field in WORKER_FIELDS:
+        if field not in patch:
+            continue
+        value = patch[field]
+        if value is not None and not isinstance(value, str):
+            return None, f"{field} must be a string or null"
+        if field in CATEGORY_FIELDS:
+            try:
+                value = categories.code(CATEGORY_FIELDS[field], value)
+            except ValueError as e:
+                return None, str(e)
+        elif value is not None:
+            length = getattr(_column(field).type, "length", None)
+            if length and len(value) > length:
+                return None, f"{field} longer than {length} characters"
+        values[field] = value
+    if len(values) == 2:
+        return None, "No fields to update"
+    return values, None
+
+
+def apply_patches(connection, patches):
+    """Apply a list of patches. Returns one result dict per patch, in order."""
+    if len(patches) > MAX_PATCHES:
+        raise ValueError(f"At most {MAX_PATCHES} patches per batch")
+
+    results = [None] * len(patches)
+    staged = []
+    seen = set()
+    for line, patch in enumerate(patches):
+        values, error = validate_patch(patch)
+        if not error and values["id"] in seen:
+            error = "Duplicate id in batch"
+        if error:
+            results[line] = {"id": patch.get("id") if isinstance(patch, dict) else None,
+                             "status": "invalid", "error": error}
+            continue
+        seen.add(values["id"])
+        row = {"line": line, "id": values["id"], "version": values["version"],
+               "fields": [f for f in WORKER_FIELDS if f in values]}
+        row.update({_column(f).name: values[f] for f in WORKER_FIELDS if f in values})
+        staged.append(row)
+    if not staged:
+        return results
+
+    columns = ", ".join(
+        f"{_quoted(f)} {'smallint' if f in CATEGORY_FIELDS else 'text'}" for f in WORKER_FIELDS
+    )
+    connection.execute(text(f"""
+        CREATE TEMP TABLE voter_bulk_patches ON COMMIT DROP AS
+        SELECT * FROM jsonb_to_recordset(CAST(:patches AS jsonb))
+            AS p(line integer, id integer, version integer, fields jsonb, {columns})
+    """), {"patches": json.dumps(staged)})
+
+    # Lock every targeted row (in ID order, so concurrent batches can't deadlock)
+    # before comparing versions; only rows still at the client's version change
+    connection.execute(text("""
+        SELECT 1 FROM voter_list
+        WHERE "ID" IN (SELECT id FROM voter_bulk_patches)
+        ORDER BY "ID" FOR UPDATE
+    """))
+    connection.execute(text("""
+        CREATE TEMP TABLE voter_bulk_ids ON COMMIT DROP AS
+        SELECT v."ID" AS voter_id
+        FROM voter_list v JOIN voter_bulk_patches p ON p.id = v."ID" AND p.version = v.version
+    """))
+    aggregates.apply_voter_set(connection, BATCH_IDS, -1)
+
+    assignments = [
+        f"{_quoted(f)} = CASE WHEN p.fields ? '{f}' THEN p.{_quoted(f)} ELSE v.{_quoted(f)} END"
+        for f in WORKER_FIELDS
+    ]
+    updated = connection.execute(text(f"""
+        UPDATE voter_list v SET {", ".join(assignments)}, version = v.version + 1, {SYNC_TOUCH_SQL}
+        FROM voter_bulk_patches p
+        WHERE p.id = v."ID" AND v."ID" IN ({BATCH_IDS})
+        RETURNING v."ID"
+    """)).scalars().all()
+
+    if updated:
+        voter_issues.rebuild(connection, voter_ids=BATCH_IDS)
+        aggregates.apply_voter_set(connection, BATCH_IDS, 1)
+        voter_changes.log(connection, BATCH_IDS)
+        table_versions.bump(connection, Voter.__tablename__)
+
+    current = dict(connection.execute(text("""
+        SELECT "ID", version FROM voter_list WHERE "ID" IN (SELECT id FROM voter_bulk_patches)
+    """)).all())
+    connection.execute(text("DROP TABLE voter_bulk_ids, voter_bulk_patches"))
+
+    updated = set(updated)
+    for row in staged:
+        voter_id = row["id"]
+        if voter_id in updated:
+            result = {"id": voter_id, "status": "updated", "version": current[voter_id]}
+        elif voter_id in current:
+            result = {"id": voter_id, "status": "conflict", "version": current[voter_id]}
+        else:
+            result = {"id": voter_id, "status": "not_found"}
+        results[row["line"]] = result
+    return results
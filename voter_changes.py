@@ -0,0 +1,86 @@
+# voter_changes.py
+"""
+Append-only log of voter IDs that were inserted, updated or deleted.
+
+Every ORM flush that touches a Voter appends its ID to voter_changes in the
+same transaction; bulk writers call log() with the IDs they touched. Readers
+that keep derived copies of voter_list (the columnar snapshot, the segment
+bitmap index) remember the last seq they applied and re-read only the
+voters logged after it. Bulk inserts that log nothing (COPY from the roll PDF loader) are still found by
+readers through their new, higher IDs.
+
+Nothing is logged unless a reader needs it: the snapshot (VOTER_SNAPSHOT=1)
+or the segment bitmap index (VOTER_CHANGE_LOG=1, which patches the index
+instead of rebuilding it). `flask prune-voter-changes` drops old entries; a
+reader whose position was pruned away reloads in full.
+"""
+import os
+
+from sqlalchemy import event, func, select, text
+from sqlalchemy.dialects.postgresql import insert
+
+from models import db, Voter, VoterChange
+
+
+# Entries prune() always keeps behind the newest one: readers re-read this
+# far back (voter_snapshot.OVERLAP, voter_bitmaps.OVERLAP), so one refreshed
+# since the last writes still finds everything it needs
+KEEP_LATEST = 1000
+
+
+def enabled():
+    if os.getenv("VOTER_CHANGE_LOG", "").lower() in ("1", "true", "yes"):
+        return True
+    import voter_snapshot  # imports this module
+    return voter_snapshot.enabled()
+
+def log(connection, voter_ids):
+    """Log a SQL SELECT of voter IDs as changed (when a reader needs the log)."""
+    if not enabled():
+        return
+    connection.execute(text(f"INSERT INTO voter_changes (voter_id) {voter_ids}"))
+
+def latest():
+    """Seq of the newest log entry (0 if the log is empty)."""
+    return db.session.execute(select(func.max(VoterChange.seq))).scalar() or 0
+
+def since(seq):
+    """(latest seq, IDs logged after seq, oldest retained seq)."""
+    latest, oldest = db.session.execute(
+        select(func.max(VoterChange.seq), func.min(VoterChange.seq))
+    ).one()
+    if latest is None or latest <= seq:
+        return latest or seq, [], oldest
+    ids = db.session.execute(
+        select(VoterChange.voter_id).where(VoterChange.seq > seq, VoterChange.seq <= latest).distinct()
+    ).scalars().all()
+    return latest, ids, oldest
+
+def prune(keep_days, keep_latest=KEEP_LATEST):
+    """Drop log entries older than keep_days, except the newest keep_latest.
+    Returns the number removed. The caller commits."""
+    return db.session.execute(text("""
+        DELETE FROM voter_changes
+        WHERE changed_at < now() - make_interval(days => :days)
+          AND seq <= (SELECT COALESCE(MAX(seq), 0) FROM voter_changes) - :keep_latest
+    """), {"days": keep_days, "keep_latest": keep_latest}).rowcount
+
+@event.listens_for(db.session, "before_flush")
+def _collect_voter_changes(session, flush_context, instances):
+    if not enabled():
+        return
+    changed = [obj for obj in session.new if isinstance(obj, Voter)]
+    changed += [obj for obj in session.dirty if isinstance(obj, Voter) and session.is_modified(obj)]
+    changed += [obj for obj in session.deleted if isinstance(obj, Voter)]
+    if changed:
+        session.info.setdefault("voter_changes", []).extend(changed)
+
+@event.listens_for(db.session, "after_flush")
+def _log_voter_changes(session, flush_context):
+    # IDs of new voters are only known after the flush
+    changed = session.info.pop("voter_changes", None)
+    if changed:
+        ids = sorted({voter.id for voter in changed})
+        session.connection().execute(
+            insert(VoterChange.__table__), [{"voter_id": voter_id} for voter_id in ids]
+        )
@@ -0,0 +1,149 @@
+# voter_export.py
+"""
+Streaming voter exports.
+
+Rows are read through a server-side cursor in batches and written out as
+they arrive, so memory stays flat no matter how large the export is. CSV is
+always available. Parquet and Arrow need the optional pyarrow package.
+"""
+import csv
+import io
+import zlib
+
+from models import Voter
+
+BATCH_ROWS = 2000
+
+# Same columns and headers as the dashboard's CSV export
+EXPORT_COLUMNS = [
+    ("ID", Voter.id),
+    ("Name", Voter.name),
+    ("Father's or Husband's name", Voter.father_or_husband_name),
+    ("Age", Voter.age),
+    ("Gender", Voter.gender),
+    ("House number", Voter.house_number),
+    ("EPIC number", Voter.epic_number),
+    ("Mobile Number", Voter.mobile_number),
+    ("Occupation", Voter.occupation),
+    ("Education Level", Voter.education_level),
+    ("Political Affiliation", Voter.political_affiliation),
+    ("Key Issues", Voter.key_issues),
+    ("Remarks", Voter.remarks),
+]
+INTEGER_COLUMNS = {"ID", "Age"}
+
+
+def export_rows(query):
+    """Iterate export tuples for a filtered Voter query over a server-side cursor."""
+    return (
+        query.with_entities(*[column for _, column in EXPORT_COLUMNS])
+        .order_by(Voter.id.asc())
+        .yield_per(BATCH_ROWS)
+    )
+
+def _batches(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(tuple(row))
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def csv_chunks(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([header for header, _ in EXPORT_COLUMNS])
+    for batch in _batches(rows, BATCH_ROWS):
+        writer.writerows(batch)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+def gzip_chunks(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that hands its bytes back as they are produced."""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _arrow_schema(pa):
+    return pa.schema([
+        (header, pa.int32() if header in INTEGER_COLUMNS else pa.string())
+        for header, _ in EXPORT_COLUMNS
+    ])
+
+def _arrow_table(pa, schema, batch):
+    columns = list(zip(*batch))
+    return pa.Table.from_arrays(
+        [pa.array(column, type=field.type) for column, field in zip(columns, schema)],
+        schema=schema,
+    )
+
+def parquet_chunks(rows, batch_rows=50000):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = _arrow_schema(pa)
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression="zstd")
+    try:
+        # One row group per batch; each is flushed to the client once written
+        for batch in _batches(rows, batch_rows):
+            writer.write_table(_arrow_table(pa, schema, batch))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+def arrow_chunks(rows, batch_rows=50000):
+    import pyarrow as pa
+
+    schema = _arrow_schema(pa)
+    sink = _ChunkSink()
+    writer = pa.ipc.new_stream(sink, schema)
+    try:
+        for batch in _batches(rows, batch_rows):
+            writer.write_table(_arrow_table(pa, schema, batch))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+def pyarrow_available():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
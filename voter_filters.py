@@ -0,0 +1,75 @@
+# voter_filters.py
+"""
+Voter filter parameters shared by the listing, analytics and export endpoints.
+"""
+from sqlalchemy import false
+
+import categories
+from models import Voter
+from voter_issues import split_issues, voters_with_issues
+
+FILTER_PARAMS = ("gender", "affiliation", "age", "issues", "occupation", "ward", "education")
+
+
+def filters_from_args(args):
+    """Pick the supported filter parameters out of request.args."""
+    return {name: args.get(name, type=str) for name in FILTER_PARAMS}
+
+def _code_equals(column, kind, value):
+    """column = code of value; an unknown value matches nothing."""
+    try:
+        code = categories.code(kind, value)
+    except ValueError:
+        return false()
+    return column.is_(None) if code is None else column == code
+
+def filter_voters(query, gender=None, affiliation=None, age=None, issues=None,
+                  occupation=None, ward=None, education=None):
+    # Gender, affiliation and education are smallint codes (see categories.py):
+    # filter values are mapped to codes here so the code indexes apply
+    if gender:
+        g = gender.strip()
+        if g and g.lower() != "all":
+            query = query.filter(_code_equals(Voter.gender, "gender", g))
+
+    if affiliation:
+        a = affiliation.lower()
+        if a == 'empty':
+            query = query.filter(Voter.political_affiliation.is_(None))
+        else:
+            query = query.filter(_code_equals(Voter.political_affiliation, "affiliation", a))
+
+    if age:
+        if age == "18-25":
+            query = query.filter(Voter.age.between(18, 25))
+        elif age == "26-40":
+            query = query.filter(Voter.age.between(26, 40))
+        elif age == "41-60":
+            query = query.filter(Voter.age.between(41, 60))
+        elif age == "60+":
+            query = query.filter(Voter.age >= 60)
+
+    if issues:
+        # Comma-separated issue names; a voter matches if they raised any of them
+        names = split_issues(issues)
+        if names:
+            query = query.filter(Voter.id.in_(voters_with_issues(names)))
+
+    if occupation:
+        query = query.filter(Voter.occupation.ilike(f"%{occupation}%"))
+
+    if ward:
+        try:
+            query = query.filter(Voter.booth_id == int(ward))
+        except Exception:
+            query = query.filter(Voter.booth_id == ward)
+
+    if education:
+        # Substring match against the canonical level names, e.g. "grad"
+        query = query.filter(Voter.education_level.in_(categories.matching_codes("education", education)))
+
+    return query
+
+def filter_key(filters):
+    """Hashable form of a filter dict for cache keys. All filters are case-insensitive."""
+    return tuple(sorted((name, value.lower()) for name, value in filters.items() if value))
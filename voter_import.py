@@ -0,0 +1,221 @@
+# voter_import.py
+"""
+CSV bulk import into voter_list, upserting on EPIC number.
+
+The CSV is read as a stream and every row is validated before it is COPYed,
+in batches, into a temporary staging table. One set-based merge then updates
+the voters whose EPIC number already exists and inserts the rest:
+
+* roll fields (name, relative, age, gender, house number, booth) take the
+  imported value whenever the CSV has one;
+* worker-entered fields (mobile number, occupation, education level,
+  affiliation, key issues, remarks) are only filled in where they are still
+  empty, so an import never overwrites canvassing work.
+
+Aggregates, voter_issues, the voter change log and the voter_list table
+version are maintained once for the whole import, in the same transaction.
+The caller commits.
+"""
+import csv
+import io
+
+from sqlalchemy import text
+
+from models import Voter, SYNC_TOUCH_SQL, CATEGORY_FIELDS, WORKER_FIELDS
+import aggregates
+import categories
+import table_versions
+import voter_changes
+import voter_issues
+
+ROLL_FIELDS = (
+    "name", "father_or_husband_name", "age", "gender", "house_number", "booth_id",
+)
+IMPORT_FIELDS = ROLL_FIELDS + ("epic_number",) + WORKER_FIELDS
+INTEGER_FIELDS = ("age", "booth_id")
+# CATEGORY_FIELDS are staged as their smallint codes; unknown values reject the row
+
+COPY_BATCH = 10000
+MAX_ERRORS = 50
+
+STAGING_IDS = "SELECT voter_id FROM voter_import_ids"
+
+
+def _column(field):
+    return Voter.__mapper__.columns[field]
+
+def _quoted(field):
+    return '"' + _column(field).name + '"'
+
+def header_fields(header):
+    """Map CSV header positions to Voter attributes; matches column names or attribute names."""
+    known = {}
+    for field in IMPORT_FIELDS:
+        known[_column(field).name.lower()] = field
+        known[field] = field
+    fields = [known.get((name or "").strip().lower()) for name in header]
+    missing = [_column(f).name for f in ("name", "epic_number") if f not in fields]
+    if missing:
+        raise ValueError(f"CSV is missing required column(s): {', '.join(missing)}")
+    return fields
+
+def validate_row(fields, row):
+    """Return (values, None) for a valid row or (None, error message)."""
+    values = dict.fromkeys(IMPORT_FIELDS)
+    for field, raw in zip(fields, row):
+        if field is None:
+            continue
+        value = " ".join((raw or "").split())
+        if not value or value == "-":
+            continue
+        if field in INTEGER_FIELDS:
+            try:
+                value = int(value)
+            except ValueError:
+                return None, f"{_column(field).name} is not a number: {raw!r}"
+            if field == "age" and not 0 <= value < 150:
+                return None, f"Age out of range: {value}"
+        elif field in CATEGORY_FIELDS:
+            try:
+                value = categories.code(CATEGORY_FIELDS[field], value)
+            except ValueError as e:
+                return None, str(e)
+        else:
+            length = getattr(_column(field).type, "length", None)
+            if length and len(value) > length:
+                return None, f"{_column(field).name} longer than {length} characters"
+        values[field] = value
+
+    if values["epic_number"]:
+        values["epic_number"] = values["epic_number"].replace(" ", "").upper()
+    if not values["name"]:
+        return None, "Name is required"
+    if not values["epic_number"]:
+        return None, "EPIC number is required"
+    return values, None
+
+
+# -------------------------
+# Staging
+# -------------------------
+def _create_staging(connection):
+    columns = ", ".join(
+        f"{_quoted(f)} {'integer' if f in INTEGER_FIELDS or f in CATEGORY_FIELDS else 'text'}"
+        for f in IMPORT_FIELDS
+    )
+    connection.execute(text(
+        f"CREATE TEMP TABLE voter_import_staging (line integer, {columns}) ON COMMIT DROP"
+    ))
+
+def _copy_batch(connection, rows):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+    columns = ", ".join(["line"] + [_quoted(f) for f in IMPORT_FIELDS])
+    cursor = connection.connection.cursor()
+    try:
+        cursor.copy_expert(f"COPY voter_import_staging ({columns}) FROM STDIN WITH (FORMAT csv)", buffer)
+    finally:
+        cursor.close()
+
+def stage_csv(connection, stream):
+    """Validate and COPY a CSV text stream into voter_import_staging. Returns the read stats."""
+    reader = csv.reader(stream)
+    try:
+        fields = header_fields(next(reader))
+    except StopIteration:
+        raise ValueError("CSV file is empty")
+
+    _create_staging(connection)
+    stats = {"rows": 0, "rejected": 0, "errors": []}
+    batch = []
+    for row in reader:
+        if not any(cell.strip() for cell in row):
+            continue
+        stats["rows"] += 1
+        line = reader.line_num
+        values, error = validate_row(fields, row)
+        if error:
+            stats["rejected"] += 1
+            if len(stats["errors"]) < MAX_ERRORS:
+                stats["errors"].append({"line": line, "error": error})
+            continue
+        batch.append([line] + [values[f] for f in IMPORT_FIELDS])
+        if len(batch) >= COPY_BATCH:
+            _copy_batch(connection, batch)
+            batch = []
+    if batch:
+        _copy_batch(connection, batch)
+    return stats
+
+
+# -------------------------
+# Merge
+# -------------------------
+def merge_staged(connection):
+    """Upsert voter_import_staging into voter_list on EPIC number. Returns (inserted, updated, duplicates)."""
+    epic = _quoted("epic_number")
+
+    # A later line for the same EPIC number wins
+    connection.execute(text(f"""
+        CREATE TEMP TABLE voter_import_rows ON COMMIT DROP AS
+        SELECT DISTINCT ON ({epic}) * FROM voter_import_staging
+        ORDER BY {epic}, line DESC
+    """))
+    connection.execute(text(f"CREATE INDEX ON voter_import_rows ({epic})"))
+    connection.execute(text("ANALYZE voter_import_rows"))
+    duplicates = connection.execute(text(
+        "SELECT (SELECT COUNT(*) FROM voter_import_staging) - (SELECT COUNT(*) FROM voter_import_rows)"
+    )).scalar()
+
+    # Imports merge one at a time, so two of them can't both insert a new EPIC
+    # number; other writers aren't blocked. Of voter_list only the voters being
+    # merged into are locked (in ID order), so edits to every other voter carry on.
+    connection.execute(text("SELECT pg_advisory_xact_lock(hashtext('voter_import'))"))
+    connection.execute(text(f"""
+        CREATE TEMP TABLE voter_import_ids ON COMMIT DROP AS
+        SELECT v."ID" AS voter_id
+        FROM voter_list v JOIN voter_import_rows s ON s.{epic} = v.{epic}
+        ORDER BY v."ID"
+        FOR UPDATE OF v
+    """))
+    aggregates.apply_voter_set(connection, STAGING_IDS, -1)
+
+    assignments = [f"{_quoted(f)} = COALESCE(s.{_quoted(f)}, v.{_quoted(f)})" for f in ROLL_FIELDS]
+    assignments += [
+        f"{_quoted(f)} = COALESCE(v.{_quoted(f)}, s.{_quoted(f)})" if f in CATEGORY_FIELDS
+        else f"{_quoted(f)} = COALESCE(NULLIF(v.{_quoted(f)}, ''), s.{_quoted(f)})"
+        for f in WORKER_FIELDS
+    ]
+    updated = connection.execute(text(f"""
+        UPDATE voter_list v SET {", ".join(assignments)}, version = v.version + 1, {SYNC_TOUCH_SQL}
+        FROM voter_import_rows s
+        WHERE v.{epic} = s.{epic}
+    """)).rowcount
+
+    columns = ", ".join(_quoted(f) for f in IMPORT_FIELDS)
+    inserted = connection.execute(text(f"""
+        WITH inserted AS (
+            INSERT INTO voter_list ({columns}, has_voted)
+            SELECT {columns}, FALSE
+            FROM voter_import_rows s
+            WHERE NOT EXISTS (SELECT 1 FROM voter_list v WHERE v.{epic} = s.{epic})
+            ORDER BY s.line
+            RETURNING "ID"
+        )
+        INSERT INTO voter_import_ids SELECT "ID" FROM inserted
+    """)).rowcount
+
+    voter_issues.rebuild(connection, voter_ids=STAGING_IDS)
+    aggregates.apply_voter_set(connection, STAGING_IDS, 1)
+    voter_changes.log(connection, STAGING_IDS)
+    table_versions.bump(connection, Voter.__tablename__)
+
+    connection.execute(text("DROP TABLE voter_import_ids, voter_import_rows, voter_import_staging"))
+    return inserted, updated, duplicates
+
+def import_csv(connection, stream):
+    """Stage, validate and merge a CSV text stream on the connection's transaction."""
+    stats = stage_csv(connection, stream)
+    stats["inserted"], stats["updated"], stats["duplicates"] = merge_staged(connection)
+    return stats
@@ -0,0 +1,102 @@
+# voter_issues.py
+"""
+Normalized voter <-> issue association.
+
+voter_list keeps the free-text 'Key Issues' column that workers edit; the
+issues vocabulary and the voter_issues link table mirror it so issue filters
+and rankings can use indexes. ORM writes to Voter.key_issues are mirrored on
+flush. Writes that bypass the ORM must call rebuild() afterwards. Both bump
+the voter_issues table version.
+"""
+from sqlalchemy import delete, event, inspect, select, text
+from sqlalchemy.dialects.postgresql import insert
+
+from models import db, Voter, Issue, VoterIssue
+import table_versions
+
+
+def split_issues(key_issues):
+    """Normalized, de-duplicated issue names from a comma-separated 'Key Issues' value."""
+    if not key_issues:
+        return []
+    return list(dict.fromkeys(i.strip().lower() for i in key_issues.split(",") if i.strip()))
+
+def voters_with_issues(names):
+    """Subquery of voter IDs linked to any of the given normalized issue names."""
+    return (
+        select(VoterIssue.voter_id)
+        .join(Issue, Issue.id == VoterIssue.issue_id)
+        .where(Issue.name.in_(names))
+    )
+
+def sync(connection, voter_issues):
+    """Replace the issue links of the given voters. voter_issues maps voter ID -> names."""
+    if not voter_issues:
+        return
+    connection.execute(
+        delete(VoterIssue.__table__).where(VoterIssue.voter_id.in_(list(voter_issues)))
+    )
+
+    names = {name for names in voter_issues.values() for name in names}
+    if not names:
+        return
+    connection.execute(
+        insert(Issue.__table__).on_conflict_do_nothing(index_elements=["name"]),
+        [{"name": name} for name in names],
+    )
+    issue_ids = dict(connection.execute(
+        select(Issue.name, Issue.id).where(Issue.name.in_(names))
+    ).all())
+    connection.execute(
+        insert(VoterIssue.__table__),
+        [
+            {"voter_id": voter_id, "issue_id": issue_ids[name]}
+            for voter_id, names in voter_issues.items()
+            for name in names
+        ],
+    )
+
+@event.listens_for(db.session, "before_flush")
+def _collect_issue_changes(session, flush_context, instances):
+    changed = [
+        voter for voter in list(session.new) + list(session.dirty)
+        if isinstance(voter, Voter) and inspect(voter).attrs.key_issues.history.has_changes()
+    ]
+    if changed:
+        session.info["voter_issue_changes"] = changed
+        table_versions.touch(session, VoterIssue.__tablename__)
+
+@event.listens_for(db.session, "after_flush")
+def _sync_issue_changes(session, flush_context):
+    # Voter IDs of new rows are only known after the flush
+    changed = session.info.pop("voter_issue_changes", None)
+    if changed:
+        sync(session.connection(), {voter.id: split_issues(voter.key_issues) for voter in changed})
+
+def rebuild(connection=None, voter_ids=None):
+    """Recompute the issues vocabulary and voter_issues from voter_list.
+
+    voter_ids, a SQL SELECT of voter IDs, limits the work to those voters.
+    """
+    connection = connection or db.session.connection()
+    only = f'v."ID" IN ({voter_ids})' if voter_ids else "TRUE"
+    connection.execute(text(f"""
+        INSERT INTO issues (name)
+        SELECT DISTINCT LOWER(BTRIM(raw_issue, E' \\t\\r\\n'))
+        FROM voter_list v, unnest(string_to_array(v."Key Issues", ',')) AS raw_issue
+        WHERE {only} AND BTRIM(raw_issue, E' \\t\\r\\n') <> ''
+        ON CONFLICT (name) DO NOTHING
+    """))
+    if voter_ids:
+        connection.execute(text(f"DELETE FROM voter_issues WHERE voter_id IN ({voter_ids})"))
+    else:
+        connection.execute(text("DELETE FROM voter_issues"))
+    connection.execute(text(f"""
+        INSERT INTO voter_issues (voter_id, issue_id)
+        SELECT DISTINCT v."ID", i.id
+        FROM voter_list v
+        CROSS JOIN LATERAL unnest(string_to_array(v."Key Issues", ',')) AS raw_issue
+        JOIN issues i ON i.name = LOWER(BTRIM(raw_issue, E' \\t\\r\\n'))
+        WHERE {only}
+    """))
+    table_versions.bump(connection, VoterIssue.__tablename__)
@@ -0,0 +1,78 @@
+# voter_projection.py
+"""
+Field projection and the columnar format for voter listings.
+
+?fields=name,age,political_affiliation selects only those columns (plus the
+ID, which every row keeps) in the SQL, and each row comes back keyed by
+those field names instead of to_dict()'s headers.
+
+?format=columns sends the schema once and one array per field, all fields
+unless fields= narrows them:
+
+    {"schema": [{"name": "id", "type": "integer"}, {"name": "name", "type": "string"}, ...],
+     "columns": [[1, 2, ...], ["Asha", "Ravi", ...], ...],
+     "total": ..., "pages": ..., "page": ... or "next_cursor": ...}
+
+The columnar body is written one column at a time, gzip-compressed as it
+goes when the client accepts gzip.
+"""
+import json
+
+from sqlalchemy import Boolean, Integer
+
+from categories import CategoryCode
+from models import Voter
+from voter_export import gzip_chunks
+
+# Attribute names, in to_dict() order
+FIELDS = (
+    "id", "name", "father_or_husband_name", "age", "gender", "house_number", "epic_number",
+    "mobile_number", "occupation", "education_level", "political_affiliation", "key_issues",
+    "remarks", "has_voted", "booth_id", "version",
+)
+
+
+def parse_fields(value):
+    """Field list for a fields= argument, ID first; None when absent. Raises ValueError."""
+    if not value:
+        return None
+    names = [name.strip() for name in value.split(",") if name.strip()]
+    unknown = sorted(set(names) - set(FIELDS))
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}; expected any of: {', '.join(FIELDS)}")
+    return ["id"] + [name for name in dict.fromkeys(names) if name != "id"]
+
+def select_fields(query, fields):
+    """The voter query reduced to the given columns; rows are tuples in field order."""
+    return query.with_entities(*[getattr(Voter, field) for field in fields])
+
+def _type_name(field):
+    column_type = Voter.__mapper__.columns[field].type
+    if isinstance(column_type, CategoryCode):
+        return "string"
+    if isinstance(column_type, Boolean):
+        return "boolean"
+    if isinstance(column_type, Integer):
+        return "integer"
+    return "string"
+
+def schema(fields):
+    return [{"name": field, "type": _type_name(field)} for field in fields]
+
+
+def column_chunks(fields, rows, meta):
+    """UTF-8 JSON of the columnar payload, one chunk per column."""
+    yield ('{"schema":' + json.dumps(schema(fields), separators=(",", ":")) + ',"columns":[').encode()
+    for i, column in enumerate(zip(*rows) if rows else [() for _ in fields]):
+        yield (("," if i else "") + json.dumps(column, separators=(",", ":"))).encode()
+    tail = json.dumps(meta, separators=(",", ":"))
+    yield ("]" + ("," + tail[1:] if meta else "}")).encode()
+
+def columns_response(fields, rows, meta, accept_gzip):
+    """(chunks, headers) for a columnar page."""
+    chunks = column_chunks(fields, rows, meta)
+    headers = {"Vary": "Accept-Encoding"}
+    if accept_gzip:
+        chunks = gzip_chunks(chunks)
+        headers["Content-Encoding"] = "gzip"
+    return chunks, headers
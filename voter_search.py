@@ -0,0 +1,73 @@
+# voter_search.py
+"""
+Relevance-ranked and type-ahead voter search.
+
+Ranked search matches misspelled or partial names with pg_trgm word
+similarity on Name and Father's/Husband's name. It also matches substrings
+of the EPIC and house numbers, all served by trigram GIN indexes. Prefix
+search serves the type-ahead box. It walks a C-collated lower() btree index
+in order and stops after `limit` rows, so it costs the same at any roll size.
+"""
+import re
+
+from sqlalchemy import func, or_
+
+from models import Voter
+
+MIN_QUERY_LENGTH = 2
+MAX_LIMIT = 50
+
+
+def _like_escape(term):
+    return re.sub(r"([\\%_])", r"\\\1", term)
+
+def ranked(query, q, limit=20):
+    """Return (voter, score) pairs best match first."""
+    q = q.strip()
+    if len(q) < MIN_QUERY_LENGTH:
+        return []
+    return ranked_query(query, q, limit).all()
+
+def ranked_query(query, q, limit=20):
+    """The query behind ranked(), for a stripped q of at least MIN_QUERY_LENGTH characters."""
+    score = func.greatest(
+        func.word_similarity(q, Voter.name),
+        func.word_similarity(q, func.coalesce(Voter.father_or_husband_name, "")),
+        func.similarity(q, func.coalesce(Voter.epic_number, "")),
+        func.similarity(q, func.coalesce(Voter.house_number, "")),
+    ).label("score")
+
+    # `column %> q` is true when q is word-similar to part of the column
+    conditions = [
+        Voter.name.op("%>")(q),
+        Voter.father_or_husband_name.op("%>")(q),
+    ]
+    if len(q) >= 3:
+        # Trigram indexes need at least one full trigram for substring matches
+        contains = f"%{_like_escape(q)}%"
+        conditions += [Voter.epic_number.ilike(contains), Voter.house_number.ilike(contains)]
+
+    return (
+        query.filter(or_(*conditions))
+        .add_columns(score)
+        .order_by(score.desc(), Voter.id.asc())
+        .limit(min(limit, MAX_LIMIT))
+    )
+
+def prefix(query, q, limit=10):
+    """Return voters whose name (or EPIC number, for queries with digits) starts with q."""
+    q = q.strip().lower()
+    if not q:
+        return []
+    return prefix_query(query, q, limit).all()
+
+def prefix_query(query, q, limit=10):
+    """The query behind prefix(), for a stripped, lowercased, non-empty q."""
+    column = Voter.epic_number if any(ch.isdigit() for ch in q) else Voter.name
+    key = func.lower(column).collate("C")
+    return (
+        query.with_entities(Voter.id, Voter.name, Voter.house_number, Voter.epic_number)
+        .filter(key.like(f"{_like_escape(q)}%"))
+        .order_by(key)
+        .limit(min(limit, MAX_LIMIT))
+    )
@@ -0,0 +1,85 @@
+# voter_segments.py
+"""
+Saved voter segments.
+
+A segment's `filters` JSONB holds the same parameters /api/voters and the
+candidate analytics accept (gender, affiliation, age, issues, occupation,
+ward, education). compile_filters() validates and normalizes them, and
+segment_query() turns them into SQL through voter_filters.filter_voters, so
+a segment always matches exactly what the dashboard filters show.
+
+Member counts and affiliation breakdowns are cached per segment filter set
+and keyed by the voter_list table version, so they are recomputed only
+after voters change.
+"""
+from collections import Counter
+
+from sqlalchemy import func
+
+from models import Voter
+from caching import LRUCache
+from voter_filters import FILTER_PARAMS, filter_voters, filter_key
+import aggregates
+import table_versions
+
+# (filter key, voter_list version) -> stats
+_stats = LRUCache(maxsize=512)
+
+
+def compile_filters(filters):
+    """filter_voters() keyword arguments for a segment's filters. Raises ValueError if invalid."""
+    if filters is None:
+        return {}
+    if not isinstance(filters, dict):
+        raise ValueError("Segment filters must be an object")
+    compiled = {}
+    for name, value in filters.items():
+        if name not in FILTER_PARAMS:
+            raise ValueError(f"Unsupported segment filter: {name}")
+        if value is None or value == "" or value == []:
+            continue
+        if isinstance(value, list) and name == "issues":
+            value = ",".join(str(v) for v in value)
+        elif isinstance(value, (str, int)) and not isinstance(value, bool):
+            value = str(value)
+        else:
+            raise ValueError(f"Invalid value for segment filter {name}")
+        compiled[name] = value
+    return compiled
+
+def segment_query(segment, query=None):
+    """Voter query for the members of a segment."""
+    return filter_voters(query if query is not None else Voter.query, **compile_filters(segment.filters))
+
+def segment_stats(segment):
+    """Member count and affiliation breakdown of a segment, cached until voter_list changes."""
+    filters = compile_filters(segment.filters)
+    cache_key = (filter_key(filters), table_versions.current(Voter.__tablename__))
+    stats = _stats.get(cache_key)
+    if stats is None:
+        rows = filter_voters(Voter.query, **filters) \
+            .with_entities(aggregates.AFFILIATION_KEY, func.count()) \
+            .group_by(aggregates.AFFILIATION_KEY).all()
+        stats = _summarize(rows)
+        _stats.set(cache_key, stats)
+    return stats
+
+def _summarize(rows):
+    affiliations = Counter()
+    for affiliation, n in rows:
+        affiliations[affiliation if affiliation.strip() else "empty"] += int(n)
+    total = sum(affiliations.values())
+    supporters = affiliations["supporter"]
+    opponents = affiliations["opponent"]
+    undecided = sum(affiliations[a or "empty"] for a in aggregates.UNDECIDED)
+    return {
+        "total": total,
+        "supporters": supporters,
+        "opponents": opponents,
+        "undecided": undecided,
+        "percent": supporters * 100.0 / total if total else 0.0,
+        "affiliations": dict(affiliations),
+    }
+
+def cache_stats():
+    return _stats.stats()
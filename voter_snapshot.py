@@ -0,0 +1,428 @@
+# voter_snapshot.py
+"""
+Optional in-process columnar snapshot of voter_list (needs NumPy).
+
+Enabled with VOTER_SNAPSHOT=1. The analytics endpoints and chat insights
+then answer from NumPy arrays instead of Postgres:
+
+* age (int16, -1 for NULL) and booth_id (int32, -1 for NULL);
+* gender, affiliation, education and occupation as dictionary codes
+  (uint16) into per-column lists of the raw values;
+* an age band code and a contacted flag per voter;
+* issue links as parallel (voter position, issue code) arrays.
+
+Filters become boolean masks with the same semantics as
+voter_filters.filter_voters, and histograms are np.bincount over the masked
+codes.
+
+The snapshot is loaded on first use and brought up to date whenever the
+voter_list table version moved on: voters logged in voter_changes since the
+last refresh, plus any IDs above the highest one loaded, are re-read and
+patched in. Readers always see a complete snapshot; a refresh builds a new
+one and swaps it in, and only takes a lock when the version moved.
+"""
+import os
+import threading
+
+from sqlalchemy import func, select
+
+from models import db, Voter, Issue, VoterIssue
+import aggregates
+import categories
+import table_versions
+import voter_changes
+from voter_issues import split_issues
+
+# Optional dependency, imported on first use so app startup doesn't pay for it
+np = None
+
+CATEGORICAL = ("gender", "political_affiliation", "education_level", "occupation")
+BANDS = ("", "u18", "18-25", "26-40", "41-59", "60", "61+")
+AGE_RANGES = {"18-25": (18, 25), "26-40": (26, 40), "41-60": (41, 60), "60+": (60, None)}
+
+# Log entries and IDs re-read behind the last applied ones, so that writes
+# which committed out of order are not missed (voter_changes.KEEP_LATEST
+# keeps at least this many entries)
+OVERLAP = voter_changes.KEEP_LATEST
+# Reload from scratch when more than this share of voters changed
+RELOAD_SHARE = 0.2
+
+
+def available():
+    global np
+    if np is None:
+        try:
+            import numpy
+        except ImportError:
+            return False
+        np = numpy
+    return True
+
+def enabled():
+    return os.getenv("VOTER_SNAPSHOT", "").lower() in ("1", "true", "yes") and available()
+
+
+class Dictionary:
+    """Raw value <-> code mapping for one categorical column; None is a value too."""
+
+    def __init__(self, values=()):
+        self.values = list(values)
+        self.codes = {value: code for code, value in enumerate(self.values)}
+
+    def encode(self, value):
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def copy(self):
+        return Dictionary(self.values)
+
+    def dtype(self):
+        return np.uint16 if len(self.values) <= 0xFFFF else np.uint32
+
+
+def _bands(age):
+    band = np.zeros(len(age), dtype=np.uint8)
+    band[(age > 0) & (age < 18)] = 1
+    band[(age >= 18) & (age <= 25)] = 2
+    band[(age >= 26) & (age <= 40)] = 3
+    band[(age >= 41) & (age < 60)] = 4
+    band[age == 60] = 5
+    band[age > 60] = 6
+    return band
+
+
+class VoterSnapshot:
+    def __init__(self, columns, dictionaries, links, issues, version=0, seq=0):
+        self.columns = columns
+        self.dictionaries = dictionaries
+        self.issues = issues
+        self.version = version
+        self.seq = seq
+        self._derive(*links)
+
+    def _derive(self, link_voter, link_issue):
+        c = self.columns
+        self.ids = c["id"]
+        self.band = _bands(c["age"])
+        # Links grouped by issue and in voter order within each issue, so an
+        # issue's voters are one contiguous, sorted slice of link_pos
+        order = np.lexsort((link_voter, link_issue))
+        self.link_issue = link_issue[order]
+        self.link_pos = np.searchsorted(self.ids, link_voter[order])
+        self.issue_start = np.searchsorted(self.link_issue, np.arange(len(self.issues.values) + 1))
+        # One code per (affiliation, band, gender) cell for the dashboard histograms
+        genders = len(self.dictionaries["gender"].values)
+        self.cell = ((c["political_affiliation"].astype(np.int32) * len(BANDS) + self.band) * genders
+                     + c["gender"]).astype(np.int32)
+
+    @classmethod
+    def from_rows(cls, rows, links, version=0, seq=0):
+        """rows: (id, age, booth_id, contacted, gender, affiliation, education, occupation) by ID."""
+        if not available():
+            raise RuntimeError("The voter snapshot needs NumPy")
+        dictionaries = {name: Dictionary() for name in CATEGORICAL}
+        ids, ages, booths, contacted = [], [], [], []
+        codes = {name: [] for name in CATEGORICAL}
+        for voter_id, age, booth_id, has_mobile, *values in rows:
+            ids.append(voter_id)
+            ages.append(-1 if age is None else age)
+            booths.append(-1 if booth_id is None else booth_id)
+            contacted.append(bool(has_mobile))
+            for name, value in zip(CATEGORICAL, values):
+                codes[name].append(dictionaries[name].encode(value))
+
+        columns = {
+            "id": np.array(ids, dtype=np.int32),
+            "age": np.array(ages, dtype=np.int16),
+            "booth": np.array(booths, dtype=np.int32),
+            "contacted": np.array(contacted, dtype=bool),
+        }
+        for name in CATEGORICAL:
+            columns[name] = np.array(codes[name], dtype=dictionaries[name].dtype())
+
+        issues = Dictionary()
+        link_voter = np.array([voter_id for voter_id, _ in links], dtype=np.int32)
+        link_issue = np.array([issues.encode(name) for _, name in links], dtype=np.uint32)
+        link_issue = link_issue.astype(issues.dtype())
+        return cls(columns, dictionaries, (link_voter, link_issue), issues, version, seq)
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def links(self):
+        """(voter IDs, issue codes) of every issue link."""
+        return self.ids[self.link_pos], self.link_issue
+
+    def nbytes(self):
+        arrays = list(self.columns.values()) + [
+            self.band, self.cell, self.link_issue, self.link_pos,
+        ]
+        return sum(a.nbytes for a in arrays)
+
+    # -------------------------
+    # Incremental refresh
+    # -------------------------
+    def patched(self, changed, rows, links, version, seq):
+        """A new snapshot with the changed voter IDs re-read from rows and links.
+
+        rows and links are as for from_rows(), restricted to the changed IDs;
+        changed IDs without a row were deleted.
+        """
+        dictionaries = {name: d.copy() for name, d in self.dictionaries.items()}
+        issues = self.issues.copy()
+
+        changed = np.array(sorted(changed), dtype=np.int32)
+        keep = ~np.isin(self.ids, changed)
+        columns = {name: array[keep] for name, array in self.columns.items()}
+
+        if rows:
+            new = {
+                "id": np.array([r[0] for r in rows], dtype=np.int32),
+                "age": np.array([-1 if r[1] is None else r[1] for r in rows], dtype=np.int16),
+                "booth": np.array([-1 if r[2] is None else r[2] for r in rows], dtype=np.int32),
+                "contacted": np.array([bool(r[3]) for r in rows], dtype=bool),
+            }
+            for i, name in enumerate(CATEGORICAL):
+                new[name] = np.array([dictionaries[name].encode(r[4 + i]) for r in rows], dtype=np.uint32)
+            order = np.argsort(new["id"], kind="stable")
+            at = np.searchsorted(columns["id"], new["id"][order])
+            for name in columns:
+                dtype = dictionaries[name].dtype() if name in dictionaries else columns[name].dtype
+                columns[name] = np.insert(columns[name].astype(dtype), at, new[name][order].astype(dtype))
+
+        link_voter, link_issue = self.links
+        keep = ~np.isin(link_voter, changed)
+        link_voter = np.concatenate([link_voter[keep], np.array([v for v, _ in links], dtype=np.int32)])
+        link_issue = np.concatenate([
+            link_issue[keep], np.array([issues.encode(n) for _, n in links], dtype=np.uint32),
+        ]).astype(issues.dtype())
+        return VoterSnapshot(columns, dictionaries, (link_voter, link_issue), issues, version, seq)
+
+    # -------------------------
+    # Masks
+    # -------------------------
+    def _matching(self, name, predicate):
+        """Mask of voters whose raw value in a categorical column satisfies predicate."""
+        values = self.dictionaries[name].values
+        codes = [code for code, value in enumerate(values) if predicate(value)]
+        column = self.columns[name]
+        if not codes:
+            return np.zeros(len(column), dtype=bool)
+        if len(codes) == 1:
+            return column == codes[0]
+        lookup = np.zeros(len(values), dtype=bool)
+        lookup[codes] = True
+        return lookup[column]
+
+    def where(self, name, value):
+        """Mask of voters whose column equals value, ignoring case (LOWER(col) = LOWER(value))."""
+        value = value.lower()
+        return self._matching(name, lambda v: v is not None and v.lower() == value)
+
+    def _category(self, name, kind, value):
+        """Mask of voters whose categorical column holds the canonical form of value."""
+        try:
+            target = categories.canonical(kind, value)
+        except ValueError:
+            return np.zeros(len(self), dtype=bool)
+        return self._matching(name, lambda v: v == target)
+
+    def mask(self, gender=None, affiliation=None, age=None, issues=None,
+             occupation=None, ward=None, education=None):
+        """Boolean mask with the semantics of voter_filters.filter_voters."""
+        mask = np.ones(len(self), dtype=bool)
+        if gender:
+            g = gender.strip()
+            if g and g.lower() != "all":
+                mask &= self._category("gender", "gender", g)
+
+        if affiliation:
+            a = affiliation.lower()
+            if a == "empty":
+                mask &= self._matching("political_affiliation", lambda v: not v)
+            else:
+                mask &= self._category("political_affiliation", "affiliation", a)
+
+        if age in AGE_RANGES:
+            low, high = AGE_RANGES[age]
+            ages = self.columns["age"]
+            mask &= ages >= low
+            if high is not None:
+                mask &= ages <= high
+
+        if issues:
+            members = np.zeros(len(self), dtype=bool)
+            for name in split_issues(issues):
+                code = self.issues.codes.get(name)
+                if code is not None:
+                    members[self.link_pos[self.issue_start[code]:self.issue_start[code + 1]]] = True
+            mask &= members
+
+        if occupation:
+            o = occupation.lower()
+            mask &= self._matching("occupation", lambda v: v is not None and o in v.lower())
+
+        if ward:
+            try:
+                mask &= self.columns["booth"] == int(ward)
+            except ValueError:
+                mask[:] = False
+
+        if education:
+            e = education.lower()
+            mask &= self._matching("education_level", lambda v: v is not None and e in v.lower())
+
+        return mask
+
+    # -------------------------
+    # Aggregations
+    # -------------------------
+    @staticmethod
+    def _select(array, mask):
+        # take() over the selected positions beats boolean indexing at every
+        # selectivity for arrays this size
+        return array if mask is None else np.take(array, np.flatnonzero(mask))
+
+    def counts(self, name, mask=None):
+        """[(raw value, count)] of a categorical column or "age" (None for NULL) over a mask."""
+        if name == "age":
+            ages = self._select(self.columns["age"], mask)
+            n = np.bincount(ages.astype(np.int32) + 1)
+            return [(None if i == 0 else i - 1, int(n[i])) for i in np.flatnonzero(n)]
+        column = self._select(self.columns[name], mask)
+        values = self.dictionaries[name].values
+        n = np.bincount(column, minlength=len(values))
+        return [(values[i], int(n[i])) for i in np.flatnonzero(n)]
+
+    def issue_counts(self, mask=None, limit=None):
+        """[(issue, voters)] most mentioned first."""
+        if mask is None:
+            n = np.diff(self.issue_start)
+        else:
+            hits = np.take(mask, self.link_pos)
+            bounds = self.issue_start
+            n = [np.count_nonzero(hits[bounds[i]:bounds[i + 1]]) for i in range(len(bounds) - 1)]
+        ranked = sorted(((self.issues.values[i], int(n[i])) for i in np.flatnonzero(n)),
+                        key=lambda item: (-item[1], item[0]))
+        return ranked[:limit] if limit else ranked
+
+    def kpis(self):
+        affiliation = dict(self.counts("political_affiliation"))
+        total = len(self)
+        supporters = sum(n for v, n in affiliation.items() if v is not None and v.lower() == "supporter")
+        undecided = sum(n for v, n in affiliation.items() if (v or "").lower() in aggregates.UNDECIDED)
+        return {
+            "total": total,
+            "contacted": int(np.count_nonzero(self.columns["contacted"])),
+            "supporters": supporters,
+            "undecided": undecided,
+        }
+
+    def visualization(self, **filters):
+        """Same payload as aggregates.visualization() for any filter_voters filters."""
+        mask = self.mask(**filters)
+        affiliations = self.dictionaries["political_affiliation"].values
+        genders = self.dictionaries["gender"].values
+        cells = np.bincount(self._select(self.cell, mask))
+        rows = []
+        for cell in np.flatnonzero(cells):
+            rest, gender = divmod(int(cell), len(genders))
+            affiliation, band = divmod(rest, len(BANDS))
+            rows.append(((affiliations[affiliation] or "").lower(), BANDS[band],
+                         (genders[gender] or "").lower(), int(cells[cell])))
+
+        result = aggregates._chart_counts(rows)
+        result["topIssues"] = dict(self.issue_counts(mask, limit=10))
+        return result
+
+
+# -------------------------
+# Loading
+# -------------------------
+_ROW_COLUMNS = (
+    Voter.id, Voter.age, Voter.booth_id,
+    func.coalesce(Voter.mobile_number, "") != "",
+    Voter.gender, Voter.political_affiliation, Voter.education_level, Voter.occupation,
+)
+
+def _read_rows(where=None):
+    stmt = select(*_ROW_COLUMNS).order_by(Voter.id)
+    if where is not None:
+        stmt = stmt.where(where)
+    return [tuple(r) for r in db.session.execute(stmt.execution_options(yield_per=50000))]
+
+def _read_links(where=None):
+    stmt = select(VoterIssue.voter_id, Issue.name).join(Issue, Issue.id == VoterIssue.issue_id)
+    if where is not None:
+        stmt = stmt.where(where)
+    return [tuple(r) for r in db.session.execute(stmt.execution_options(yield_per=50000))]
+
+def load():
+    """Read a complete snapshot of voter_list."""
+    version = table_versions.current(Voter.__tablename__)
+    seq = voter_changes.latest()
+    return VoterSnapshot.from_rows(_read_rows(), _read_links(), version, seq)
+
+def refresh(snapshot):
+    """Snapshot brought up to date with the voters changed since it was read."""
+    version = table_versions.current(Voter.__tablename__)
+    if version == snapshot.version:
+        return snapshot
+
+    seq, changed, oldest = voter_changes.since(max(snapshot.seq - OVERLAP, 0))
+    if oldest is not None and oldest > snapshot.seq + 1:
+        return load()  # the log was pruned past our position
+    high = int(snapshot.ids[-1]) if len(snapshot) else 0
+    added = db.session.execute(
+        select(Voter.id).where(Voter.id > high - OVERLAP)
+    ).scalars().all()
+    changed = set(changed) | set(added)
+    if len(changed) > RELOAD_SHARE * max(len(snapshot), 1):
+        return load()
+    if not changed:
+        return VoterSnapshot(snapshot.columns, snapshot.dictionaries,
+                             snapshot.links, snapshot.issues, version, seq)
+
+    ids = list(changed)
+    rows = _read_rows(Voter.id.in_(ids))
+    links = _read_links(VoterIssue.voter_id.in_(ids))
+    return snapshot.patched(ids, rows, links, version, seq)
+
+
+_snapshot = None
+_lock = threading.Lock()
+
+
+def get(wait=False):
+    """The current snapshot, or None when disabled. Loads or refreshes it as needed.
+
+    An up-to-date snapshot is returned without locking. Only one thread
+    refreshes at a time; while it does, the others keep answering from the
+    previous snapshot instead of queueing behind it, so the result may be
+    older than voter_list: callers that cache or tag what they compute must
+    key it by snapshot.version. With wait=True a caller that needs the
+    current version (e.g. one that already read it) waits for the refresh.
+    """
+    global _snapshot
+    if not enabled():
+        return None
+    snapshot = _snapshot
+    if snapshot is not None:
+        if table_versions.current(Voter.__tablename__) == snapshot.version:
+            return snapshot
+        if not _lock.acquire(blocking=wait):
+            return snapshot
+    else:
+        _lock.acquire()
+    try:
+        # Another thread may have loaded or refreshed it while we waited
+        snapshot = _snapshot
+        snapshot = load() if snapshot is None else refresh(snapshot)
+        _snapshot = snapshot  # a single assignment: readers see the old or the new one
+        return snapshot
+    finally:
+        _lock.release()